@@ -3,10 +3,16 @@ from .core.hilbert_operators import (qOp, pOp,
                                createOp, annihilateOp, 
                                Dagger, rho)
 
-from .core.star_product import Bopp, Star
+from .core.star_product import Bopp, BoppOperator, Star, MoyalBracket, MoyalAntiBracket
 
 from .core.wigner_transform import WignerTransform
+from .core.weyl_transform import WeylTransform, weyl_ordering
 from .core.eom import LindbladMasterEquation
+from .core.moments import MomentEquations
 
-from .utils.multiprocessing import MP_CONFIG
-from .utils.grouping import collect_by_derivative, derivative_not_in_num
\ No newline at end of file
+from .utils.multiprocessing import MP_CONFIG, execution_context
+from .utils.backends import ManagerBackend, run_worker
+from .utils.aio import star_async, wigner_transform_async
+from .utils.estimate import estimate_star, estimate_wigner_transform
+from .utils.grouping import collect_by_derivative, derivative_not_in_num
+from .utils.progress import ProgressEvent, progress, track_progress
\ No newline at end of file
@@ -1,3 +1,5 @@
+import threading
+import contextvars
 import sympy as sp
 from typing import Tuple, Callable
 
@@ -35,16 +37,46 @@ class Base(sp.Symbol):
         return self.__class__, self._custom_args, self.assumptions0
     
 class _Set(set):
+    """
+    Set of the subsystems in use. Updates are locked and iteration runs over a
+    snapshot, so that objects can be created from several threads at once.
+    """
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._lock = threading.Lock()
+    
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+    
+    def __iter__(self):
+        with self._lock:
+            snapshot = list(super().__iter__())
+        return iter(snapshot)
+    
     def update(self, *args, **kwargs):
         s = "This object should not be modified by the user. "
         s += "Call the '_update' method to force-update the object."
         raise AttributeError(s)
     
     def _update(self, *args, **kwargs):
-        super().update(*args, **kwargs)
+        with self._lock:
+            super().update(*args, **kwargs)
 global _sub_cache
 _sub_cache = _Set([])
 
+_isolated_sub_cache : contextvars.ContextVar[None | _Set] \
+    = contextvars.ContextVar("_isolated_sub_cache", default=None)
+"""
+Set by `execution_context(subsystems=...)` to keep the subsystems of the
+current context apart from the global `_sub_cache`.
+"""
+
+def _get_sub_cache() -> _Set:
+    sub_cache = _isolated_sub_cache.get()
+    if sub_cache is None:
+        return _sub_cache
+    return sub_cache
+
 def _treat_sub(sub, has_sub):
     if ((sub is None) or not(has_sub)):
         return sp.Symbol(r"")
@@ -1,11 +1,18 @@
 import sympy as sp
 import sympy.physics.quantum as spq
 from functools import cached_property
+from typing import Callable
 
 from .wigner_transform import WignerTransform
+from .star_product import Bopp, Star, MoyalAntiBracket
+from .moments import MomentEquations
 from . import scalars
+from .base import _get_sub_cache
 from .hilbert_operators import densityOp, Dagger
+from ..utils.symmetry import _symmetric_map
 from ..utils.grouping import collect_by_derivative, derivative_not_in_num
+from ..utils.aio import _run_in_process
+from ..utils.progress import ProgressEvent
 
 __all__ = ["LindbladMasterEquation"]
 
@@ -58,7 +65,7 @@ class _LindbladDissipator(_AddOnlyExpr):
     def _latex(self, printer):
         return str(self)
     
-    def expand(self):
+    def expand(self, **hints):
         rho = densityOp()
         P = self.operator_1
         
@@ -71,6 +78,23 @@ class _LindbladDissipator(_AddOnlyExpr):
             out =  rate_mul * out
         return out
     
+    def wigner_transform(self):
+        """
+        The Wigner transform of the dissipator, `(rate/2) * (2 P★W★Q† - W★r - r★W)`
+        with `r = Q†★P`, where `W` stands for the transform of `rho`.
+        
+        The Bopp shifts of `P` and `Q†` are compiled once and composed, so that
+        the sandwich term is a single application to `W`, and the anticommutator
+        with `r` is computed as one `MoyalAntiBracket`.
+        """
+        P = WignerTransform(self.operator_1)
+        Qd = WignerTransform(Dagger(self.operator_2))
+        W = WignerTransform(densityOp())
+        
+        sandwich = Bopp(P, compiled=True).compose(Bopp(Qd, left=True, compiled=True))
+        out = 2*sandwich.apply(W) - 2*MoyalAntiBracket(Star(Qd, P), W)
+        return (self.rate/2 * out).expand()
+    
 class LindbladMasterEquation(sp.Basic):
     """
     The Lindblad master equation. 
@@ -121,16 +145,88 @@ class LindbladMasterEquation(sp.Basic):
         return out
     
     @cached_property
-    def wigner_transform(self):
+    def _wigner_transform(self):
+        """
+        The Wigner equation of motion, expanded, without the grouping for display.
+        """
         lhs = sp.Derivative(scalars.W(), scalars.t())
-        rhs = WignerTransform(self.rhs.doit().expand())
-                                            # By calling expand, we effectively call .expand of _LindbladDissipator
-
-            # Collect first to reduce the number of terms. 
+        
+        # The commutators are kept unevaluated so that `WignerTransform` computes
+        # them as Moyal brackets. They are split over the terms of `H`, so that
+        # the terms of the same shape are transformed only once.
+        rhs = WignerTransform(sp.Add(*[-sp.I/scalars.hbar * spq.Commutator(H_, densityOp())
+                                       for H_ in sp.Add.make_args(sp.expand(self.H))]))
+        rhs += sp.Add(*_symmetric_map(self.dissipators, _dissipator_wigner_transform,
+                                      stage="dissipators"))
+        
+        # The Wigner transform of `rho` is `(2*pi*hbar)**N * W`.
+        N = len(_get_sub_cache())
+        rhs = (rhs / (2*scalars.pi*scalars.hbar)**N).expand()
+        return sp.Equality(lhs, rhs)
+    
+    @cached_property
+    def wigner_transform(self):
+        lhs, rhs = self._wigner_transform.args
+        # Collect first to reduce the number of terms. 
         if self.neat_display:
             rhs = derivative_not_in_num(collect_by_derivative(rhs, lhs.args[0]))
         return sp.Equality(lhs, rhs)
     
+    def moment_equations(self, order : int, closure : None | str = None):
+        """
+        The equations of motion of the moments of `W` up to the total degree
+        `order`, obtained from `wigner_transform` by integration by parts.
+        See `MomentEquations` for the closures.
+        """
+        return MomentEquations(self._wigner_transform, order, closure)
+    
+    def numeric_wigner_transform(self, hbar : float = 1.0,
+                                 parameters : None | dict = None,
+                                 tol : float = 1e-12):
+        """
+        The right-hand side of `wigner_transform` with the numerical values of
+        `hbar` and the `parameters`, as a `moyalstar.numeric.NumericPoly` with
+        floating-point coefficients. Requires `numpy`.
+        """
+        from ..numeric.fast import numeric_wigner_transform
+        
+        rhs = -sp.I/scalars.hbar * spq.Commutator(self.H, densityOp())
+        rhs += sp.Add(*[dissip.expand() for dissip in self.dissipators])
+        out = numeric_wigner_transform(rhs, hbar=hbar, parameters=parameters, tol=tol)
+        
+        # The Wigner transform of `rho` is `(2*pi*hbar)**N * W`.
+        N = len(_get_sub_cache())
+        return out * float((2*sp.pi*hbar)**(-N))
+    
+    def liouvillian(self, dims : int | list | dict,
+                    subs : None | list = None,
+                    hbar : float = 1.0,
+                    parameters : None | dict = None):
+        """
+        The sparse Liouvillian in the truncated Fock basis of the subsystems,
+        acting on the column-stacked density matrix. Requires `numpy` and `scipy`.
+        
+        See `moyalstar.numeric.liouvillian` for the parameters.
+        """
+        from ..numeric.liouvillian import liouvillian
+        
+        return liouvillian(self, dims=dims, subs=subs, hbar=hbar, parameters=parameters)
+    
+    async def wigner_transform_async(self,
+                                     timeout : None | float = None,
+                                     on_progress : None | Callable[[ProgressEvent], None] = None):
+        """
+        Awaitable `wigner_transform`, evaluated in a worker process without
+        blocking the event loop. The result is cached like `wigner_transform`.
+        
+        See `moyalstar.utils.aio.star_async` for the parameters.
+        """
+        if "wigner_transform" not in self.__dict__:
+            self.__dict__["wigner_transform"] = \
+                await _run_in_process(_get_wigner_transform, (self,),
+                                      timeout=timeout, on_progress=on_progress)
+        return self.wigner_transform
+    
     def __str__(self):
         return sp.latex(sp.Equality(self.lhs, self.rhs))
     
@@ -138,4 +234,10 @@ class LindbladMasterEquation(sp.Basic):
         return str(self)
     
     def _latex(self, printer):
-        return str(self)
\ No newline at end of file
+        return str(self)
+    
+def _dissipator_wigner_transform(A : _LindbladDissipator):
+    return A.wigner_transform()
+
+def _get_wigner_transform(A : LindbladMasterEquation):
+    return A.wigner_transform
\ No newline at end of file
@@ -2,8 +2,7 @@ import sympy as sp
 
 import typing
 from . import scalars
-from .base import Base, _sub_cache, _treat_sub, _operation_routine
-from ..utils.multiprocessing import _mp_helper
+from .base import Base, _get_sub_cache, _treat_sub, _invalid_input
 
 class Operator(Base):
     
@@ -16,8 +15,10 @@ class Operator(Base):
     def __new__(cls, sub = None):
         sub = _treat_sub(sub, cls.has_sub)
         
-        global _sub_cache
-        _sub_cache._update([sub])
+        if cls.has_sub:
+            # Objects without subsystem, e.g. 'rho' and 't', must not
+            # add a spurious subsystem to the variables of 'W'.
+            _get_sub_cache()._update([sub])
         
         return super().__new__(cls, sub)
         
@@ -34,22 +35,41 @@ class Operator(Base):
 class Dagger():
     """
     Hermitian conjugate of `A`.
+    
+    The expression tree is walked once, without expanding it first and without
+    dispatching to worker processes, since the conjugation of each node only
+    costs a constant amount of work. Shared subexpressions are conjugated once.
     """
     def __new__(cls, A : sp.Expr | Operator):
-        return _operation_routine(A,
-                                  "Dagger",
-                                  (),
-                                  (Operator,),
-                                  lambda A: A.conjugate(),
-                                  (Operator,
-                                  lambda A:  A.dagger()),
-                                  (sp.Add, 
-                                   lambda A: sp.Add(*_mp_helper(A.args, Dagger))), 
-                                  (sp.Pow,
-                                   lambda A: Dagger(A.args[0]) ** A.args[1]),
-                                  (sp.Mul,
-                                   lambda A: sp.Mul(*list(reversed(_mp_helper(A.args, Dagger)))))
-                                  )
+        return _dagger(sp.sympify(A), {})
+    
+def _dagger(A : sp.Expr, memo : dict) -> sp.Expr:
+    """
+    Recursive routine of `Dagger`. `memo` maps the subexpressions already
+    conjugated in the current call to their results. Every `Operator` is
+    noncommutative, so a commutative subtree can be conjugated as a whole
+    without looking into it.
+    """
+    if A in memo:
+        return memo[A]
+    
+    if A.is_commutative:
+        out = A.conjugate()
+    elif isinstance(A, Operator):
+        out = A.dagger()
+    elif A.is_Atom:
+        out = A.conjugate()
+    elif isinstance(A, sp.Add):
+        out = sp.Add(*[_dagger(A_, memo) for A_ in A.args])
+    elif isinstance(A, sp.Mul):
+        out = sp.Mul(*[_dagger(A_, memo) for A_ in reversed(A.args)])
+    elif isinstance(A, sp.Pow):
+        out = _dagger(A.args[0], memo) ** A.args[1]
+    else:
+        _invalid_input(A, "Dagger")
+    
+    memo[A] = out
+    return out
     
 class HermitianOp(Operator):
     
@@ -104,8 +124,7 @@ class densityOp(HermitianOp):
         return super().__new__(cls, sub)
     
     def wigner_transform(self):
-        global _sub_cache
-        N = len(_sub_cache)
+        N = len(_get_sub_cache())
         return (2*scalars.pi*scalars.hbar)**N * scalars.W()
     
 class rho():
@@ -0,0 +1,223 @@
+import sympy as sp
+from itertools import combinations_with_replacement
+from math import factorial
+from sympy.utilities.iterables import multiset_partitions
+
+from . import scalars
+from .star_product import _split_W
+
+__all__ = ["MomentEquations"]
+
+def _moment_symbol(M : sp.Expr) \
+    -> sp.Symbol:
+    return sp.Symbol(r"\left\langle {%s} \right\rangle" % sp.latex(M), real=True)
+
+def _monomial(variables : tuple) \
+    -> sp.Expr:
+    return sp.Mul(*variables)
+
+class _Closure():
+    """
+    Expresses the moments of degree higher than `order` through the lower ones,
+    by setting the joint cumulants of degree higher than `order` to zero. The
+    Gaussian closure is the case `order = 2`.
+    """
+    def __init__(self, order : int, moment : callable):
+        self.order = order
+        self.moment = moment
+        self._cumulants = {}
+
+    def cumulant(self, variables : tuple) -> sp.Expr:
+        """
+        Joint cumulant of `variables` in terms of moments, summing over the set
+        partitions `π` as `sum (|π|-1)! (-1)^(|π|-1) prod_B <B>`.
+        """
+        key = tuple(sorted(variables, key=str))
+        if key not in self._cumulants:
+            out = 0
+            for partition in multiset_partitions(list(range(len(key)))):
+                k = len(partition)
+                out += (factorial(k-1) * (-1)**(k-1)
+                        * sp.Mul(*[self.moment(_monomial([key[i] for i in block]))
+                                   for block in partition]))
+            self._cumulants[key] = out
+        return self._cumulants[key]
+
+    def __call__(self, variables : tuple) -> sp.Expr:
+        """
+        The moment of `variables`, as a sum over the set partitions whose
+        blocks all have at most `order` elements.
+        """
+        out = 0
+        for partition in multiset_partitions(list(range(len(variables)))):
+            if any(len(block) > self.order for block in partition):
+                continue
+            out += sp.Mul(*[self.cumulant(tuple(variables[i] for i in block))
+                            for block in partition])
+        return out.expand()
+
+class MomentEquations():
+    """
+    The equations of motion of the moments `<M>` of the Wigner function, i.e.,
+    the symmetrically ordered expectation values, for the monomials `M` in the
+    phase-space variables up to a given total degree.
+
+    For each term `c * ∂^β W` of the Wigner equation of motion, integration by parts
+    gives `d<M>/dt = sum (-1)^|β| <∂^β (M*c)>`, assuming that `W` vanishes at
+    infinity. The right-hand sides are linear in the moments but may involve
+    moments of higher degree than the ones solved for, which the closure then
+    expresses through the lower ones.
+
+    Use `LindbladMasterEquation.moment_equations` to construct this object.
+
+    Parameters
+    ----------
+
+    eom : sympy.Equality
+        The Wigner equation of motion, `Derivative(W, t) = rhs`.
+
+    order : int
+        Highest total degree of the moments.
+
+    closure : None, 'gaussian', or 'cumulant', default: None
+        How to express the moments of degree higher than `order` appearing on
+        the right-hand sides. With `None`, they are kept as additional unknowns,
+        listed in `unclosed`. With `'gaussian'`, all joint cumulants beyond the
+        second are set to zero, and with `'cumulant'`, those beyond `order`.
+
+    Attributes
+    ----------
+
+    moments : list[sympy.Expr]
+        The monomials `M`, ordered by degree.
+
+    symbols : list[sympy.Symbol]
+        The symbols of the moments `<M>`.
+
+    rhs : list[sympy.Expr]
+        The right-hand sides of `d<M>/dt`, in the same order.
+
+    unclosed : list[sympy.Symbol]
+        The moments appearing on the right-hand sides that are not solved for.
+
+    parameters : list[sympy.Symbol]
+        The remaining free symbols of the right-hand sides, sorted by name.
+    """
+
+    def __init__(self, eom : sp.Equality, order : int, closure : None | str = None):
+        if closure not in [None, "gaussian", "cumulant"]:
+            raise ValueError(f"Invalid closure: {closure}. Valid closures: None, 'gaussian', 'cumulant'.")
+        if closure == "gaussian" and order < 2:
+            raise ValueError("The Gaussian closure needs the moments up to 'order = 2'.")
+        if order < 1:
+            raise ValueError("'order' must be a positive integer.")
+
+        self.order = order
+        self.closure = closure
+
+        W = eom.lhs.args[0]
+        variables = list(W.args[1:])
+        self.variables = variables
+
+        self.moments = [_monomial(combination)
+                        for degree in range(1, order+1)
+                        for combination in combinations_with_replacement(variables, degree)]
+        self.symbols = [_moment_symbol(M) for M in self.moments]
+
+        terms = _split_W(eom.rhs)
+        if sp.Integer(1) in terms:
+            raise ValueError("The equation of motion contains terms without 'W'.")
+
+        symbols = {}
+        def moment(M):
+            if M == 1:
+                return sp.Integer(1)
+            if M not in symbols:
+                symbols[M] = _moment_symbol(M)
+            return symbols[M]
+
+        closure_order = {None : None, "gaussian" : 2, "cumulant" : order}[closure]
+        close = None if closure is None else _Closure(closure_order, moment)
+
+        def expectation(X):
+            out = 0
+            for exponents, coeff in sp.Poly(X, *variables).terms():
+                factors = [x for x, n in zip(variables, exponents) for _ in range(n)]
+                if (close is not None) and (len(factors) > order):
+                    out += coeff * close(tuple(factors))
+                else:
+                    out += coeff * moment(_monomial(factors))
+            return out
+
+        self.rhs = []
+        for M in self.moments:
+            X = 0
+            for D, c in terms.items():
+                index = D.variable_count if isinstance(D, sp.Derivative) else ()
+                sign = (-1)**sum(int(m) for _, m in index)
+                X += sign * ((M*c).diff(*index) if index else M*c)
+            self.rhs.append(sp.expand(expectation(sp.expand(X))))
+
+        solved = set(self.symbols)
+        free = set().union(*[X.free_symbols for X in self.rhs])
+        self.unclosed = sorted([x for x in free if x in set(symbols.values()) and x not in solved],
+                               key=str)
+        self.parameters = sorted([x for x in free if x not in set(symbols.values())],
+                                 key=str)
+
+    @property
+    def equations(self) -> list[sp.Equality]:
+        t = scalars.t()
+        return [sp.Equality(sp.Derivative(x, t), X) for x, X in zip(self.symbols, self.rhs)]
+
+    @property
+    def is_linear(self) -> bool:
+        return all(sp.Poly(X, *(self.symbols + self.unclosed)).total_degree() <= 1
+                   for X in self.rhs)
+
+    def linear_system(self) \
+        -> tuple[sp.SparseMatrix, sp.Matrix]:
+        """
+        The matrix `A` and vector `b` of `d<M>/dt = A <M> + b`.
+
+        Raises `ValueError` if the system is nonlinear (after closure) or not closed.
+        """
+        if self.unclosed:
+            raise ValueError(f"The system is not closed, as it involves {self.unclosed}.")
+        if not(self.is_linear):
+            raise ValueError("The system is nonlinear.")
+        A = sp.SparseMatrix(len(self.rhs), len(self.symbols),
+                            {(i, j) : X.coeff(x)
+                             for i, X in enumerate(self.rhs)
+                             for j, x in enumerate(self.symbols)
+                             if X.coeff(x) != 0})
+        b = sp.Matrix([X.subs({x : 0 for x in self.symbols}) for X in self.rhs])
+        return A, b
+
+    def lambdify(self):
+        """
+        Compile the right-hand sides into a NumPy function `f(t, x, *parameters)`,
+        with the moments `x` stacked along the first axis, as expected by
+        `scipy.integrate.solve_ivp`. Any trailing axes of `x` and the parameters
+        are broadcast, so batches of states or parameter values are evaluated in
+        one call. Requires `numpy`.
+        """
+        import numpy as np
+
+        if self.unclosed:
+            raise ValueError(f"The system is not closed, as it involves {self.unclosed}.")
+
+        rhs = [X.subs(scalars.pi, sp.pi) for X in self.rhs]
+        parameters = [x for x in self.parameters if x != scalars.pi]
+        foo = sp.lambdify([self.symbols, parameters], rhs, modules="numpy", cse=True)
+
+        def f(t, x, *params):
+            x = np.asarray(x)
+            out = foo(x, params)
+            shape = np.broadcast_shapes(x.shape[1:], *[np.shape(X) for X in out])
+            return np.stack([np.broadcast_to(X, shape) for X in out])
+        f.parameters = parameters
+        return f
+
+    def __repr__(self):
+        return "\n".join([str(eq) for eq in self.equations])
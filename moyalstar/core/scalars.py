@@ -1,6 +1,6 @@
 import sympy as sp
 
-from .base import Base, _sub_cache, _treat_sub
+from .base import Base, _get_sub_cache, _treat_sub
 
 __all__ = ["q", "p", "alpha", "alphaD", "W"]
 
@@ -19,8 +19,10 @@ class Scalar(Base):
     def __new__(cls, sub = None):
         sub = _treat_sub(sub, cls.has_sub)
         
-        global _sub_cache
-        _sub_cache._update([sub])
+        if cls.has_sub:
+            # Objects without subsystem, e.g. 'rho' and 't', must not
+            # add a spurious subsystem to the variables of 'W'.
+            _get_sub_cache()._update([sub])
 
         return super().__new__(cls, sub)
         
@@ -140,8 +142,8 @@ class WignerFunction(sp.Function):
     
     def weyl_transform(self):
         from .hilbert_operators import rho
-        global _sub_cache, pi, hbar
-        N = len(_sub_cache)
+        global pi, hbar
+        N = len(_get_sub_cache())
         return rho() / (2*pi*hbar)**N
     
 class W():
@@ -151,9 +153,9 @@ class W():
     some variables with manual construction, leading to incorrect evaluations.
     """
     def __new__(cls):
-        global _sub_cache
         vars = []        
-        for sub in _sub_cache:
+        # Sorted, so that 'W' is the same wherever the subsystems were registered.
+        for sub in sorted(_get_sub_cache(), key=str):
             vars.extend([q(sub), p(sub)])
         
         return WignerFunction(t(), *vars)
\ No newline at end of file
@@ -1,10 +1,15 @@
 import sympy as sp
+from itertools import product
 
 from . import scalars
-from ..utils.multiprocessing import _mp_helper
+from ..utils.multiprocessing import _mp_helper, _get_cache
+from ..utils.accelerate import _expand, _bopp_subs_expand
 
 __all__ = ["Bopp",
-           "Star"]
+           "BoppOperator",
+           "Star",
+           "MoyalBracket",
+           "MoyalAntiBracket"]
 
 class Bopp():
     """
@@ -28,10 +33,16 @@ class Bopp():
     left : bool, default: False
         Whether the star-product operator is to the left of `A`. 
 
+    compiled : bool, default: False
+        Whether to return the shift as a `BoppOperator`, i.e., the linear
+        differential operator `F -> A★F` (or `F -> F★A` if `left`). The
+        compiled operators are cached (see `execution_context`), so the
+        symbolic shift of a given `A` is done only once.
+
     Returns
     -------
 
-    out : sympy object
+    out : sympy object or BoppOperator
         Bopp-shifted sympy object. 
 
     References
@@ -43,7 +54,16 @@ class Bopp():
 
     """
         
-    def __new__(cls, A : sp.Expr, left : bool = False):
+    def __new__(cls, A : sp.Expr, left : bool = False, compiled : bool = False):
+        
+        if compiled:
+            cache = _get_cache("Bopp")
+            key = (A, left)
+            if key not in cache:
+                if len(cache) >= _BOPP_CACHE_SIZE:
+                    cache.clear()
+                cache[key] = BoppOperator._from_shifted(Bopp(A, left=left))
+            return cache[key]
         
         if A.has(sp.Derivative):
             A = A.doit()
@@ -78,7 +98,196 @@ class Bopp():
             if isinstance(X, scalars.p):
                 subs_dict[X] = X - sgn * sp.I*scalars.hbar/2 *  dxx(scalars.q(X.sub))
         
-        return A.subs(subs_dict).expand()
+        return _bopp_subs_expand(A, subs_dict)
+    
+_BOPP_CACHE_SIZE = 4096
+
+def _make_index(orders : dict) \
+    -> tuple:
+    """
+    Canonical multi-index `((x1, m1), (x2, m2), ...)` of the derivative
+    `∂^m1/∂x1^m1 ∂^m2/∂x2^m2 ...`, dropping the zero orders.
+    """
+    return tuple(sorted(((x, m) for x, m in orders.items() if m), key=lambda x: str(x[0])))
+
+def _is_W_part(X : sp.Expr) \
+    -> bool:
+    return (isinstance(X, scalars.WignerFunction)
+            or (isinstance(X, sp.Derivative) and isinstance(X.expr, scalars.WignerFunction)))
+
+def _split_W(F : sp.Expr) \
+    -> dict:
+    """
+    Write `F` as `{D : f}`, i.e., `F = sum(f * D)`, where `D` is `W`, one of
+    its derivatives, or 1.
+    """
+    out = {}
+    for F_ in sp.Add.make_args(sp.expand(F)):
+        D = sp.Integer(1)
+        f = []
+        for X in sp.Mul.make_args(F_):
+            if (D == 1) and _is_W_part(X):
+                D = X
+            else:
+                f.append(X)
+        out[D] = out.get(D, 0) + sp.Mul(*f)
+    return out
+
+def _differentiate_W_part(D : sp.Expr, index : tuple) \
+    -> sp.Expr:
+    """
+    Differentiate `D`, which is `W` or one of its derivatives, with the
+    differentiation variables in a canonical order.
+    """
+    if not(index):
+        return D
+    if isinstance(D, sp.Derivative):
+        orders = dict(D.variable_count)
+        D = D.expr
+    else:
+        orders = {}
+    for x, m in index:
+        orders[x] = orders.get(x, 0) + m
+    return sp.Derivative(D, *_make_index(orders))
+
+def _leibniz(index : tuple, f : sp.Expr, D : sp.Expr) \
+    -> list[tuple[sp.Expr, tuple]]:
+    """
+    The general Leibniz rule, `∂^β(f*D) = sum_δ C(β,δ) ∂^δ f ∂^(β-δ) D`, as a
+    list of the pairs `(C(β,δ) ∂^δ f, β-δ)`. If `D` is 1, only `δ = β` remains.
+    """
+    if D == 1:
+        return [(f.diff(*index) if index else f, ())]
+    
+    out = []
+    for delta in product(*[range(m+1) for _, m in index]):
+        diff_vars = [(x, d) for (x, _), d in zip(index, delta) if d]
+        df = f.diff(*diff_vars) if diff_vars else f
+        if df == 0:
+            continue
+        weight = sp.Mul(*[sp.binomial(m, d) for (_, m), d in zip(index, delta)])
+        rest = _make_index({x : m-d for (x, m), d in zip(index, delta)})
+        out.append((weight*df, rest))
+    return out
+
+class BoppOperator():
+    """
+    Compiled form of a Bopp-shifted expression, the linear differential operator
+    
+    `F -> sum(c * ∂^m1/∂x1^m1 ∂^m2/∂x2^m2 ... F)`,
+    
+    where `x` are the `q` and `p` of any subsystems. The operator is stored as the
+    table `{((x1, m1), (x2, m2), ...) : c}` of its coefficients, so applying it to
+    an expression containing `W` only involves differentiating the coefficients
+    of that expression with the Leibniz rule. It can be composed with, added
+    to, and subtracted from other `BoppOperator`s, and pickled.
+    
+    Use `Bopp(A, left, compiled=True)` to get the operator of `A★F` (or `F★A`).
+    
+    Parameters
+    ----------
+    
+    table : dict
+        The coefficients `c`, keyed by the multi-indices of the derivatives.
+    """
+    
+    def __init__(self, table : dict):
+        self.table = {_make_index(dict(index)) : c for index, c in table.items() if c != 0}
+    
+    @classmethod
+    def _from_shifted(cls, X : sp.Expr):
+        """
+        Read the table off the expanded output of `Bopp`, in which the
+        `_DerivativeSymbol`s act on everything to their right.
+        """
+        table = {}
+        for X_ in sp.Add.make_args(X):
+            orders = {}
+            coeff = []
+            for A_ in sp.Mul.make_args(X_):
+                base, exp = A_.as_base_exp()
+                if isinstance(base, scalars._DerivativeSymbol):
+                    var = base.diff_var.base
+                    orders[var] = orders.get(var, 0) + int(exp)
+                else:
+                    coeff.append(A_)
+            index = _make_index(orders)
+            table[index] = table.get(index, 0) + sp.Mul(*coeff)
+        return cls({index : c.expand() for index, c in table.items()})
+    
+    @property
+    def order(self) -> int:
+        """
+        Highest total order of the derivatives.
+        """
+        return max([sum(m for _, m in index) for index in self.table], default=0)
+    
+    def parity(self, parity : int):
+        """
+        The part of the operator whose derivative orders have the given parity.
+        """
+        return BoppOperator({index : c for index, c in self.table.items()
+                             if sum(m for _, m in index) % 2 == parity})
+    
+    def apply(self, F : sp.Expr) \
+        -> sp.Expr:
+        """
+        Apply the operator to `F`, which may contain `W` and its derivatives.
+        
+        Each term is a handful of coefficient derivatives, which is cheaper
+        to do in place than to send to a pool.
+        """
+        parts = _split_W(sp.sympify(F))
+        out = []
+        for index, c in self.table.items():
+            for D, f in parts.items():
+                for df, rest in _leibniz(index, f, D):
+                    out.append(c * df * _differentiate_W_part(D, rest))
+        return sp.Add(*out).expand()
+    
+    __call__ = apply
+    
+    def compose(self, other):
+        """
+        The composition `self ∘ other`, i.e., `F -> self(other(F))`.
+        """
+        table = {}
+        for index_1, c_1 in self.table.items():
+            for index_2, c_2 in other.table.items():
+                for dc_2, rest in _leibniz(index_1, c_2, sp.Symbol("D")):
+                    orders = dict(rest)
+                    for x, m in index_2:
+                        orders[x] = orders.get(x, 0) + m
+                    index = _make_index(orders)
+                    table[index] = table.get(index, 0) + c_1*dc_2
+        return BoppOperator({index : c.expand() for index, c in table.items()})
+    
+    def __add__(self, other):
+        table = dict(self.table)
+        for index, c in other.table.items():
+            table[index] = (table.get(index, 0) + c).expand()
+        return BoppOperator(table)
+    
+    def __mul__(self, other):
+        other = sp.sympify(other)
+        return BoppOperator({index : (other*c).expand() for index, c in self.table.items()})
+    
+    __rmul__ = __mul__
+    
+    def __neg__(self):
+        return -1 * self
+    
+    def __sub__(self, other):
+        return self + (-other)
+    
+    def __eq__(self, other):
+        return isinstance(other, BoppOperator) and (self.table == other.table)
+    
+    def __hash__(self):
+        return hash(tuple(sorted(self.table.items(), key=str)))
+    
+    def __repr__(self):
+        return "BoppOperator(%s)" % self.table
     
 class Star():
     """
@@ -101,6 +310,13 @@ class Star():
 
         https://physics.stackexchange.com/questions/578522/why-does-the-star-product-satisfy-the-bopp-shift-relations-fx-p-star-gx-p
     
+    Notes
+    -----
+    
+    If neither operand can be Bopp shifted, but both are (sums of) exponentials of 
+    polynomials of degree at most two in `q` and `p`, such as displacement kernels
+    `exp(i*(a*q + b*p))` and Gaussians, the product is evaluated in closed form.
+    
     See Also
     --------
     
@@ -117,12 +333,72 @@ class Star():
             out = _star_base(out, sp.sympify(arg))
         return out
     
-def _star_base(A : sp.Expr, B : sp.Expr) \
-    -> sp.Expr:    
+class MoyalBracket():
+    """
+    The Moyal bracket `{{A, B}} = (A★B - B★A)/(iħ)`, i.e., the Wigner transform of
+    the commutator divided by `iħ`.
+    
+    Only the terms of odd order in the derivatives (the sine kernel) survive
+    the antisymmetrization, so they are the only ones generated from the Bopp
+    shift, and each of them is computed once instead of twice.
+
+    Parameters
+    ----------
+
+    A, B : sympy.Expr
+        The operands, of which one may be "un-Bopp-shift-able". See `Star`.
+    
+    References
+    ----------
+    
+        T. Curtright, D. Fairlie, and C. Zachos, A Concise Treatise On Quantum Mechanics In Phase Space (World Scientific Publishing Company, 2013)    
+    
+    See Also
+    --------
+    
+    MoyalAntiBracket : The symmetric counterpart.
+    
+    """
+    
+    def __new__(cls, A : sp.Expr, B : sp.Expr):
+        out = _star_base(sp.sympify(A), sp.sympify(B), parity=1)
+        return (2/(sp.I*scalars.hbar) * out).expand()
+    
+class MoyalAntiBracket():
+    """
+    The Moyal anti-bracket `(A★B + B★A)/2`, i.e., the Wigner transform of
+    half the anticommutator, made of the terms of even order in the derivatives
+    (the cosine kernel). See `MoyalBracket`.
+    """
+    
+    def __new__(cls, A : sp.Expr, B : sp.Expr):
+        return _star_base(sp.sympify(A), sp.sympify(B), parity=0)
+    
+def _derivative_order(A : sp.Expr) \
+    -> int:
+    """
+    Total order of the `_DerivativeSymbol`s in the summand `A`.
+    """
+    out = 0
+    for A_ in sp.Mul.make_args(A):
+        base, exp = A_.as_base_exp()
+        if isinstance(base, scalars._DerivativeSymbol):
+            out += int(exp)
+    return out
+
+def _star_base(A : sp.Expr, B : sp.Expr, parity : None | int = None) \
+    -> sp.Expr:
+    """
+    The ★-product `A★B`. If `parity` is 0 or 1, only the terms whose order in
+    the derivatives has that parity are computed, giving the anti-bracket or
+    `iħ/2` times the bracket, respectively.
+    """
     any_phase_space_variable_in_A = A.has(scalars.q, scalars.p)
     any_phase_space_variable_in_B = B.has(scalars.q, scalars.p)
     if (not(any_phase_space_variable_in_A) or 
         not(any_phase_space_variable_in_B)):
+        if parity == 1:
+            return sp.Integer(0)
         return A*B
 
     def cannot_Bopp_pow(X):
@@ -145,6 +421,10 @@ def _star_base(A : sp.Expr, B : sp.Expr) \
          or cannot_Bopp_pow(X) for X in [A,B]]
 
     if cannot_Bopp_A and cannot_Bopp_B:
+        out = _exponential_star(A, B, parity)
+        if out is not None:
+            return out
+        
         msg = "Both inputs cannot be properly Bopp shifted to work with the package. "
         msg += "Expressions that contain: "
         msg += "(1) 'Function's in q or p, or "
@@ -153,12 +433,34 @@ def _star_base(A : sp.Expr, B : sp.Expr) \
         msg += "are problematic when Bopp-shifted."
         raise ValueError(msg)
     
+    # When the other operand contains `W`, the shift is applied as a cached
+    # `BoppOperator` instead of going through `_replace_diff`.
+    if cannot_Bopp_A and A.has(scalars.WignerFunction):
+        operator, F = Bopp(B, left=True, compiled=True), A
+    elif not(cannot_Bopp_A) and B.has(scalars.WignerFunction):
+        operator, F = Bopp(A, left=False, compiled=True), B
+    else:
+        operator, F = None, None
+    if operator is not None:
+        if parity is not None:
+            operator = operator.parity(parity)
+        return operator.apply(F)
+    
+    def shift(X, left):
+        X = Bopp(X, left=left)
+        if parity is not None:
+            # Each term of the Bopp-shifted expression is one term of the 
+            # bidifferential expansion, of the order of its derivatives.
+            X = sp.Add(*[X_ for X_ in sp.Add.make_args(X)
+                         if _derivative_order(X_) % 2 == parity])
+        return X
+    
     if cannot_Bopp_A:
         A = scalars._Primed(A)
-        B = Bopp(B, left=True)
+        B = shift(B, left=True)
         X = (B * A).expand()
     else:
-        A = Bopp(A, left=False)
+        A = shift(A, left=False)
         B = scalars._Primed(B)
         X = (A * B).expand()
 
@@ -179,9 +481,88 @@ def _star_base(A : sp.Expr, B : sp.Expr) \
     else:
         X_args = [X]
     
-    out = sp.Add(*_mp_helper(X_args, _replace_diff))
+    out = sp.Add(*_mp_helper(X_args, _replace_diff, stage="star"))
                 
-    return scalars._DePrimed(out).doit().expand()
+    return _expand(scalars._DePrimed(out).doit())
+
+def _as_exponentials(A : sp.Expr, variables : list) \
+    -> None | list[tuple[sp.Expr, sp.Expr]]:
+    """
+    Write `A` as `sum(c * exp(F))`, with `c` free of the phase-space variables
+    and `F` a polynomial of degree at most two in them, as a list of the pairs
+    `(c, F)`. Return `None` if `A` is not of that form.
+    """
+    out = []
+    for A_ in sp.Add.make_args(sp.expand(A)):
+        coeff, exponent = [], []
+        for X in sp.Mul.make_args(A_):
+            base, exp = X.as_base_exp()
+            if not(X.has(*variables)):
+                coeff.append(X)
+            elif isinstance(X, sp.exp):
+                exponent.append(X.args[0])
+            elif isinstance(base, sp.exp) and isinstance(exp, sp.Integer):
+                exponent.append(exp * base.args[0])
+            else:
+                return None
+        F = sp.expand(sp.Add(*exponent))
+        if not(F.is_polynomial(*variables)) or sp.Poly(F, *variables).total_degree() > 2:
+            return None
+        out.append((sp.Mul(*coeff), F))
+    return out
+
+def _exponential_star(A : sp.Expr, B : sp.Expr, parity : None | int = None) \
+    -> None | sp.Expr:
+    """
+    Closed-form ★-product of exponentials of (at most) quadratic polynomials,
+    or sums thereof. Return `None` if `A` or `B` is not of that form.
+    
+    With `z = (q_1, p_1, ...)`, `F(z) = z^T A z/2 + a^T z + a_0`, and `G` likewise
+    with `B` and `b`, the Gaussian integral
+    
+    `(f★g)(z) = (πħ)^(-2N) ∫ f(z+u) g(z+v) exp((2i/ħ) u^T J v) du dv`
+    
+    gives `exp(F)★exp(G) = det(1 - (ħ²/4) J B J A)^(-1/2) exp(F + G - L^T M^(-1) L / 2)`,
+    where `M = [[A, (2i/ħ) J], [(2i/ħ) J^T, B]]` and `L = (Az + a, Bz + b)`. The branch
+    of the square root is the one that reduces to 1 for plane waves.
+    """
+    subs = sorted({X.sub for X in (A*B).atoms(scalars.q, scalars.p)}, key=str)
+    variables = [X for sub in subs for X in (scalars.q(sub), scalars.p(sub))]
+    
+    A_terms, B_terms = _as_exponentials(A, variables), _as_exponentials(B, variables)
+    if (A_terms is None) or (B_terms is None):
+        return None
+    
+    n = len(variables)
+    z = sp.Matrix(variables)
+    J = sp.diag(*[sp.Matrix([[0, 1], [-1, 0]])]*len(subs))
+    c = 2*sp.I/scalars.hbar
+    
+    def quadratic_form(F):
+        A = sp.hessian(F, variables)
+        a = sp.Matrix([F.diff(x) for x in variables]).subs({x : 0 for x in variables})
+        return A, a
+    
+    def star(F, G):
+        A, a = quadratic_form(F)
+        B, b = quadratic_form(G)
+        det = (sp.eye(n) - scalars.hbar**2/4 * J*B*J*A).det()
+        det = sp.factor(det)
+        if det == 0:
+            raise ValueError("The Gaussian integral of the ★-product diverges.")
+        M = sp.BlockMatrix([[A, c*J], [c*J.T, B]]).as_explicit()
+        L = sp.Matrix.vstack(A*z + a, B*z + b)
+        exponent = F + G - (L.T * M.inv() * L)[0]/2
+        return det**sp.Rational(-1, 2) * sp.exp(sp.expand(sp.cancel(exponent)))
+    
+    out = 0
+    for c_A, F in A_terms:
+        for c_B, G in B_terms:
+            if parity is None:
+                out += c_A*c_B * star(F, G)
+            else:
+                out += c_A*c_B * (star(F, G) + (-1)**parity * star(G, F)) / 2
+    return out
 
 def _first_index_and_diff_order(A : sp.Expr) \
     -> None | tuple[int, scalars.q|scalars.p, int|sp.Number]:
@@ -1,56 +1,247 @@
 import sympy as sp
-from itertools import permutations
-from typing import Tuple
+from functools import partial
 
 from ..core.base import _screen_type, _invalid_input
 from ..core import scalars
-from ..core.hilbert_operators import Operator, qOp, pOp, rho
+from ..core.hilbert_operators import (Operator, qOp, pOp,
+                                      createOp, annihilateOp, densityOp)
 from ..utils.multiprocessing import _mp_helper
 
+__all__ = ["WeylTransform",
+           "weyl_ordering"]
 
 def weyl_ordering(expr : sp.Expr):
     '''
     Return the totally-symmetric (Weyl) ordering of the
-    input expression containing `Operator'.    
+    input expression containing `Operator`. Each operator monomial
+    is replaced by the symmetrized product of its factors, regardless
+    of the order they are given in.
+
+    The output is written in the ladder operators if the input contains
+    any, and in the quadrature operators otherwise.
     '''
     expr = sp.expand(sp.sympify(expr))
-    
+
     _screen_type(expr, (scalars.Scalar), "weyl_ordering")
-    
-    if not(expr.has(qOp, pOp)):
-        return expr
-    
-    if isinstance(expr, (qOp, pOp, sp.Pow)):
+    _screen_type(expr, densityOp, "weyl_ordering")
+
+    if not(expr.has(Operator)):
         return expr
-    
-    if isinstance(expr, sp.Add):
-        return _mp_helper(expr.args, weyl_ordering)
-        
-    _invalid_input(expr, "weyl_ordering")
+
+    ladder = expr.has(createOp, annihilateOp)
+
+    """
+    The symmetrized product only depends on the multiset of the factors, so
+    we can let the factors commute by replacing them with their Wigner
+    transforms, then map the resulting monomials back.
+    """
+    subs_dict = {X : X.wigner_transform() for X in expr.atoms(Operator)}
+    return WeylTransform(expr.subs(subs_dict), ladder=ladder)
 
 class WeylTransform():
-    
-    def __new__(cls, expr : sp.Expr):
+    """
+    The Weyl transform, i.e., the inverse of `WignerTransform`.
+
+    Each term of the input is brought into the form
+    `c * q**a * p**b * Derivative(W, (q, m), (p, n))` (per subsystem), then
+    mapped to operators with the superoperator correspondences
+
+    `q*F <-> (q̂X + Xq̂)/2`, `p*F <-> (p̂X + Xp̂)/2`,
+
+    `∂F/∂q <-> [X, p̂]/(iħ)`, `∂F/∂p <-> [q̂, X]/(iħ)`,
+
+    where `X` is the Weyl transform of `F`, with `W <-> ρ/(2πħ)^N`. Powers of
+    each superoperator are written in closed binomial form, so that a monomial
+    of degree `n` gives `O(n)` operator words instead of the `n!` of a
+    permutation-based symmetrization. `W`-free monomials are written directly
+    in standard order with McCoy's formula
+
+    `{q^a p^b}_W = sum_k (-iħ/2)^k k! C(a,k) C(b,k) q̂^(a-k) p̂^(b-k)`,
+
+    or in normal order, `{α^a α*^b}_W = sum_k (1/2)^k k! C(a,k) C(b,k) â†^(b-k) â^(a-k)`.
+
+    Parameters
+    ----------
+
+    expr : sympy.Expr
+        Polynomial in `q` and `p` (of any subsystems), optionally linear in
+        `W` and its derivatives with respect to `q` and `p`.
+
+    ladder : bool, default: False
+        Whether to write the output in the ladder operators `createOp` and
+        `annihilateOp` instead of the quadrature operators `qOp` and `pOp`.
+
+    References
+    ----------
+
+        N. H. McCoy, On the function in quantum mechanics which corresponds to a given function in classical mechanics, Proc. Natl. Acad. Sci. U.S.A. 18, 674 (1932)
+
+        T. Curtright, D. Fairlie, and C. Zachos, A Concise Treatise On Quantum Mechanics In Phase Space (World Scientific Publishing Company, 2013)
+    """
+
+    def __new__(cls, expr : sp.Expr, ladder : bool = False):
         expr = sp.sympify(expr)
         expr = expr.expand()
-        
+
         _screen_type(expr, Operator, "WeylTransform")
 
-        if not(expr.has(scalars.q, scalars.p, scalars.W)):
+        if not(expr.has(scalars.q, scalars.p, scalars.WignerFunction)):
             return expr
-       
-        if isinstance(expr, (scalars.q, scalars.p, scalars.WignerFunction)):
-            return expr.weyl_transform()
-        
+
         if isinstance(expr, sp.Add):
-            return _mp_helper(expr.args, WeylTransform)
-        
-        if isinstance(expr, sp.Pow):
-            base : scalars.q | scalars.p = expr.args[0]
-            exponent = expr.args[1]
-            return base.weyl_transform() ** exponent
-        
-        if isinstance(expr, sp.Mul):
-            return
-        
-        _invalid_input()
\ No newline at end of file
+            return sp.Add(*_mp_helper(expr.args, partial(_weyl_term, ladder=ladder),
+                                      stage="weyl_transform"))
+
+        return _weyl_term(expr, ladder=ladder)
+
+def _monomial_data(A : sp.Expr) \
+    -> tuple[sp.Expr, dict, bool]:
+    """
+    Split the summand `A` into its coefficient and, for each subsystem,
+    the exponents `[a, b, m, n]` of `q**a * p**b * Derivative(W, (q, m), (p, n))`.
+    Also return whether `A` contains `W`.
+    """
+    coeff = sp.Integer(1)
+    exponents = {}
+    has_W = False
+
+    def get(sub):
+        return exponents.setdefault(sub, [0, 0, 0, 0])
+
+    for A_ in sp.Mul.make_args(A):
+        base, exp = A_.as_base_exp()
+
+        if isinstance(base, (scalars.q, scalars.p)):
+            if not(isinstance(exp, sp.Integer) and exp >= 0):
+                _invalid_input(A, "WeylTransform")
+            get(base.sub)[0 if isinstance(base, scalars.q) else 1] += int(exp)
+
+        elif isinstance(A_, scalars.WignerFunction) and not(has_W):
+            has_W = True
+
+        elif (isinstance(A_, sp.Derivative)
+              and isinstance(A_.expr, scalars.WignerFunction)
+              and not(has_W)):
+            has_W = True
+            for var, order in A_.variable_count:
+                if not(isinstance(var, (scalars.q, scalars.p))):
+                    _invalid_input(A, "WeylTransform")
+                get(var.sub)[2 if isinstance(var, scalars.q) else 3] += int(order)
+
+        elif A_.has(scalars.q, scalars.p, scalars.WignerFunction):
+            _invalid_input(A, "WeylTransform")
+
+        else:
+            coeff *= A_
+
+    return coeff, exponents, has_W
+
+def _correspondence(sub : sp.Symbol, ladder : bool):
+    """
+    For the subsystem `sub`, return the operators whose symmetrizing
+    superoperators `X -> (OX + XO)/2` and commutator superoperators
+    `X -> [X, O]` correspond to multiplication by, and differentiation with
+    respect to, two variables `u1, u2` and `d1, d2` resp., as well as the
+    expressions of `q`, `p`, `∂q`, and `∂p` in terms of these variables.
+    """
+    u1, u2, d1, d2 = sp.symbols("u_1 u_2 d_1 d_2", cls=sp.Dummy)
+    hbar = scalars.hbar
+
+    if not(ladder):
+        mult_ops = [qOp(sub), pOp(sub)]
+        diff_ops = [pOp(sub), qOp(sub)]
+        subs_dict = {"q" : u1,
+                     "p" : u2,
+                     "dq" : d1 / (sp.I*hbar),
+                     "dp" : -d2 / (sp.I*hbar)}
+    else:
+        # With a = (q+ip)/sqrt(2*hbar), we have ∂F/∂a <-> [X, a†] and
+        # ∂F/∂a* <-> [a, X].
+        mult_ops = [annihilateOp(sub), createOp(sub)]
+        diff_ops = [createOp(sub), annihilateOp(sub)]
+        subs_dict = {"q" : sp.sqrt(hbar/2) * (u1 + u2),
+                     "p" : -sp.I*sp.sqrt(hbar/2) * (u1 - u2),
+                     "dq" : (d1 - d2) / sp.sqrt(2*hbar),
+                     "dp" : sp.I*(d1 + d2) / sp.sqrt(2*hbar)}
+
+    return (u1, u2, d1, d2), mult_ops, diff_ops, subs_dict
+
+def _sandwich(words : dict, op : Operator, order : int, commutator : bool) \
+    -> dict:
+    """
+    Apply `X -> (OX + XO)/2` (or `X -> [X, O]` if `commutator`) `order` times
+    to `X = sum(coeff * left * core * right)`, stored as `{(left, right) : coeff}`,
+    using the binomial expansion of the superoperator power.
+    """
+    if order == 0:
+        return words
+
+    out = {}
+    for k in range(order+1):
+        if commutator:
+            weight = sp.binomial(order, k) * (-1)**k
+        else:
+            weight = sp.binomial(order, k) / sp.Integer(2)**order
+        for (left, right), coeff in words.items():
+            key = (op**k * left, right * op**(order-k))
+            out[key] = out.get(key, 0) + weight*coeff
+    return out
+
+def _ordered_symmetric_product(mult_ops : list[Operator], i : int, j : int, ladder : bool) \
+    -> dict:
+    """
+    The Weyl-symmetrized product of `mult_ops[0]**i` and `mult_ops[1]**j`,
+    written in standard (`q̂` left of `p̂`) order or, if `ladder`, in normal
+    order, as `{word : coeff}`.
+    """
+    op_1, op_2 = mult_ops
+    if ladder:
+        factor = sp.Rational(1, 2)
+        word = lambda k: op_2**(j-k) * op_1**(i-k)
+    else:
+        factor = -sp.I*scalars.hbar/2
+        word = lambda k: op_1**(i-k) * op_2**(j-k)
+    return {word(k) : factor**k * sp.factorial(k) * sp.binomial(i, k) * sp.binomial(j, k)
+            for k in range(min(i, j)+1)}
+
+def _weyl_term(A : sp.Expr, ladder : bool = False) \
+    -> sp.Expr:
+    """
+    Weyl transform of a single summand. See `WeylTransform`.
+    """
+    coeff, exponents, has_W = _monomial_data(A)
+
+    words = {(sp.Integer(1), sp.Integer(1)) : sp.Integer(1)}
+    for sub in sorted(exponents, key=str):
+        a, b, m, n = exponents[sub]
+        (u1, u2, d1, d2), mult_ops, diff_ops, subs_dict = _correspondence(sub, ladder)
+
+        poly = (subs_dict["q"]**a * subs_dict["p"]**b
+                * subs_dict["dq"]**m * subs_dict["dp"]**n)
+        poly = sp.Poly(poly.expand(), u1, u2, d1, d2)
+
+        sub_words = {}
+        for (i, j, k, l), c in poly.terms():
+            if not(has_W):
+                # Here k = l = 0, and the symmetrized product can be
+                # written in a fixed order.
+                for key, val in _ordered_symmetric_product(mult_ops, i, j, ladder).items():
+                    for (left, right), coeff_ in words.items():
+                        new_key = (left * key, right)
+                        sub_words[new_key] = sub_words.get(new_key, 0) + c*val*coeff_
+                continue
+            
+            # The commutator superoperators must be applied first, since
+            # the derivatives act before the multiplication.
+            new = {key : c*val for key, val in words.items()}
+            new = _sandwich(new, diff_ops[0], k, commutator=True)
+            new = _sandwich(new, diff_ops[1], l, commutator=True)
+            new = _sandwich(new, mult_ops[0], i, commutator=False)
+            new = _sandwich(new, mult_ops[1], j, commutator=False)
+            for key, val in new.items():
+                sub_words[key] = sub_words.get(key, 0) + val
+        words = sub_words
+
+    core = scalars.W().weyl_transform() if has_W else sp.Integer(1)
+    return coeff * sp.Add(*[val * left * core * right
+                            for (left, right), val in words.items()])
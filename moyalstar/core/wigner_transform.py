@@ -1,13 +1,39 @@
 import sympy as sp
+import sympy.physics.quantum as spq
 
+from . import scalars
 from .hilbert_operators import Operator
-from .star_product import Star
+from .star_product import Star, MoyalBracket, MoyalAntiBracket
 from ..utils.multiprocessing import _mp_helper
+from ..utils.symmetry import _symmetric_map
+
+def _split_coefficient(A : sp.Expr) -> tuple[sp.Expr, sp.Expr]:
+    """
+    Split a product into its scalar coefficient, the commutative factors free of
+    phase-space variables (which ★-multiply like numbers), and the rest, the
+    operator word.
+    """
+    c, nc = A.args_cnc()
+    coeff = [X for X in c if not(X.has(scalars.Scalar, scalars.WignerFunction))]
+    word = [X for X in c if X.has(scalars.Scalar, scalars.WignerFunction)] + nc
+    return sp.Mul(*coeff), sp.Mul(*word)
 
 class WignerTransform():
     """
     The Wigner transform.
     
+    Commutators and anticommutators (`sympy.physics.quantum.Commutator` and
+    `AntiCommutator`) are kept as such and mapped to `iħ` times the
+    `MoyalBracket` and twice the `MoyalAntiBracket`, respectively, instead
+    of being expanded into two ★-products.
+    
+    Summands are split into a scalar coefficient and an operator word, and
+    each distinct word is transformed once and multiplied by the sum of its
+    coefficients, so that e.g. `κ a†aρ` and `γ a†aρ` cost one ★-chain.
+    Words that differ only by the subscripts of their subsystems, such as
+    the identical local terms of a lattice model, are transformed once, and
+    the other transforms are obtained by relabelling.
+    
     Parameters
     ----------
     
@@ -25,12 +51,31 @@ class WignerTransform():
         if isinstance(A, Operator):
             return A.wigner_transform()
                         
-        if isinstance(A, (sp.Add, sp.Mul)):
-            res = _mp_helper(A.args, WignerTransform)
-            if isinstance(A, sp.Add):
-                return sp.Add(*res)
+        if isinstance(A, sp.Add):
+            words = {}
+            for A_ in A.args:
+                coeff, word = _split_coefficient(A_)
+                words[word] = words.get(word, 0) + coeff
+            res = _symmetric_map(list(words), WignerTransform, stage="wigner_transform")
+            return sp.Add(*[sp.expand(coeff*X) for coeff, X in zip(words.values(), res)])
+        
+        if isinstance(A, sp.Mul):
+            res = _mp_helper(A.args, WignerTransform, stage="wigner_transform")
             return Star(*res).expand()
         
+        if isinstance(A, (spq.Commutator, spq.AntiCommutator)):
+            X, Y = A.args
+            if isinstance(X, sp.Add) or isinstance(Y, sp.Add):
+                # Split into the commutators of the summands, which can then
+                # be grouped by shape.
+                return WignerTransform(sp.Add(*[type(A)(X_, Y_)
+                                                for X_ in sp.Add.make_args(X)
+                                                for Y_ in sp.Add.make_args(Y)]))
+            X, Y = [WignerTransform(A_) for A_ in A.args]
+            if isinstance(A, spq.Commutator):
+                return (sp.I*scalars.hbar * MoyalBracket(X, Y)).expand()
+            return (2 * MoyalAntiBracket(X, Y)).expand()
+        
         if isinstance(A, sp.Pow):
             base : Operator = A.args[0]
             exponent = A.args[1]
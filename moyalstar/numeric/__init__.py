@@ -0,0 +1,14 @@
+"""
+Numerical counterparts of the symbolic routines, working on functions
+sampled on phase-space grids. Requires `numpy` and `scipy`.
+"""
+
+from .grid import PhaseSpaceGrid
+from .fock import fock_wigner
+from .evaluate import CompiledExpression
+from .eom_file import save_eom, load_eom, EOMTables
+from .steady_state import WignerOperator, steady_state
+from .fast import NumericPoly, numeric_star, numeric_wigner_transform
+from .truncated_wigner import TruncatedWigner, EnsembleMoments
+from .liouvillian import fock_operator, liouvillian
+from .tensor_train import TensorTrain, TTOperator, tt_wigner_operator, tt_evolve, tt_steady_state
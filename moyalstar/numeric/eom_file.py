@@ -0,0 +1,229 @@
+"""
+Compact storage of Wigner equations of motion, `∂W/∂t = sum_β c_β ∂^β W`, as
+coefficient tables in a `.npz` file:
+
+    variables          (n_vars,) str     the names of `q_1, p_1, q_2, p_2, ...`
+    subsystems         (N,) str          the subsystem of each mode
+    parameters         (n_params,) str   the names of the other symbols, e.g. 'hbar'
+    parameter_assumptions (n_params,) str
+                                         their assumptions, e.g. 'real=True,positive=True'
+    radicals           (n_rad,) int      the integers whose roots appear in the coefficients
+    derivatives        (n_D, n_vars) int the multi-index `β` of each term
+    offsets            (n_D+1,) int      the monomials of term `k` are `offsets[k]:offsets[k+1]`
+    exponents          (n_mono, n_vars+n_params+n_rad) int
+                                         the exponents of the variables, parameters, and
+                                         radicals, times `exponent_denominator`
+    exponent_denominator () int
+    numerators         (n_mono, 2) int   the real and imaginary parts of the rational
+    denominators       (n_mono, 2) int   prefactors of the monomials
+    coefficients       (n_mono,) complex the same prefactors as floating-point numbers
+
+The exact values are rebuilt from the integer arrays only, so that reading a file
+never evaluates its contents.
+
+This module imports only NumPy at the top level, so that it can be copied into
+solver environments without SymPy. Only `save_eom` and `EOMTables.to_equality`
+need SymPy (and `moyalstar`).
+"""
+
+import numpy as np
+
+__all__ = ["save_eom", "load_eom", "EOMTables"]
+
+FORMAT_VERSION = 2
+
+def save_eom(eom, file, compressed : bool = False):
+    """
+    Write a Wigner equation of motion to `file` in the format of this module.
+
+    Parameters
+    ----------
+
+    eom : sympy.Equality or LindbladMasterEquation
+        The equation `Derivative(W, t) = rhs`, e.g. `LindbladMasterEquation.wigner_transform`,
+        or the master equation itself. Every term of `rhs` must contain `W` or one
+        of its derivatives, with a coefficient that is a sum of products of powers
+        of symbols with rational exponents, exact complex rationals, and rational
+        powers of positive integers.
+
+    file : str, path, or file object
+        Passed to `numpy.savez`.
+
+    compressed : bool, default: False
+        Use `numpy.savez_compressed`.
+    """
+    import sympy as sp
+    from ..core.star_product import _split_W
+
+    if hasattr(eom, "wigner_transform"):
+        eom = eom.wigner_transform
+
+    variables = list(eom.lhs.args[0].args[1:])
+    terms = _split_W(eom.rhs)
+    if sp.Integer(1) in terms:
+        raise ValueError("The equation of motion contains terms without 'W'.")
+
+    free = set().union(*[c.free_symbols for c in terms.values()]) - set(variables)
+    parameters = sorted(free, key=str)
+    for x in parameters:
+        if type(x) is not sp.Symbol:
+            raise ValueError(f"Cannot store the parameter {x}, which is not a plain 'Symbol'.")
+
+    derivatives, offsets, monomials, radicals = [], [0], [], []
+    for D, c in terms.items():
+        orders = dict(D.variable_count) if isinstance(D, sp.Derivative) else {}
+        derivatives.append([int(orders.get(x, 0)) for x in variables])
+        for term in sp.Add.make_args(sp.expand(c)):
+            number, exponents = sp.Integer(1), {}
+            for X in sp.Mul.make_args(term):
+                if X.is_Rational or X is sp.I:
+                    number *= X
+                    continue
+                base, exp = X.as_base_exp()
+                if not(isinstance(exp, sp.Rational)) or not(base in free or base in variables
+                                                             or (base.is_Integer and base > 0)):
+                    raise ValueError(f"Cannot store the factor {X}, which is not a rational "
+                                     "power of a symbol or of a positive integer.")
+                if base.is_Integer and base not in radicals:
+                    radicals.append(base)
+                exponents[base] = exponents.get(base, 0) + exp
+            monomials.append((number, exponents))
+        offsets.append(len(monomials))
+
+    radicals.sort()
+    symbols = variables + parameters + radicals
+    denominator = int(sp.ilcm(1, *[e.q for _, exponents in monomials for e in exponents.values()]))
+    exponents = np.array([[int(exponents.get(x, 0)*denominator) for x in symbols]
+                          for _, exponents in monomials],
+                         dtype=np.int64).reshape(len(monomials), len(symbols))
+
+    def fraction(X):
+        X = sp.Rational(X)
+        if max(abs(X.p), X.q) >= 2**63:
+            raise ValueError(f"Cannot store the coefficient {X}, which exceeds 64-bit integers.")
+        return X.p, X.q
+    fractions = [[fraction(part) for part in number.as_real_imag()] for number, _ in monomials]
+
+    arrays = dict(format_version=np.array(FORMAT_VERSION),
+                  variables=np.array([str(x) for x in variables], dtype=str),
+                  subsystems=np.array([str(x.sub) for x in variables[0::2]], dtype=str),
+                  parameters=np.array([str(x) for x in parameters], dtype=str),
+                  parameter_assumptions=np.array([",".join(f"{key}={val}" for key, val
+                                                           in sorted(x.assumptions0.items()))
+                                                  for x in parameters], dtype=str),
+                  radicals=np.array([int(x) for x in radicals], dtype=np.int64),
+                  derivatives=np.array(derivatives, dtype=np.int64).reshape(len(terms), len(variables)),
+                  offsets=np.array(offsets, dtype=np.int64),
+                  exponents=exponents,
+                  exponent_denominator=np.array(denominator),
+                  numerators=np.array([[n for n, _ in X] for X in fractions],
+                                      dtype=np.int64).reshape(len(monomials), 2),
+                  denominators=np.array([[d for _, d in X] for X in fractions],
+                                        dtype=np.int64).reshape(len(monomials), 2),
+                  coefficients=np.array([complex(number) for number, _ in monomials], dtype=complex))
+
+    (np.savez_compressed if compressed else np.savez)(file, **arrays)
+
+def load_eom(file) -> "EOMTables":
+    """
+    Read a file written by `save_eom`. Only NumPy is needed.
+    """
+    with np.load(file, allow_pickle=False) as data:
+        arrays = {key : data[key] for key in data.files}
+    version = int(arrays.pop("format_version"))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version}, expected {FORMAT_VERSION}.")
+    return EOMTables(**arrays)
+
+class EOMTables():
+    """
+    The coefficient tables of a Wigner equation of motion, as read by `load_eom`.
+    The attributes are the arrays listed in the module docstring.
+    """
+
+    def __init__(self, variables, subsystems, parameters, parameter_assumptions, radicals,
+                 derivatives, offsets, exponents, exponent_denominator, numerators,
+                 denominators, coefficients):
+        self.variables = [str(x) for x in variables]
+        self.subsystems = [str(x) for x in subsystems]
+        self.parameters = [str(x) for x in parameters]
+        self.parameter_assumptions = [str(x) for x in parameter_assumptions]
+        self.radicals = np.asarray(radicals)
+        self.derivatives = np.asarray(derivatives)
+        self.offsets = np.asarray(offsets)
+        self.exponents = np.asarray(exponents)
+        self.exponent_denominator = int(exponent_denominator)
+        self.numerators = np.asarray(numerators)
+        self.denominators = np.asarray(denominators)
+        self.coefficients = np.asarray(coefficients)
+
+    def __len__(self):
+        return len(self.derivatives)
+
+    def evaluate(self, points : np.ndarray, parameters : dict) \
+        -> dict[tuple, np.ndarray]:
+        """
+        The coefficients `c_β` at `points` of shape `(..., n_vars)`, keyed by the
+        multi-index `β` as a tuple. `parameters` maps the names of the parameters
+        to their values, which broadcast against the leading shape of `points`.
+        `pi` defaults to `numpy.pi`.
+        """
+        points = np.asarray(points, dtype=float)
+        values = {"pi" : np.pi, **parameters}
+        missing = [x for x in self.parameters if x not in values]
+        if missing:
+            raise ValueError(f"Missing values of the parameters {missing}.")
+
+        factors = [points[..., i] for i in range(len(self.variables))]
+        factors += [np.asarray(values[x]) for x in self.parameters]
+        factors += [float(x) for x in self.radicals]
+        powers = self.exponents / self.exponent_denominator
+
+        monomials = []
+        for c, row in zip(self.coefficients, powers):
+            X = c
+            for x, e in zip(factors, row):
+                if e != 0:
+                    X = X * x**e
+            monomials.append(np.broadcast_to(X, points.shape[:-1]))
+        monomials = np.array(monomials, dtype=complex).reshape(len(monomials), *points.shape[:-1])
+
+        sums = np.add.reduceat(monomials, self.offsets[:-1], axis=0) if len(self) else monomials
+        return {tuple(int(m) for m in beta) : X for beta, X in zip(self.derivatives, sums)}
+
+    def to_equality(self):
+        """
+        Rebuild the symbolic `Derivative(W, t) = rhs` exactly from the integer
+        tables, without evaluating any string of the file. Requires SymPy.
+        """
+        import sympy as sp
+        from ..core import scalars
+        from ..core.star_product import _differentiate_W_part, _make_index
+
+        variables = [X for sub in self.subsystems for X in (scalars.q(sub), scalars.p(sub))]
+        parameters = [sp.Symbol(x, **_parse_assumptions(assumptions))
+                      for x, assumptions in zip(self.parameters, self.parameter_assumptions)]
+        symbols = variables + parameters + [sp.Integer(int(x)) for x in self.radicals]
+        W = scalars.WignerFunction(scalars.t(), *variables)
+
+        rhs = 0
+        for k, beta in enumerate(self.derivatives):
+            c = 0
+            for j in range(self.offsets[k], self.offsets[k+1]):
+                (re, im), (re_q, im_q) = self.numerators[j], self.denominators[j]
+                number = sp.Rational(int(re), int(re_q)) + sp.I*sp.Rational(int(im), int(im_q))
+                c += number * sp.Mul(
+                    *[x**sp.Rational(int(e), self.exponent_denominator)
+                      for x, e in zip(symbols, self.exponents[j]) if e != 0])
+            index = _make_index({x : int(m) for x, m in zip(variables, beta) if m})
+            rhs += c * _differentiate_W_part(W, index)
+        return sp.Equality(sp.Derivative(W, scalars.t()), rhs)
+
+def _parse_assumptions(assumptions : str) -> dict[str, bool]:
+    out = {}
+    for item in filter(None, assumptions.split(",")):
+        key, _, val = item.partition("=")
+        if val not in ("True", "False"):
+            raise ValueError(f"Invalid assumption {item!r}.")
+        out[key] = (val == "True")
+    return out
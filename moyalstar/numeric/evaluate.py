@@ -0,0 +1,167 @@
+import numpy as np
+import sympy as sp
+
+from ..core import scalars
+from ..core.base import _treat_sub
+from ..core.star_product import _split_W
+from ..utils.multiprocessing import _get_cache
+from .grid import PhaseSpaceGrid
+
+__all__ = ["CompiledExpression"]
+
+_LAMBDIFY_CACHE_SIZE = 256
+
+def _lambdify(args : tuple, exprs : tuple) \
+    -> callable:
+    """
+    `sympy.lambdify` with common-subexpression elimination, cached by the
+    arguments and expressions, so that equal expressions are compiled once.
+    """
+    cache = _get_cache("Lambdify")
+    key = (args, exprs)
+    if key not in cache:
+        if len(cache) >= _LAMBDIFY_CACHE_SIZE:
+            cache.clear()
+        cache[key] = sp.lambdify(args, list(exprs), modules="numpy", cse=True)
+    return cache[key]
+
+class CompiledExpression():
+    """
+    A SymPy expression in the phase-space variables, `hbar`, and any other
+    parameters, compiled once into a vectorized NumPy function that evaluates
+    it for batches of parameter values at batches of points.
+
+    If the expression contains `W` or its derivatives, e.g. the right-hand side
+    of an equation of motion or the output of `collect_by_derivative`, their
+    coefficients are compiled together and evaluated as a dictionary.
+
+    Parameters
+    ----------
+
+    expr : sympy.Expr
+        The expression to compile.
+
+    subs : list, optional
+        The subsystems whose `q` and `p` are the coordinates of the points, in
+        this order. By default those of `expr`, sorted by name.
+
+    parameters : list of sympy.Symbol, optional
+        The other symbols of `expr`, in the order of `parameter_names`. By default
+        all remaining free symbols except `hbar`, sorted by name.
+
+    Examples
+    --------
+
+    >>> f = CompiledExpression(WignerTransform(Dagger(a)*a*rho))
+    >>> f(points, {gamma : np.linspace(0, 1, 100)})
+
+    evaluates at every point for each of the 100 values of `gamma`.
+    """
+
+    def __init__(self, expr : sp.Expr, subs : None | list = None,
+                 parameters : None | list = None):
+        expr = sp.sympify(expr).subs(scalars.pi, sp.pi)
+
+        if expr.has(scalars.WignerFunction):
+            terms = _split_W(expr)
+            self.derivatives = list(terms.keys())
+            exprs = tuple(terms.values())
+        else:
+            self.derivatives = None
+            exprs = (expr,)
+
+        if subs is None:
+            subs = sorted({X.sub for X in sp.Add(*exprs).atoms(scalars.q, scalars.p)}, key=str)
+        else:
+            subs = [_treat_sub(sub, True) for sub in subs]
+        self.subs = subs
+        self.variables = [X for sub in subs for X in (scalars.q(sub), scalars.p(sub))]
+
+        free = set().union(*[X.free_symbols for X in exprs]) - set(self.variables) - {scalars.hbar}
+        if parameters is None:
+            parameters = sorted(free, key=str)
+        else:
+            by_name = {str(x) : x for x in free}
+            parameters = [by_name.get(x, sp.Symbol(x)) if isinstance(x, str) else x
+                          for x in parameters]
+            missing = free - set(parameters)
+            if missing:
+                raise ValueError(f"The expression also depends on {sorted(missing, key=str)}.")
+        self.parameters = parameters
+
+        self.exprs = exprs
+        self._foo = _lambdify(tuple(self.variables) + (scalars.hbar,) + tuple(parameters),
+                              exprs)
+
+    @property
+    def parameter_names(self) -> list[str]:
+        return [str(x) for x in self.parameters]
+
+    def __call__(self, points : PhaseSpaceGrid | np.ndarray,
+                 parameters : None | dict = None, hbar : None | float = None) \
+        -> np.ndarray | dict:
+        """
+        Evaluate the expression.
+
+        Parameters
+        ----------
+
+        points : PhaseSpaceGrid or numpy.ndarray
+            A grid, whose variables must include those of the expression, or
+            points of shape `(..., 2N)` ordered as `variables`.
+
+        parameters : dict, optional
+            The values of the parameters, keyed by symbol or name. Arrays are
+            broadcast against each other into the batch shape.
+
+        hbar : float, optional
+            The numerical value of `hbar`. By default that of the grid, or 1.0.
+
+        Returns
+        -------
+
+        numpy.ndarray or dict
+            Of shape `batch_shape + points_shape`, where `points_shape` is the
+            shape of the grid or the leading shape of the points. If the
+            expression contains `W`, a dictionary of such arrays keyed by `W`
+            and its derivatives.
+        """
+        if isinstance(points, PhaseSpaceGrid):
+            grid_variables = points.variables
+            missing = [x for x in self.variables if x not in grid_variables]
+            if missing:
+                raise ValueError(f"The grid has no axes for {missing}.")
+            mesh = points.mesh()
+            coords = [mesh[grid_variables.index(x)] for x in self.variables]
+            points_shape = points.shape
+            hbar = points.hbar if hbar is None else hbar
+        else:
+            points = np.asarray(points, dtype=float)
+            if points.ndim == 0 or points.shape[-1] != len(self.variables):
+                raise ValueError(f"Expected points of shape (..., {len(self.variables)}), "
+                                 f"got {points.shape}.")
+            coords = [points[..., i] for i in range(len(self.variables))]
+            points_shape = points.shape[:-1]
+        hbar = 1.0 if hbar is None else float(hbar)
+
+        by_name = dict(zip(self.parameter_names, self.parameters))
+        values = {(by_name.get(k, k) if isinstance(k, str) else k) : 
+                  (complex(v) if isinstance(v, sp.Basic) else v)
+                  for k, v in (parameters or {}).items()}
+        missing = [x for x in self.parameters if x not in values]
+        if missing:
+            raise ValueError(f"Missing values of the parameters {missing}.")
+        params = [np.asarray(values[x]) for x in self.parameters]
+        batch_shape = np.broadcast_shapes(*[X.shape for X in params])
+        params = [np.broadcast_to(X, batch_shape).reshape(batch_shape + (1,)*len(points_shape))
+                  for X in params]
+
+        shape = batch_shape + points_shape
+        out = [np.broadcast_to(X, shape).astype(complex)
+               for X in self._foo(*coords, hbar, *params)]
+        if self.derivatives is None:
+            return out[0]
+        return dict(zip(self.derivatives, out))
+
+    def __repr__(self):
+        return f"CompiledExpression({self.exprs}, variables={self.variables}, parameters={self.parameters})"
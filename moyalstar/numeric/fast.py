@@ -0,0 +1,316 @@
+import numpy as np
+import sympy as sp
+import sympy.physics.quantum as spq
+from itertools import product
+from math import factorial
+
+from ..core import scalars
+from ..core.star_product import _split_W, _differentiate_W_part, _make_index
+
+__all__ = ["NumericPoly", "numeric_star", "numeric_wigner_transform"]
+
+class NumericPoly():
+    """
+    A polynomial in the phase-space variables, optionally linear in `W` and its
+    derivatives, with complex floating-point coefficients. Term `j` is
+
+    `coeffs[j] * prod_k q_k**a * p_k**b * ∂q_k**m ∂p_k**n [W]`,
+
+    where `(a, b, m, n) = exps[j, 4k:4k+4]` for the `k`-th subsystem of `subs`.
+    The derivative orders are zero if `has_W` is false.
+
+    Only this structure is symbolic. `hbar` and the parameters are numbers, so
+    that the ★-products are computed with array arithmetic instead of `expand`.
+    Terms whose coefficient is at most `tol` times the largest one are dropped.
+
+    Use `from_expr` to convert a SymPy expression, and `to_expr` to convert back.
+    """
+
+    def __init__(self, subs : tuple, exps : np.ndarray, coeffs : np.ndarray,
+                 has_W : bool = False, hbar : float = 1.0, tol : float = 1e-12,
+                 W : None | sp.Expr = None):
+        self.subs = tuple(subs)
+        self.coeffs = np.asarray(coeffs, dtype=complex).reshape(-1)
+        self.exps = np.asarray(exps, dtype=np.int64).reshape(len(self.coeffs), 4*len(self.subs))
+        self.has_W = bool(has_W)
+        self.hbar = float(hbar)
+        self.tol = float(tol)
+        self.W = W
+        self._canonicalize()
+
+    @classmethod
+    def from_expr(cls, expr : sp.Expr, hbar : float = 1.0,
+                  parameters : None | dict = None, tol : float = 1e-12) -> "NumericPoly":
+        """
+        Convert `expr`, substituting the numerical values of `hbar`, `pi`, and
+        the `parameters` (keyed by symbol or name).
+        """
+        expr = sp.sympify(expr)
+        by_name = {str(x) : x for x in expr.free_symbols}
+        values = {scalars.hbar : hbar, scalars.pi : np.pi}
+        for k, v in (parameters or {}).items():
+            values[by_name.get(k, sp.Symbol(k)) if isinstance(k, str) else k] = v
+        expr = sp.expand(expr.xreplace({k : sp.sympify(v) for k, v in values.items()}))
+
+        Ws = expr.atoms(scalars.WignerFunction)
+        if len(Ws) > 1:
+            raise ValueError("The expression contains several Wigner functions.")
+        W = Ws.pop() if Ws else None
+        subs = {X.sub for X in expr.atoms(scalars.q, scalars.p)}
+        if W is not None:
+            subs |= {X.sub for X in W.args[1:]}
+        subs = tuple(sorted(subs, key=str))
+        variables = [X for sub in subs for X in (scalars.q(sub), scalars.p(sub))]
+
+        terms = _split_W(expr) if (W is not None) else {sp.Integer(1) : expr}
+        if (W is not None) and (sp.Integer(1) in terms):
+            raise ValueError("The expression contains terms without 'W'.")
+
+        exps, coeffs = [], []
+        for D, c in terms.items():
+            orders = dict(D.variable_count) if isinstance(D, sp.Derivative) else {}
+            W_exps = [int(orders.get(x, 0)) for x in variables]
+            if not(variables):
+                poly_terms = [((), c)]
+            else:
+                poly_terms = sp.Poly(c, *variables).terms()
+            for monomial, coeff in poly_terms:
+                if coeff.free_symbols:
+                    raise ValueError(f"Missing values of the parameters {sorted(coeff.free_symbols, key=str)}.")
+                row = []
+                for k in range(len(subs)):
+                    row += [monomial[2*k], monomial[2*k+1], W_exps[2*k], W_exps[2*k+1]]
+                exps.append(row)
+                coeffs.append(complex(coeff))
+        return cls(subs, exps, coeffs, has_W=(W is not None), hbar=hbar, tol=tol, W=W)
+
+    def to_expr(self) -> sp.Expr:
+        """
+        The SymPy expression, with floating-point coefficients.
+        """
+        variables = [X for sub in self.subs for X in (scalars.q(sub), scalars.p(sub))]
+        out = []
+        for row, c in zip(self.exps, self.coeffs):
+            c = sp.Float(c.real) + sp.I*sp.Float(c.imag) if c.imag else sp.Float(c.real)
+            term = c * sp.Mul(*[x**int(e) for x, e in zip(variables, row.reshape(-1, 4)[:, :2].ravel())])
+            if self.has_W:
+                index = _make_index({x : int(e) for x, e in zip(variables, row.reshape(-1, 4)[:, 2:].ravel())
+                                     if e})
+                term *= _differentiate_W_part(self.W, index)
+            out.append(term)
+        return sp.Add(*out)
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def __repr__(self):
+        return f"NumericPoly({len(self)} terms, subs={list(self.subs)}, has_W={self.has_W})"
+
+    ########################################################
+
+    def _new(self, subs, exps, coeffs, has_W, W) -> "NumericPoly":
+        return NumericPoly(subs, exps, coeffs, has_W=has_W, hbar=self.hbar, tol=self.tol, W=W)
+
+    def _canonicalize(self):
+        """
+        Merge the equal monomials and drop the negligible terms.
+        """
+        if not(len(self.coeffs)):
+            return
+        exps, inverse = np.unique(self.exps, axis=0, return_inverse=True)
+        coeffs = np.zeros(len(exps), dtype=complex)
+        np.add.at(coeffs, inverse.ravel(), self.coeffs)
+        keep = np.abs(coeffs) > self.tol * np.abs(coeffs).max()
+        self.exps, self.coeffs = exps[keep], coeffs[keep]
+
+    def _aligned(self, subs : tuple) -> np.ndarray:
+        """
+        The exponents with the columns of the subsystems `subs`, a superset of those of `self`.
+        """
+        out = np.zeros((len(self), 4*len(subs)), dtype=np.int64)
+        for k, sub in enumerate(self.subs):
+            j = subs.index(sub)
+            out[:, 4*j:4*j+4] = self.exps[:, 4*k:4*k+4]
+        return out
+
+    def _coerce(self, other) -> tuple:
+        if not(isinstance(other, NumericPoly)):
+            other = NumericPoly(self.subs, np.zeros((1, 4*len(self.subs))), [complex(other)],
+                                hbar=self.hbar, tol=self.tol)
+        if other.hbar != self.hbar:
+            raise ValueError("The polynomials have different values of 'hbar'.")
+        subs = tuple(sorted(set(self.subs) | set(other.subs), key=str))
+        return other, subs
+
+    def __add__(self, other):
+        other, subs = self._coerce(other)
+        if not(len(other)):
+            return self
+        if not(len(self)):
+            return other
+        if self.has_W != other.has_W:
+            raise ValueError("Cannot add terms with and without 'W'.")
+        return self._new(subs, np.concatenate([self._aligned(subs), other._aligned(subs)]),
+                         np.concatenate([self.coeffs, other.coeffs]),
+                         self.has_W, self.W if (self.W is not None) else other.W)
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self * (-1)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        """
+        The pointwise product, or the product with a number.
+        """
+        other, subs = self._coerce(other)
+        if self.has_W and other.has_W:
+            raise ValueError("The product would not be linear in 'W'.")
+        exps = self._aligned(subs)[:, None, :] + other._aligned(subs)[None, :, :]
+        coeffs = self.coeffs[:, None] * other.coeffs[None, :]
+        return self._new(subs, exps.reshape(len(self)*len(other), 4*len(subs)), coeffs.ravel(),
+                         self.has_W or other.has_W, self.W if self.has_W else other.W)
+    __rmul__ = __mul__
+
+    def diff(self, sub, column : int, order : int = 1) -> "NumericPoly":
+        """
+        The `order`-th derivative with respect to `q` (`column = 0`) or `p`
+        (`column = 1`) of the subsystem `sub`. On the `W` part, the derivative
+        raises the corresponding derivative order (`column + 2`).
+        """
+        out = self
+        if (sub not in self.subs) and order:
+            return self._new(self.subs, np.zeros((0, 4*len(self.subs))), [], self.has_W, self.W)
+        col = 4*self.subs.index(sub) + column
+        for _ in range(order):
+            exps, coeffs = out.exps, out.coeffs
+            mask = exps[:, col] > 0
+            new_exps, new_coeffs = [exps[mask].copy()], [coeffs[mask] * exps[mask, col]]
+            new_exps[0][:, col] -= 1
+            if self.has_W:
+                W_exps = exps.copy()
+                W_exps[:, col+2] += 1
+                new_exps.append(W_exps)
+                new_coeffs.append(coeffs)
+            out = self._new(self.subs, np.concatenate(new_exps), np.concatenate(new_coeffs),
+                            self.has_W, self.W)
+        return out
+
+    def _degrees(self) -> np.ndarray:
+        """
+        The highest powers of `q` and `p` of each subsystem, shape `(N, 2)`.
+        """
+        if not(len(self)):
+            return np.zeros((len(self.subs), 2), dtype=np.int64)
+        return self.exps.reshape(len(self), -1, 4)[:, :, :2].max(axis=0)
+
+    def star(self, other : "NumericPoly") -> "NumericPoly":
+        """
+        The Moyal ★-product,
+
+        `F★G = sum_{α,β} (iħ/2)^(|α|+|β|) (-1)^|β| / (α!β!) (∂q^α ∂p^β F)(∂p^α ∂q^β G)`,
+
+        which is a finite sum since at least one of `F` and `G` is a polynomial
+        without `W`, whose degrees bound `α` and `β`.
+        """
+        other, subs = self._coerce(other)
+        if self.has_W and other.has_W:
+            raise ValueError("Both inputs cannot be properly Bopp shifted.")
+        F = self._new(subs, self._aligned(subs), self.coeffs, self.has_W, self.W)
+        G = other._new(subs, other._aligned(subs), other.coeffs, other.has_W, other.W)
+
+        bound = np.full((len(subs), 2), np.iinfo(np.int64).max)
+        if not(F.has_W):
+            bound = np.minimum(bound, F._degrees())
+        if not(G.has_W):
+            bound = np.minimum(bound, G._degrees()[:, ::-1])
+
+        # The derivatives of each factor, built incrementally along the multi-indices.
+        def derivatives(X : "NumericPoly", first : int):
+            cache = {(0,)*2*len(subs) : X}
+            def get(index : tuple):
+                if index not in cache:
+                    i = max(j for j, n in enumerate(index) if n)
+                    parent = get(index[:i] + (index[i]-1,) + index[i+1:])
+                    # `index` holds (α_k, β_k), the orders in (first, other) variables.
+                    column = first if (i % 2 == 0) else 1 - first
+                    cache[index] = parent.diff(subs[i // 2], column)
+                return cache[index]
+            return get
+        dF, dG = derivatives(F, 0), derivatives(G, 1)
+
+        out = F._new(subs, np.zeros((0, 4*len(subs))), [], F.has_W or G.has_W,
+                     F.W if F.has_W else G.W)
+        for index in product(*[range(int(n)+1) for n in bound.ravel()]):
+            alpha, beta = index[0::2], index[1::2]
+            factor = (0.5j*self.hbar)**(sum(alpha)+sum(beta)) * (-1)**sum(beta) \
+                     / np.prod([factorial(n) for n in index])
+            X, Y = dF(index), dG(index)
+            if len(X) and len(Y):
+                out = out + (X * Y) * factor
+        return out
+
+############################################################
+
+def numeric_star(*args, hbar : float = 1.0, parameters : None | dict = None,
+                 tol : float = 1e-12) -> NumericPoly:
+    """
+    The ★-product of `args`, like `Star`, with the numerical values of `hbar`
+    and the `parameters`, carrying floating-point coefficients. Use `to_expr`
+    to obtain the SymPy expression.
+    """
+    out = NumericPoly.from_expr(1, hbar=hbar, tol=tol)
+    for arg in args:
+        if not(isinstance(arg, NumericPoly)):
+            arg = NumericPoly.from_expr(arg, hbar=hbar, parameters=parameters, tol=tol)
+        out = out.star(arg)
+    return out
+
+def numeric_wigner_transform(A : sp.Expr, hbar : float = 1.0,
+                             parameters : None | dict = None,
+                             tol : float = 1e-12) -> NumericPoly:
+    """
+    The Wigner transform of `A`, like `WignerTransform`, with the numerical
+    values of `hbar` and the `parameters`, carrying floating-point coefficients.
+    Products of operators are computed with `NumericPoly.star`, without
+    expanding `A`.
+    """
+    from ..core.hilbert_operators import Operator
+    from ..core.wigner_transform import WignerTransform
+
+    def convert(X):
+        return NumericPoly.from_expr(X, hbar=hbar, parameters=parameters, tol=tol)
+
+    def transform(A):
+        if not(A.has(Operator)):
+            return convert(A)
+        if isinstance(A, Operator):
+            return convert(A.wigner_transform())
+        if isinstance(A, sp.Add):
+            out = transform(A.args[0])
+            for A_ in A.args[1:]:
+                out = out + transform(A_)
+            return out
+        if isinstance(A, sp.Mul):
+            out = convert(1)
+            for A_ in A.args:
+                out = out.star(transform(A_))
+            return out
+        if isinstance(A, (spq.Commutator, spq.AntiCommutator)):
+            X, Y = [transform(A_) for A_ in A.args]
+            sign = -1 if isinstance(A, spq.Commutator) else 1
+            return X.star(Y) + Y.star(X) * sign
+        if isinstance(A, sp.Pow) and isinstance(A.args[1], sp.Integer) and A.args[1] > 0:
+            base = transform(A.args[0])
+            out = base
+            for _ in range(int(A.args[1]) - 1):
+                out = out.star(base)
+            return out
+        return convert(WignerTransform(A))
+
+    return transform(sp.sympify(A))
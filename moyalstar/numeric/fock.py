@@ -0,0 +1,172 @@
+import numpy as np
+
+from ..utils.multiprocessing import _get_cache
+from .grid import PhaseSpaceGrid
+
+__all__ = ["fock_wigner"]
+
+def _fock_basis(alpha : np.ndarray, dim : int) \
+    -> np.ndarray:
+    """
+    The Wigner functions of `|m><n|` for `m, n < dim`, times `πħ`, at the
+    points `alpha = (q + i*p)/sqrt(2ħ)`, with shape `(dim, dim) + alpha.shape`.
+
+    These are `(-1)^m sqrt(m!/n!) (2α)^(n-m) L_m^(n-m)(4|α|²) exp(-2|α|²)` for
+    `m <= n`, computed column by column with the recurrences of the Laguerre
+    polynomials, each step being vectorized over the points and the rows,
+
+        `B[m, n] = (2α B[m, n-1] - sqrt(m) B[m-1, n-1]) / sqrt(n)`, for `m < n`,
+        `B[n, n] = (2α* B[n-1, n] - sqrt(n) B[n-1, n-1]) / sqrt(n)`,
+
+    and `B[n, m] = B[m, n]*`.
+    """
+    B = np.zeros((dim, dim) + alpha.shape, dtype=complex)
+    B[0, 0] = np.exp(-2*np.abs(alpha)**2)
+    sqrt = np.sqrt(np.arange(dim)).reshape((dim,) + (1,)*alpha.ndim)
+    for n in range(1, dim):
+        B[:n, n] = 2*alpha * B[:n, n-1]
+        B[1:n, n] -= sqrt[1:n] * B[:n-1, n-1]
+        B[:n, n] /= sqrt[n]
+        B[n, n] = (2*np.conj(alpha) * B[n-1, n] - sqrt[n] * B[n-1, n-1]) / sqrt[n]
+        B[n, :n] = np.conj(B[:n, n])
+    return B
+
+_FOCK_CACHE_SIZE = 16
+
+def _grid_basis(grid : PhaseSpaceGrid, mode : int, dim : int, hbar : float) \
+    -> np.ndarray:
+    """
+    `_fock_basis` on the `(q, p)` plane of one mode of `grid`, cached by the
+    axes of the mode, so that grids sharing them reuse it.
+    """
+    q_axis, p_axis = grid.axes[2*mode], grid.axes[2*mode+1]
+    key = (tuple(grid.bounds[2*mode:2*mode+2]), tuple(grid.points[2*mode:2*mode+2]),
+           hbar, dim)
+    cache = _get_cache("FockBasis")
+    if key not in cache:
+        if len(cache) >= _FOCK_CACHE_SIZE:
+            cache.clear()
+        alpha = (q_axis[:, None] + 1j*p_axis[None, :]) / np.sqrt(2*hbar)
+        cache[key] = _fock_basis(alpha, dim)
+    return cache[key]
+
+def _as_density_tensor(rho : np.ndarray, dims : None | list, num_modes : int) \
+    -> tuple[np.ndarray, list]:
+    """
+    Bring `rho` into the shape `(m_1, n_1, m_2, n_2, ...)`.
+    """
+    rho = np.asarray(rho, dtype=complex)
+    if rho.ndim == 1:
+        rho = np.outer(rho, np.conj(rho))
+
+    if dims is None:
+        if rho.ndim == 2*num_modes:
+            dims = list(rho.shape[:num_modes])
+        elif num_modes == 1 and rho.ndim == 2:
+            dims = [rho.shape[0]]
+        else:
+            raise ValueError(f"Cannot infer the dimensions of the {num_modes} modes "
+                             f"from a density matrix of shape {rho.shape}. Pass 'dims'.")
+    dims = [int(d) for d in dims]
+    if len(dims) != num_modes:
+        raise ValueError(f"Expected the dimensions of {num_modes} modes, got {dims}.")
+    if rho.size != int(np.prod(dims))**2:
+        raise ValueError(f"A density matrix of shape {rho.shape} does not match the dimensions {dims}.")
+
+    rho = rho.reshape(dims + dims)
+    order = [i for k in range(num_modes) for i in (k, num_modes+k)]
+    return rho.transpose(order), dims
+
+def fock_wigner(rho : np.ndarray, where : PhaseSpaceGrid | np.ndarray,
+                dims : None | list = None, hbar : None | float = None,
+                max_chunk_elements : int = 2**22) \
+    -> np.ndarray:
+    """
+    Evaluate the Wigner function of a density matrix given in the Fock basis,
+
+    `W(q, p) = sum_{m,n} rho[m, n] W_{mn}(q, p)`,
+
+    where `W_{mn}` is the Wigner function of `|m><n|`, with the conventions of
+    `scalars`: `alpha = (q + i*p)/sqrt(2ħ)` and `W` integrates to one, so that the
+    vacuum is `exp(-(q²+p²)/ħ)/(πħ)`. For several modes, `W_{mn}` is the product of
+    the single-mode functions, and `rho` may be entangled.
+
+    Parameters
+    ----------
+
+    rho : numpy.ndarray
+        The density matrix, either of shape `(D, D)` with `D` the product of
+        `dims`, or of shape `dims + dims`. A state vector of shape `(D,)` is
+        turned into `|ψ><ψ|`.
+
+    where : PhaseSpaceGrid or numpy.ndarray
+        Either a grid, in which case the output has the shape of the grid and the
+        Fock basis functions of each mode are cached for reuse, or scattered points
+        of shape `(..., 2N)` ordered as `(q_1, p_1, q_2, p_2, ...)`, in which case the
+        output has the leading shape of the points.
+
+    dims : list of ints, optional
+        The Fock-space dimension of each mode, needed only if `rho` has shape
+        `(D, D)` and there are several modes.
+
+    hbar : float, optional
+        The numerical value of `hbar`. By default that of the grid, or 1.0.
+
+    max_chunk_elements : int, default: 2**22
+        The points are processed in chunks such that the intermediate arrays have
+        at most about this many elements.
+
+    Returns
+    -------
+
+    numpy.ndarray
+        Real if `rho` is Hermitian, complex otherwise.
+    """
+    is_grid = isinstance(where, PhaseSpaceGrid)
+    if is_grid:
+        num_modes = where.num_modes
+        hbar = where.hbar if hbar is None else float(hbar)
+    else:
+        where = np.asarray(where, dtype=float)
+        if where.ndim == 0 or where.shape[-1] % 2:
+            raise ValueError(f"Points of shape {where.shape} are not of the shape (..., 2N).")
+        num_modes = where.shape[-1] // 2
+        hbar = 1.0 if hbar is None else float(hbar)
+
+    rho, dims = _as_density_tensor(rho, dims, num_modes)
+    swap = [i for k in range(num_modes) for i in (2*k+1, 2*k)]
+    is_hermitian = np.allclose(rho, np.conj(rho.transpose(swap)))
+    rest = int(np.prod([d**2 for d in dims[1:]]))
+
+    if is_grid:
+        bases = [_grid_basis(where, k, d, hbar) for k, d in enumerate(dims)]
+
+        # Chunks of the points of the first mode.
+        B_1 = bases[0].reshape(dims[0], dims[0], -1)
+        other_points = int(np.prod(where.shape[2:]))
+        chunk = max(1, max_chunk_elements // max(rest, other_points))
+        out = np.empty((B_1.shape[-1],) + where.shape[2:], dtype=complex)
+        for start in range(0, B_1.shape[-1], chunk):
+            X = np.tensordot(B_1[..., start:start+chunk], rho, axes=([0, 1], [0, 1]))
+            for B in bases[1:]:
+                # The indices of the next mode are always the axes 1 and 2, and
+                # the points of the contracted modes are appended in order.
+                X = np.tensordot(X, B, axes=([1, 2], [0, 1]))
+            out[start:start+chunk] = X
+        out = out.reshape(where.shape)
+    else:
+        points = where.reshape(-1, 2*num_modes)
+        alphas = (points[:, 0::2] + 1j*points[:, 1::2]) / np.sqrt(2*hbar)
+        chunk = max(1, max_chunk_elements // (dims[0]**2 * rest))
+        out = np.empty(len(points), dtype=complex)
+        for start in range(0, len(points), chunk):
+            X = rho
+            for k, d in enumerate(dims):
+                B = _fock_basis(alphas[start:start+chunk, k], d)
+                subscripts = "ab...,abP->...P" if k == 0 else "ab...P,abP->...P"
+                X = np.einsum(subscripts, X, B)
+            out[start:start+chunk] = X
+        out = out.reshape(where.shape[:-1])
+
+    out /= (np.pi*hbar)**num_modes
+    return out.real if is_hermitian else out
@@ -0,0 +1,164 @@
+import numpy as np
+import sympy as sp
+
+from ..core import scalars
+from ..core.base import _treat_sub
+
+__all__ = ["PhaseSpaceGrid"]
+
+class PhaseSpaceGrid():
+    """
+    A regular grid on the phase space of `N` modes, on which functions are
+    sampled as arrays whose last `2N` axes are `(q_1, p_1, q_2, p_2, ...)`.
+    Any leading axes are batch axes.
+
+    Parameters
+    ----------
+
+    bounds : tuple or list of tuples
+        The interval `(lo, hi)` of every axis, or one interval per axis in the
+        order `(q_1, p_1, q_2, p_2, ...)`. The points are `lo + j*(hi-lo)/M`
+        for `j = 0, ..., M-1`.
+
+    points : int or list of ints
+        The number of points `M` of every axis, or one per axis.
+
+    subs : list, optional
+        The subsystems of the modes, used to sample SymPy expressions. By
+        default a single mode with the empty subsystem.
+
+    hbar : float, default: 1.0
+        The numerical value of `hbar`.
+    """
+
+    def __init__(self, bounds, points, subs : None | list = None, hbar : float = 1.0):
+        self.subs = [_treat_sub(sub, True) for sub in (subs if subs is not None else [None])]
+        num_axes = 2*len(self.subs)
+
+        if np.ndim(bounds) == 1:
+            bounds = [bounds]*num_axes
+        if np.ndim(points) == 0:
+            points = [points]*num_axes
+        if len(bounds) != num_axes or len(points) != num_axes:
+            raise ValueError(f"Expected the bounds and points of {num_axes} axes.")
+
+        self.bounds = [(float(lo), float(hi)) for lo, hi in bounds]
+        self.points = [int(M) for M in points]
+        self.hbar = float(hbar)
+
+        self.spacings = [(hi-lo)/M for (lo, hi), M in zip(self.bounds, self.points)]
+        self.axes = [lo + dz*np.arange(M)
+                     for (lo, _), dz, M in zip(self.bounds, self.spacings, self.points)]
+        self.frequencies = [2*np.pi*np.fft.fftfreq(M, dz)
+                            for dz, M in zip(self.spacings, self.points)]
+
+    @property
+    def num_modes(self) -> int:
+        return len(self.subs)
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(self.points)
+
+    @property
+    def variables(self) -> list:
+        """
+        The SymPy variables of the axes, `[q(sub_1), p(sub_1), ...]`.
+        """
+        return [X for sub in self.subs for X in (scalars.q(sub), scalars.p(sub))]
+
+    def mesh(self) -> list[np.ndarray]:
+        return np.meshgrid(*self.axes, indexing="ij")
+
+    def sample(self, expr : sp.Expr, parameters : None | dict = None) \
+        -> np.ndarray:
+        """
+        Evaluate the SymPy expression `expr` in the variables of the grid on
+        its points. `hbar` and `pi` take their numerical values, and any other
+        symbol must be given in `parameters`. The compiled function is cached,
+        see `CompiledExpression`.
+        """
+        from .evaluate import CompiledExpression
+        return CompiledExpression(expr, subs=self.subs)(self, parameters)
+
+    def star(self, *args, max_chunk_elements : int = 2**22) \
+        -> np.ndarray:
+        """
+        The Moyal star-product of functions sampled on the grid, ordered from
+        first to last, with their batch axes broadcast.
+
+        The product is computed in Fourier space as the twisted convolution
+
+        `H(K) = (2π)^(-2N) ∫ F(k) G(K-k) exp(-iħ/2 k∧K) dk`,  `k∧K = k_q·K_p - k_p·K_q`,
+
+        where the sum over the `p`-frequencies is, for each pair of
+        `q`-frequencies `(K_q, k_q)`, an ordinary convolution done with FFTs.
+        This costs `O(M^(3N) log M)`, and the `K_q` are processed in chunks of
+        at most `max_chunk_elements` intermediate elements.
+
+        The functions must decay within the grid and be resolved by it, since
+        the transforms are periodic.
+        """
+        if not(args):
+            return np.ones(self.shape, dtype=complex)
+        out = np.asarray(args[0], dtype=complex)
+        for arg in args[1:]:
+            out = self._star_base(out, np.asarray(arg, dtype=complex), max_chunk_elements)
+        return out
+
+    def _star_base(self, f : np.ndarray, g : np.ndarray, max_chunk_elements : int) \
+        -> np.ndarray:
+        N = self.num_modes
+        grid_axes = tuple(range(-2*N, 0))
+        batch_shape = np.broadcast_shapes(f.shape[:-2*N], g.shape[:-2*N])
+        f = np.broadcast_to(f, batch_shape + self.shape)
+        g = np.broadcast_to(g, batch_shape + self.shape)
+        B = len(batch_shape)
+
+        # Reorder the axes into (batch..., q_1, ..., q_N, p_1, ..., p_N).
+        order = list(range(B)) + [B + 2*i for i in range(N)] + [B + 2*i+1 for i in range(N)]
+        F = np.fft.fftn(f, axes=grid_axes).transpose(order)
+        G = np.fft.fftn(g, axes=grid_axes).transpose(order)
+
+        M_q = [self.points[2*i] for i in range(N)]
+        M_p = [self.points[2*i+1] for i in range(N)]
+        n_q, n_p = int(np.prod(M_q)), int(np.prod(M_p))
+        p_axes = tuple(range(-N, 0))
+        F = F.reshape(batch_shape + (n_q,) + tuple(M_p))
+        G = G.reshape(batch_shape + (n_q,) + tuple(M_p))
+
+        # The q- and p-frequencies, flattened over the modes.
+        k_q = np.stack([X.ravel() for X in
+                        np.meshgrid(*[self.frequencies[2*i] for i in range(N)], indexing="ij")])
+        k_p = np.meshgrid(*[self.frequencies[2*i+1] for i in range(N)], indexing="ij")
+        idx_q = np.stack([X.ravel() for X in
+                          np.meshgrid(*[np.arange(M) for M in M_q], indexing="ij")])
+
+        # Mixed representation of g, Fourier in q and real in p.
+        G_mixed = np.fft.ifftn(G, axes=p_axes)
+
+        # exp(-iħ/2 k_q·K_p), indexed by (k_q, K_p...).
+        phase_out = np.exp(-0.5j*self.hbar*sum(k_q[i][(slice(None),) + (None,)*N] * k_p[i]
+                                               for i in range(N)))
+
+        chunk = max(1, max_chunk_elements // max(1, int(np.prod(batch_shape, dtype=int)) * n_q * n_p))
+        H = np.empty(batch_shape + (n_q,) + tuple(M_p), dtype=complex)
+        for start in range(0, n_q, chunk):
+            K = np.arange(start, min(start+chunk, n_q))
+
+            # exp(iħ/2 k_p·K_q), indexed by (K_q, k_p...).
+            phase_in = np.exp(0.5j*self.hbar*sum(k_q[i][K][(slice(None),) + (None,)*N] * k_p[i]
+                                                 for i in range(N)))
+            A = np.fft.ifftn(F[(Ellipsis, None) + (slice(None),)*(N+1)]
+                             * phase_in[:, None, ...], axes=p_axes)
+
+            # Flat index of K_q - k_q, modulo the grid.
+            diff = (idx_q[:, K][:, :, None] - idx_q[:, None, :]) % np.array(M_q)[:, None, None]
+            diff = np.ravel_multi_index(tuple(diff), M_q)
+            C = np.fft.fftn(A * np.take(G_mixed, diff, axis=B), axes=p_axes)
+
+            H[(Ellipsis, K) + (slice(None),)*N] = (C * phase_out).sum(axis=-N-1) / n_q
+
+        H = H.reshape(batch_shape + tuple(M_q) + tuple(M_p))
+        inverse = np.argsort(order)
+        return np.fft.ifftn(H.transpose(inverse), axes=grid_axes)
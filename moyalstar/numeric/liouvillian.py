@@ -0,0 +1,160 @@
+import numpy as np
+import sympy as sp
+import scipy.sparse as sps
+
+from ..core import scalars
+from ..core.base import _treat_sub
+from ..core.hilbert_operators import Operator, qOp, pOp, createOp, annihilateOp, densityOp
+from ..utils.multiprocessing import _get_cache
+
+__all__ = ["fock_operator", "liouvillian"]
+
+_FOCK_OPERATOR_CACHE_SIZE = 64
+
+def _mode_operator(kind : type, dim : int, hbar : float) -> sps.csr_matrix:
+    """
+    The sparse matrix of `qOp`, `pOp`, `createOp`, or `annihilateOp` in the Fock
+    basis `|0>, ..., |dim-1>` of one mode, cached by the kind, `dim`, and `hbar`.
+    With `a = (q + i*p)/sqrt(2ħ)`, `q = sqrt(ħ/2)(a + a†)` and `p = -i sqrt(ħ/2)(a - a†)`.
+    """
+    key = (kind.__name__, dim, hbar)
+    cache = _get_cache("FockOperators")
+    if key not in cache:
+        if len(cache) >= _FOCK_OPERATOR_CACHE_SIZE:
+            cache.clear()
+        a = sps.diags(np.sqrt(np.arange(1, dim, dtype=complex)), 1, shape=(dim, dim), format="csr")
+        ad = a.T.tocsr()
+        c = np.sqrt(hbar/2)
+        cache[key] = {annihilateOp : a,
+                      createOp : ad,
+                      qOp : (c*(a + ad)).tocsr(),
+                      pOp : (-1j*c*(a - ad)).tocsr()}[kind]
+    return cache[key]
+
+def _as_dims(dims, subs : list) -> list[int]:
+    if np.ndim(dims) == 0 and not(isinstance(dims, dict)):
+        return [int(dims)]*len(subs)
+    if isinstance(dims, dict):
+        dims = {_treat_sub(k, True) : v for k, v in dims.items()}
+        missing = [sub for sub in subs if sub not in dims]
+        if missing:
+            raise ValueError(f"Missing the dimensions of the subsystems {missing}.")
+        return [int(dims[sub]) for sub in subs]
+    if len(dims) != len(subs):
+        raise ValueError(f"Expected the dimensions of the subsystems {subs}, got {list(dims)}.")
+    return [int(d) for d in dims]
+
+def _numeric_value(c : sp.Expr, hbar : float, parameters : None | dict) -> complex:
+    by_name = {str(x) : x for x in c.free_symbols}
+    values = {scalars.hbar : hbar, scalars.pi : np.pi}
+    for k, v in (parameters or {}).items():
+        values[by_name.get(k, sp.Symbol(k)) if isinstance(k, str) else k] = v
+    c = c.xreplace({k : sp.sympify(v) for k, v in values.items()})
+    if c.free_symbols:
+        raise ValueError(f"Missing values of the parameters {sorted(c.free_symbols, key=str)}.")
+    return complex(c)
+
+def _subsystems(*exprs : sp.Expr) -> list:
+    subs = set()
+    for expr in exprs:
+        subs |= {X.sub for X in sp.sympify(expr).atoms(Operator) if not(isinstance(X, densityOp))}
+    return sorted(subs, key=str)
+
+def fock_operator(A : sp.Expr,
+                  dims : int | list | dict,
+                  subs : None | list = None,
+                  hbar : float = 1.0,
+                  parameters : None | dict = None) -> sps.csr_matrix:
+    """
+    The sparse matrix of a polynomial in `qOp`, `pOp`, `createOp`, and `annihilateOp`
+    in the truncated Fock basis of its subsystems, with the numerical values of
+    `hbar` and the `parameters` (keyed by symbol or name).
+
+    Each term is multiplied out mode by mode on the small matrices of the modes,
+    which are then joined by Kronecker products, with the first subsystem as the
+    most significant index. No dense matrix is formed.
+
+    Parameters
+    ----------
+
+    A : sympy.Expr
+        The operator.
+
+    dims : int, list, or dict
+        The dimension of the Fock space of every mode, one per subsystem in `subs`,
+        or a dictionary keyed by subsystem.
+
+    subs : list, optional
+        The subsystems, ordered. By default, those of `A`, sorted by name like the
+        variables of `W`.
+
+    hbar : float, default: 1.0
+
+    parameters : dict, optional
+
+    Returns
+    -------
+
+    scipy.sparse.csr_matrix
+    """
+    A = sp.sympify(A)
+    if A.has(densityOp):
+        raise ValueError("'fock_operator' does not accept the density operator.")
+    subs = [_treat_sub(sub, True) for sub in subs] if (subs is not None) else _subsystems(A)
+    dims = _as_dims(dims, subs)
+    index = {sub : k for k, sub in enumerate(subs)}
+    size = int(np.prod(dims))
+
+    out = sps.csr_matrix((size, size), dtype=complex)
+    for term in sp.Add.make_args(sp.expand(A)):
+        c, word = term.args_cnc()
+        c = _numeric_value(sp.Mul(*c), hbar, parameters)
+        if c == 0:
+            continue
+        factors = [None]*len(subs)
+        for X in word:
+            base, exp = X.as_base_exp()
+            if not(isinstance(base, (qOp, pOp, createOp, annihilateOp))) \
+                or not(exp.is_Integer and exp >= 0):
+                raise ValueError(f"Cannot represent {X} in the Fock basis.")
+            if base.sub not in index:
+                raise ValueError(f"The subsystem {base.sub} is not in {subs}.")
+            k = index[base.sub]
+            M = _mode_operator(type(base), dims[k], hbar)
+            for _ in range(int(exp)):
+                factors[k] = M if (factors[k] is None) else (factors[k] @ M)
+        M = sps.identity(1, dtype=complex, format="csr")
+        for factor, d in zip(factors, dims):
+            M = sps.kron(M, factor if (factor is not None) else sps.identity(d, dtype=complex),
+                         format="csr")
+        out = out + c*M
+    return out.tocsr()
+
+def liouvillian(lme,
+                dims : int | list | dict,
+                subs : None | list = None,
+                hbar : float = 1.0,
+                parameters : None | dict = None) -> sps.csr_matrix:
+    """
+    The sparse Liouvillian `L` of a `LindbladMasterEquation` in the truncated
+    Fock basis, with `d vec(ρ)/dt = L vec(ρ)` for the column-stacking `vec`,
+    `vec(AρB) = (B^T ⊗ A) vec(ρ)`, i.e. `vec(ρ) = ρ.reshape(-1, order="F")`.
+
+    The parameters are those of `fock_operator`. By default, the subsystems are
+    those of the Hamiltonian and the jump operators, sorted by name.
+    """
+    ops = [lme.H] + [X for D in lme.dissipators for X in (D.operator_1, D.operator_2)]
+    subs = [_treat_sub(sub, True) for sub in subs] if (subs is not None) else _subsystems(*ops)
+    kwargs = dict(dims=dims, subs=subs, hbar=hbar, parameters=parameters)
+    size = int(np.prod(_as_dims(dims, subs)))
+    I = sps.identity(size, dtype=complex, format="csr")
+
+    H = fock_operator(lme.H, **kwargs)
+    out = -1j/hbar * (sps.kron(I, H) - sps.kron(H.T, I))
+    for D in lme.dissipators:
+        rate = _numeric_value(D.rate, hbar, parameters)
+        P = fock_operator(D.operator_1, **kwargs)
+        Qd = fock_operator(D.operator_2, **kwargs).conj().T
+        r = (Qd @ P).tocsr()
+        out = out + rate/2 * (2*sps.kron(Qd.T, P) - sps.kron(r.T, I) - sps.kron(I, r))
+    return out.tocsr()
@@ -0,0 +1,222 @@
+import numpy as np
+import sympy as sp
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+
+from .grid import PhaseSpaceGrid
+from .evaluate import CompiledExpression
+
+__all__ = ["WignerOperator", "steady_state"]
+
+def _derivative_matrix(points : int, spacing : float, order : int) \
+    -> sps.csr_matrix:
+    """
+    The `order`-th derivative along one axis by second-order central differences,
+    `D2^(order//2) D1^(order%2)`, with `W = 0` outside of the grid.
+    """
+    D1 = sps.diags([-1, 1], [-1, 1], shape=(points, points), dtype=float) / (2*spacing)
+    D2 = sps.diags([1, -2, 1], [-1, 0, 1], shape=(points, points), dtype=float) / spacing**2
+    out = sps.identity(points, format="csr")
+    for _ in range(order // 2):
+        out = D2 @ out
+    if order % 2:
+        out = D1 @ out
+    return out.tocsr()
+
+class WignerOperator():
+    """
+    The right-hand side of a Wigner equation of motion, `∂W/∂t = sum_β c_β ∂^β W`,
+    discretized on a `PhaseSpaceGrid` into a sparse matrix acting on the
+    flattened samples of `W`.
+
+    The derivatives are central finite differences, assuming that `W` vanishes
+    outside of the grid, and are built once. The coefficients are compiled once
+    (see `CompiledExpression`), so that the matrix is reassembled cheaply for
+    new parameter values.
+
+    Parameters
+    ----------
+
+    eom : sympy.Equality or LindbladMasterEquation
+        The equation of motion, e.g. `LindbladMasterEquation.wigner_transform`,
+        or the master equation itself.
+
+    grid : PhaseSpaceGrid
+        The grid, which must have an axis for every variable of `W`.
+
+    Examples
+    --------
+
+    >>> L = WignerOperator(lme, PhaseSpaceGrid((-6, 6), 64))
+    >>> W = steady_state(L, {kappa : 0.1})
+    """
+
+    def __init__(self, eom, grid : PhaseSpaceGrid):
+        if hasattr(eom, "wigner_transform"):
+            eom = eom.wigner_transform
+        self.grid = grid
+        self.coefficients = CompiledExpression(eom.rhs, subs=grid.subs)
+
+        variables = grid.variables
+        missing = [x for x in eom.lhs.args[0].args[1:] if x not in variables]
+        if missing:
+            raise ValueError(f"The grid has no axes for {missing}.")
+
+        # One sparse matrix per derivative of `W`, from those of the single axes.
+        axis_matrices = {}
+        self.derivatives = []
+        for D in self.coefficients.derivatives:
+            orders = dict(D.variable_count) if isinstance(D, sp.Derivative) else {}
+            out = sps.identity(self.size, format="csr")
+            for axis, x in enumerate(variables):
+                order = int(orders.get(x, 0))
+                if not(order):
+                    continue
+                key = (axis, order)
+                if key not in axis_matrices:
+                    before = int(np.prod(grid.points[:axis], dtype=int))
+                    after = int(np.prod(grid.points[axis+1:], dtype=int))
+                    axis_matrices[key] = sps.kron(
+                        sps.kron(sps.identity(before),
+                                 _derivative_matrix(grid.points[axis], grid.spacings[axis], order)),
+                        sps.identity(after), format="csr")
+                out = axis_matrices[key] @ out
+            self.derivatives.append(out.tocsr())
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.grid.shape, dtype=int))
+
+    @property
+    def parameters(self) -> list:
+        return self.coefficients.parameters
+
+    def matrix(self, parameters : None | dict = None) -> sps.csr_matrix:
+        """
+        The sparse matrix of the operator for the given parameter values, which
+        must be scalars. See `CompiledExpression` for the format.
+        """
+        coeffs = self.coefficients(self.grid, parameters)
+        out = sps.csr_matrix((self.size, self.size), dtype=complex)
+        for D, matrix in zip(self.coefficients.derivatives, self.derivatives):
+            c = coeffs[D]
+            if c.shape != self.grid.shape:
+                raise ValueError("The parameters must be scalars.")
+            out = out + sps.diags(c.ravel()) @ matrix
+        return out.tocsr()
+
+    def apply(self, W : np.ndarray, parameters : None | dict = None) -> np.ndarray:
+        """
+        `∂W/∂t` of the samples `W` on the grid.
+        """
+        return (self.matrix(parameters) @ np.ravel(W)).reshape(self.grid.shape)
+
+def _ilu(A : sps.csc_matrix, shift : float, drop_tol : float, fill_factor : float):
+    """
+    The incomplete LU factorization of `A - shift`, or, if a pivot vanishes,
+    of `A` shifted ten times further along the diagonal, and so on.
+    """
+    I = sps.identity(A.shape[0], format="csc")
+    for _ in range(4):
+        try:
+            return spla.spilu((A - shift*I).tocsc(), drop_tol=drop_tol, fill_factor=fill_factor)
+        except RuntimeError:
+            shift *= 10
+    raise RuntimeError("The incomplete LU factorization of the shifted operator is singular.")
+
+def steady_state(operator : WignerOperator,
+                 parameters : None | dict = None,
+                 method : str = "direct",
+                 tol : float = 1e-10,
+                 maxiter : None | int = None,
+                 preconditioner : None | spla.LinearOperator = None,
+                 drop_tol : float = 1e-2,
+                 fill_factor : float = 3,
+                 shift : None | float = None) -> np.ndarray:
+    """
+    The stationary Wigner function on the grid of `operator`, normalized to
+    `∫ W dq dp = 1`.
+
+    The discretized operator `A` has an (approximate) null space of dimension
+    one. The normalization is imposed through the bordered system
+    `(A + u v^T) W = u`, with `v^T W = ∫ W dq dp` and a uniform `u`, which is
+    nonsingular and whose solution is the normalized null vector of `A`, since
+    `u` is not in the range of `A`. The rank-one term is applied without being
+    formed, so that the system keeps the sparsity of `A`, and it is solved with
+    a Krylov solver, preconditioned with a factorization of `A - σ`:
+
+    - `'direct'` uses the sparse LU factorization of the slightly shifted `A`,
+      after which GMRES converges in a few iterations. It fills in heavily
+      beyond one mode.
+    - `'gmres'` and `'bicgstab'` use the incomplete LU factorization, shifted
+      like an implicit time step, so that it exists even where `A` has
+      vanishing pivots. These are the solvers for two-mode grids.
+
+    The grid must resolve `W`: with central differences, the drift times the
+    spacing should not greatly exceed the diffusion, or spurious, oscillating
+    null vectors appear. The incomplete factorization dominates the cost of the
+    iterative solvers, and can be reused for nearby parameter values through
+    `preconditioner`.
+
+    Parameters
+    ----------
+
+    operator : WignerOperator
+        The discretized equation of motion, reused for every parameter value.
+
+    parameters : dict, optional
+        The values of the parameters of the equation, see `WignerOperator.matrix`.
+
+    method : str, default: 'direct'
+        `'direct'` (`scipy.sparse.linalg.splu`), `'gmres'`, or `'bicgstab'`
+        (`scipy.sparse.linalg.spilu`).
+
+    tol : float, default: 1e-10
+        Relative tolerance of the Krylov solvers.
+
+    maxiter : int, optional
+        Maximum number of iterations of the iterative solvers.
+
+    preconditioner : scipy.sparse.linalg.LinearOperator, optional
+        The preconditioner of the iterative solvers, instead of the incomplete
+        LU factorization.
+
+    drop_tol, fill_factor : float
+        Passed to `spilu`.
+
+    shift : float, optional
+        `σ`. By default, the largest entry of `A` in magnitude, times `-1e-6` for
+        `'direct'` and `0.1` for the iterative solvers.
+
+    Returns
+    -------
+
+    numpy.ndarray
+        The real samples of `W`, of the shape of the grid.
+    """
+    if method not in ["direct", "gmres", "bicgstab"]:
+        raise ValueError(f"Invalid method: {method}. Valid methods: ['direct', 'gmres', 'bicgstab'].")
+    grid = operator.grid
+    volume = float(np.prod(grid.spacings))
+
+    A = operator.matrix(parameters).tocsc()
+    scale = float(abs(A).max()) or 1.0
+    if method == "direct":
+        shift = -1e-6*scale if (shift is None) else shift
+        lu = spla.splu((A - shift*sps.identity(operator.size, format="csc")).tocsc())
+        M = spla.LinearOperator(A.shape, lu.solve, dtype=complex)
+    elif preconditioner is None:
+        ilu = _ilu(A, 0.1*scale if (shift is None) else shift, drop_tol, fill_factor)
+        M = spla.LinearOperator(A.shape, ilu.solve, dtype=complex)
+    else:
+        M = preconditioner
+
+    u = np.full(operator.size, scale/operator.size, dtype=complex)
+    B = spla.LinearOperator(A.shape, lambda x: A @ x + u * (volume * x.sum()), dtype=complex)
+    solver = spla.bicgstab if (method == "bicgstab") else spla.gmres
+    W, info = solver(B, u, rtol=tol, maxiter=maxiter, M=M)
+    if info != 0:
+        raise RuntimeError(f"'{method}' did not converge (info = {info}).")
+    W /= W.sum() * volume
+
+    return np.real(W).reshape(grid.shape)
@@ -0,0 +1,415 @@
+import numpy as np
+
+from .grid import PhaseSpaceGrid
+from .steady_state import _derivative_matrix
+
+__all__ = ["TensorTrain", "TTOperator", "tt_wigner_operator", "tt_evolve", "tt_steady_state"]
+
+def _truncation_rank(s : np.ndarray, delta : float, max_rank : None | int) -> int:
+    """
+    The smallest rank whose discarded singular values have a norm at most `delta`.
+    """
+    tails = np.sqrt(np.cumsum(s[::-1]**2))[::-1]
+    rank = int(np.sum(tails > delta)) or 1
+    return min(rank, max_rank) if max_rank else rank
+
+class TensorTrain():
+    """
+    A tensor of shape `(n_1, ..., n_d)` in the tensor-train (matrix-product)
+    format, `X[i_1, ..., i_d] = G_1[:, i_1, :] @ ... @ G_d[:, i_d, :]`, where
+    the cores `G_k` have shape `(r_{k-1}, n_k, r_k)` and `r_0 = r_d = 1`.
+
+    A Wigner function sampled on a `PhaseSpaceGrid` uses one core per axis,
+    so that its memory grows linearly in the number of modes for bounded ranks.
+
+    Parameters
+    ----------
+
+    cores : list of numpy.ndarray
+    """
+
+    def __init__(self, cores : list):
+        self.cores = [np.asarray(G) for G in cores]
+        if any(G.ndim != 3 for G in self.cores) or self.cores[0].shape[0] != 1 \
+            or self.cores[-1].shape[-1] != 1:
+            raise ValueError("The cores must have shapes (r_{k-1}, n_k, r_k), with r_0 = r_d = 1.")
+
+    @classmethod
+    def from_dense(cls, X : np.ndarray, tol : float = 1e-10,
+                   max_rank : None | int = None) -> "TensorTrain":
+        """
+        Compress a full array by successive truncated SVDs, with a relative
+        error of at most `tol` in the Frobenius norm.
+        """
+        X = np.asarray(X)
+        d = X.ndim
+        delta = tol * np.linalg.norm(X) / np.sqrt(max(d-1, 1))
+        cores, r = [], 1
+        C = X.reshape(1, -1)
+        for n in X.shape[:-1]:
+            U, s, Vh = np.linalg.svd(C.reshape(r*n, -1), full_matrices=False)
+            rank = _truncation_rank(s, delta, max_rank)
+            cores.append(U[:, :rank].reshape(r, n, rank))
+            C = s[:rank, None] * Vh[:rank]
+            r = rank
+        cores.append(C.reshape(r, X.shape[-1], 1))
+        return cls(cores)
+
+    @classmethod
+    def from_factors(cls, factors : list) -> "TensorTrain":
+        """
+        The rank-one tensor `f_1 ⊗ ... ⊗ f_d`, e.g. a product of functions of
+        the single axes.
+        """
+        return cls([np.asarray(f).reshape(1, -1, 1) for f in factors])
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(G.shape[1] for G in self.cores)
+
+    @property
+    def ranks(self) -> list[int]:
+        return [1] + [G.shape[-1] for G in self.cores]
+
+    @property
+    def real(self) -> "TensorTrain":
+        if all(np.isrealobj(G) for G in self.cores):
+            return self
+        return ((self + self.conj()) * 0.5).round(1e-14)
+
+    def conj(self) -> "TensorTrain":
+        return TensorTrain([np.conj(G) for G in self.cores])
+
+    def full(self) -> np.ndarray:
+        out = self.cores[0]
+        for G in self.cores[1:]:
+            out = np.tensordot(out, G, axes=(-1, 0))
+        return out.reshape(self.shape)
+
+    def __add__(self, other : "TensorTrain") -> "TensorTrain":
+        """
+        The sum, with block-diagonal cores, whose ranks add.
+        """
+        if self.shape != other.shape:
+            raise ValueError(f"Cannot add tensor trains of shapes {self.shape} and {other.shape}.")
+        d = len(self.cores)
+        if d == 1:
+            return TensorTrain([self.cores[0] + other.cores[0]])
+        cores = []
+        for k, (A, B) in enumerate(zip(self.cores, other.cores)):
+            if k == 0:
+                cores.append(np.concatenate([A, B], axis=2))
+            elif k == d-1:
+                cores.append(np.concatenate([A, B], axis=0))
+            else:
+                G = np.zeros((A.shape[0]+B.shape[0], A.shape[1], A.shape[2]+B.shape[2]),
+                             dtype=np.result_type(A, B))
+                G[:A.shape[0], :, :A.shape[2]] = A
+                G[A.shape[0]:, :, A.shape[2]:] = B
+                cores.append(G)
+        return TensorTrain(cores)
+
+    def __mul__(self, c) -> "TensorTrain":
+        return TensorTrain([self.cores[0] * c] + self.cores[1:])
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "TensorTrain":
+        return self * (-1)
+
+    def __sub__(self, other : "TensorTrain") -> "TensorTrain":
+        return self + (-other)
+
+    def dot(self, other : "TensorTrain") -> complex:
+        """
+        `sum conj(self) * other`, contracted core by core.
+        """
+        out = np.ones((1, 1))
+        for A, B in zip(self.cores, other.cores):
+            out = np.einsum("ab,aic,bid->cd", out, np.conj(A), B)
+        return out[0, 0]
+
+    def norm(self) -> float:
+        return float(np.sqrt(abs(self.dot(self))))
+
+    def sum(self, weights : None | list = None) -> complex:
+        """
+        `sum X[i_1, ..., i_d] w_1[i_1] ... w_d[i_d]`, with unit weights by default.
+        """
+        out = np.ones((1,))
+        for k, G in enumerate(self.cores):
+            w = np.ones(G.shape[1]) if (weights is None) else np.asarray(weights[k])
+            out = out @ np.einsum("aib,i->ab", G, w)
+        return out[0]
+
+    def round(self, tol : float = 1e-10, max_rank : None | int = None) -> "TensorTrain":
+        """
+        Recompress to the smallest ranks (at most `max_rank`) with a relative
+        error of at most `tol`: the cores are orthogonalized from the right by
+        QR decompositions, then truncated from the left by SVDs.
+        """
+        cores = list(self.cores)
+        d = len(cores)
+        for k in range(d-1, 0, -1):
+            r0, n, r1 = cores[k].shape
+            Q, R = np.linalg.qr(cores[k].reshape(r0, n*r1).T)
+            cores[k] = Q.T.reshape(-1, n, r1)
+            cores[k-1] = np.tensordot(cores[k-1], R.T, axes=(-1, 0))
+
+        delta = tol * np.linalg.norm(cores[0]) / np.sqrt(max(d-1, 1))
+        for k in range(d-1):
+            r0, n, r1 = cores[k].shape
+            U, s, Vh = np.linalg.svd(cores[k].reshape(r0*n, r1), full_matrices=False)
+            rank = _truncation_rank(s, delta, max_rank)
+            cores[k] = U[:, :rank].reshape(r0, n, rank)
+            cores[k+1] = np.tensordot(s[:rank, None] * Vh[:rank], cores[k+1], axes=(1, 0))
+        return TensorTrain(cores)
+
+    def __repr__(self):
+        return f"TensorTrain(shape={self.shape}, ranks={self.ranks})"
+
+class TTOperator():
+    """
+    A linear operator on tensors of shape `(n_1, ..., n_d)` in the tensor-train
+    format, with cores of shape `(r_{k-1}, n_k, n_k, r_k)`.
+
+    Parameters
+    ----------
+
+    cores : list of numpy.ndarray
+
+    grid : PhaseSpaceGrid, optional
+        The grid of the Wigner functions the operator acts on.
+    """
+
+    def __init__(self, cores : list, grid : None | PhaseSpaceGrid = None):
+        self.cores = [np.asarray(G) for G in cores]
+        self.grid = grid
+
+    @classmethod
+    def from_terms(cls, terms : list, grid : None | PhaseSpaceGrid = None,
+                   tol : float = 1e-12) -> "TTOperator":
+        """
+        The sum of Kronecker products `sum_j A_j1 ⊗ ... ⊗ A_jd`, given as lists
+        of the (dense) matrices of the single axes, compressed with `round`.
+        """
+        d = len(terms[0])
+        cores = []
+        for k in range(d):
+            n = terms[0][k].shape[0]
+            mats = np.stack([np.asarray(term[k]) for term in terms])
+            if d == 1:
+                cores.append(mats.sum(axis=0)[None, :, :, None])
+            elif k == 0:
+                cores.append(mats.transpose(1, 2, 0)[None])
+            elif k == d-1:
+                cores.append(mats[..., None])
+            else:
+                G = np.zeros((len(terms), n, n, len(terms)), dtype=mats.dtype)
+                G[np.arange(len(terms)), :, :, np.arange(len(terms))] = mats
+                cores.append(G)
+        out = cls(cores, grid).round(tol)
+        # The right-hand sides of Wigner equations of motion are real.
+        if all(np.abs(G.imag).max() <= 1e-14*np.abs(G).max() for G in out.cores):
+            out.cores = [G.real for G in out.cores]
+        return out
+
+    @property
+    def ranks(self) -> list[int]:
+        return [1] + [G.shape[-1] for G in self.cores]
+
+    def round(self, tol : float = 1e-12, max_rank : None | int = None) -> "TTOperator":
+        """
+        Recompress, treating each core as a tensor-train core of mode size `n_k**2`.
+        """
+        shapes = [G.shape[1:3] for G in self.cores]
+        tt = TensorTrain([G.reshape(G.shape[0], -1, G.shape[-1]) for G in self.cores])
+        tt = tt.round(tol, max_rank)
+        return TTOperator([G.reshape(G.shape[0], n, m, G.shape[-1])
+                           for G, (n, m) in zip(tt.cores, shapes)], self.grid)
+
+    def __matmul__(self, X : TensorTrain) -> TensorTrain:
+        """
+        The product with a tensor train, whose ranks are the products of the ranks.
+        """
+        cores = []
+        for A, G in zip(self.cores, X.cores):
+            C = np.einsum("aijb,cjd->acibd", A, G)
+            cores.append(C.reshape(A.shape[0]*G.shape[0], A.shape[1], A.shape[-1]*G.shape[-1]))
+        return TensorTrain(cores)
+
+    def apply(self, X : TensorTrain, tol : float = 1e-10,
+              max_rank : None | int = None) -> TensorTrain:
+        """
+        The rounded product with a tensor train.
+        """
+        return (self @ X).round(tol, max_rank)
+
+    def full(self) -> np.ndarray:
+        """
+        The dense matrix, for testing small operators.
+        """
+        out = np.ones((1, 1, 1))
+        for G in self.cores:
+            out = np.einsum("ija,aklb->ikjlb", out, G)
+            out = out.reshape(out.shape[0]*out.shape[1], out.shape[2]*out.shape[3], -1)
+        return out[..., 0]
+
+    def __repr__(self):
+        return f"TTOperator(ranks={self.ranks})"
+
+def tt_wigner_operator(eom, grid : PhaseSpaceGrid,
+                       parameters : None | dict = None,
+                       tol : float = 1e-12) -> TTOperator:
+    """
+    The right-hand side of a Wigner equation of motion, `∂W/∂t = sum_β c_β ∂^β W`,
+    discretized on `grid` like `WignerOperator`, in the tensor-train format.
+
+    The coefficients are polynomials in the phase-space variables, so each term
+    `c q_1^a p_1^b ... ∂^β` is a Kronecker product of the matrices
+    `diag(x^a) D_m` of the single axes, with the central differences `D_m`.
+    The sum of the terms is compressed by rounding.
+
+    Parameters
+    ----------
+
+    eom : sympy.Equality or LindbladMasterEquation
+        The equation of motion, or the master equation itself.
+
+    grid : PhaseSpaceGrid
+        The grid, whose `hbar` is used, with an axis for every variable of `W`.
+
+    parameters : dict, optional
+        The (scalar) values of the parameters, keyed by symbol or name.
+
+    tol : float, default: 1e-12
+        The relative tolerance of the rounding.
+    """
+    from .fast import NumericPoly
+
+    if hasattr(eom, "wigner_transform"):
+        eom = eom.wigner_transform
+    poly = NumericPoly.from_expr(eom.rhs, hbar=grid.hbar, parameters=parameters)
+    missing = [sub for sub in poly.subs if sub not in grid.subs]
+    if missing:
+        raise ValueError(f"The grid has no axes for the subsystems {missing}.")
+    columns = {sub : k for k, sub in enumerate(poly.subs)}
+
+    cache = {}
+    def axis_matrix(axis : int, power : int, order : int) -> np.ndarray:
+        key = (axis, power, order)
+        if key not in cache:
+            D = _derivative_matrix(grid.points[axis], grid.spacings[axis], order).toarray()
+            cache[key] = grid.axes[axis][:, None]**power * D
+        return cache[key]
+
+    terms = []
+    for exps, c in zip(poly.exps, poly.coeffs):
+        term = []
+        for mode, sub in enumerate(grid.subs):
+            a, b, m, n = exps[4*columns[sub]:4*columns[sub]+4] if (sub in columns) else (0, 0, 0, 0)
+            term += [axis_matrix(2*mode, a, m), axis_matrix(2*mode+1, b, n)]
+        term[0] = c * term[0]
+        terms.append(term)
+    return TTOperator.from_terms(terms, grid=grid, tol=tol)
+
+def _rk4_step(operator : TTOperator, W : TensorTrain, dt : float,
+              tol : float, max_rank : None | int) -> TensorTrain:
+    k1 = operator.apply(W, tol, max_rank)
+    k2 = operator.apply((W + k1*(dt/2)).round(tol, max_rank), tol, max_rank)
+    k3 = operator.apply((W + k2*(dt/2)).round(tol, max_rank), tol, max_rank)
+    k4 = operator.apply((W + k3*dt).round(tol, max_rank), tol, max_rank)
+    return (W + (k1 + k2*2 + k3*2 + k4)*(dt/6)).round(tol, max_rank)
+
+def tt_evolve(operator : TTOperator, W0 : TensorTrain, times : np.ndarray, dt : float,
+              tol : float = 1e-8, max_rank : None | int = None) -> list[TensorTrain]:
+    """
+    Integrate `∂W/∂t = L W` in the tensor-train format with the classical
+    Runge-Kutta scheme, rounding after every stage.
+
+    Parameters
+    ----------
+
+    operator : TTOperator
+        `L`, e.g. from `tt_wigner_operator`.
+
+    W0 : TensorTrain
+        The initial samples of `W`.
+
+    times : array_like
+        The increasing times at which `W` is returned, starting with the initial time.
+
+    dt : float
+        The largest time step. The explicit scheme needs it below the inverse
+        of the largest rates of the discretized operator.
+
+    tol, max_rank
+        The rounding of the ranks.
+
+    Returns
+    -------
+
+    list of TensorTrain
+    """
+    times = np.asarray(times, dtype=float)
+    out = [W0]
+    W = W0
+    for t0, t1 in zip(times[:-1], times[1:]):
+        steps = max(1, int(np.ceil((t1 - t0) / dt)))
+        for _ in range(steps):
+            W = _rk4_step(operator, W, (t1 - t0)/steps, tol, max_rank)
+        out.append(W)
+    return out
+
+def tt_steady_state(operator : TTOperator, W0 : TensorTrain, dt : float,
+                    tol : float = 1e-4, maxiter : int = 10000,
+                    round_tol : float = 1e-6, max_rank : None | int = None) -> TensorTrain:
+    """
+    The stationary Wigner function in the tensor-train format, normalized to
+    `∫ W dq dp = 1`, found by relaxing `W0` with the steps of `tt_evolve` until
+    the rate of change `|W(t+dt) - W(t)| / (dt |W|)` falls below `tol`.
+
+    Relaxation keeps the ranks of the intermediate states close to those of
+    the stationary state, unlike Krylov solvers, whose basis vectors grow in
+    rank, and needs no factorization. Its number of steps scales with the
+    slowest relaxation time over `dt`. The rounding tolerance should not be
+    much below the discretization error, which bounds the accuracy anyway.
+
+    Parameters
+    ----------
+
+    operator : TTOperator
+        `L`, e.g. from `tt_wigner_operator`, with its `grid`.
+
+    W0 : TensorTrain
+        The initial state.
+
+    dt : float
+        The time step, see `tt_evolve`.
+
+    tol : float, default: 1e-4
+
+    maxiter : int, default: 10000
+        The maximum number of steps.
+
+    round_tol, max_rank
+        The rounding of the ranks.
+
+    Raises
+    ------
+
+    RuntimeError
+        If the rate of change is still above `tol` after `maxiter` steps.
+    """
+    grid = operator.grid
+    weights = [np.full(n, dz) for n, dz in zip(grid.points, grid.spacings)] \
+              if (grid is not None) else None
+    W = W0 * (1/W0.sum(weights))
+    for _ in range(maxiter):
+        W_next = _rk4_step(operator, W, dt, round_tol, max_rank)
+        W_next = W_next * (1/W_next.sum(weights))
+        rate = (W_next - W).norm() / (dt * W_next.norm())
+        W = W_next
+        if rate <= tol:
+            return W.real
+    raise RuntimeError(f"The relaxation did not converge in {maxiter} steps "
+                       f"(relative rate of change {rate:.2e}).")
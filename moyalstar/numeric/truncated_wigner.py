@@ -0,0 +1,270 @@
+import numpy as np
+import sympy as sp
+from itertools import product
+from typing import NamedTuple, Callable
+
+from ..core import scalars
+from .evaluate import _lambdify
+
+__all__ = ["TruncatedWigner", "EnsembleMoments"]
+
+class EnsembleMoments(NamedTuple):
+    """
+    Moments of a trajectory ensemble at the saved `times`, with the phase-space
+    variables as the last axes, in the order of `TruncatedWigner.variables`.
+
+    Attributes
+    ----------
+
+    times : numpy.ndarray
+        Shape `(n_t,)`.
+
+    num_trajectories : int
+
+    mean : numpy.ndarray
+        The means `<x_i>`, of shape `(n_t, d)`.
+
+    second_moments : numpy.ndarray
+        The symmetrized moments `<x_i x_j>`, of shape `(n_t, d, d)`. In the
+        truncated Wigner approximation, these are those of the symmetrically
+        ordered operators.
+
+    observables : dict
+        The means of the `observables` given to `simulate`, each of shape `(n_t,)`.
+    """
+    times : np.ndarray
+    num_trajectories : int
+    mean : np.ndarray
+    second_moments : np.ndarray
+    observables : dict
+
+    @property
+    def covariance(self) -> np.ndarray:
+        return self.second_moments - self.mean[:, :, None] * self.mean[:, None, :]
+
+def _kramers_moyal(coeffs : dict, variables : list) -> dict:
+    """
+    Rewrite `sum_β c_β ∂^β W`, given as `{β : c_β}`, as `sum_β ∂^β (K_β W)`, going
+    down from the highest orders and moving the lower-order terms of the product
+    rule, `∂^β(K W) = sum_{γ<=β} binom(β, γ) ∂^(β-γ)K ∂^γ W`, to the lower `β`.
+    """
+    coeffs = dict(coeffs)
+    out = {}
+    for beta in sorted(coeffs, key=sum, reverse=True):
+        K = coeffs.pop(beta)
+        if K == 0:
+            continue
+        out[beta] = K
+        for gamma in product(*[range(n+1) for n in beta]):
+            if gamma == beta:
+                continue
+            dK = K
+            for x, n, m in zip(variables, beta, gamma):
+                if n - m:
+                    dK = sp.diff(dK, x, n - m)
+            multiplicity = sp.Mul(*[sp.binomial(n, m) for n, m in zip(beta, gamma)])
+            coeffs[gamma] = (coeffs.get(gamma, 0) - multiplicity*dK).expand()
+    return out
+
+class TruncatedWigner():
+    """
+    The Fokker-Planck form of a Wigner equation of motion,
+
+    `∂W/∂t = -sum_i ∂_i (A_i W) + 1/2 sum_ij ∂_i ∂_j (D_ij W)`,
+
+    sampled by an ensemble of trajectories of the Itô equation
+    `dx = A dt + B dξ` with `B B^T = D`.
+
+    The equation is first brought into the form `sum_β ∂^β (K_β W)` (Kramers-Moyal).
+    The terms of order three and higher are dropped if `truncate` is true, and raise
+    `ValueError` otherwise. The drift is `A_i = -K_{e_i}`, and the diffusion is
+    `D_ii = 2 K_{2e_i}` and `D_ij = K_{e_i+e_j}`.
+
+    Parameters
+    ----------
+
+    eom : sympy.Equality or LindbladMasterEquation
+        The equation of motion, e.g. `LindbladMasterEquation.wigner_transform`,
+        or the master equation itself.
+
+    truncate : bool, default: False
+        Drop the derivatives of order three and higher (the truncated Wigner
+        approximation).
+
+    Examples
+    --------
+
+    >>> tw = TruncatedWigner(lme, truncate=True)
+    >>> moments = tw.simulate((mean, cov), np.linspace(0, 10, 101), {kappa : 0.1},
+    ...                       num_trajectories=10**6, seed=1)
+    """
+
+    def __init__(self, eom, truncate : bool = False):
+        from ..core.star_product import _split_W
+
+        if hasattr(eom, "wigner_transform"):
+            eom = eom.wigner_transform
+        self.variables = list(eom.lhs.args[0].args[1:])
+        d = len(self.variables)
+
+        coeffs = {}
+        for D, c in _split_W(sp.expand(eom.rhs)).items():
+            if D == 1:
+                raise ValueError("The equation of motion contains terms without 'W'.")
+            orders = dict(D.variable_count) if isinstance(D, sp.Derivative) else {}
+            beta = tuple(int(orders.get(x, 0)) for x in self.variables)
+            coeffs[beta] = coeffs.get(beta, 0) + c
+        K = _kramers_moyal(coeffs, self.variables)
+
+        if any(sum(beta) > 2 for beta in K) and not(truncate):
+            raise ValueError("The equation of motion has derivatives of order three or higher. "
+                             "Pass 'truncate=True' to drop them.")
+        if (0,)*d in K and sp.simplify(K[(0,)*d]) != 0:
+            raise ValueError("The equation of motion does not preserve the normalization of 'W'.")
+
+        unit = lambda *i: tuple(sum(1 for j in i if j == k) for k in range(d))
+        self.drift = [-K.get(unit(i), sp.Integer(0)) for i in range(d)]
+        self.diffusion = sp.Matrix(d, d, lambda i, j: (2 if i == j else 1) * K.get(unit(i, j), sp.Integer(0)))
+
+        exprs = tuple(self.drift) + tuple(self.diffusion)
+        free = set().union(*[sp.sympify(X).free_symbols for X in exprs])
+        self.parameters = sorted(free - set(self.variables) - {scalars.hbar, scalars.pi}, key=str)
+        exprs = tuple(sp.sympify(X).subs(scalars.pi, sp.pi) for X in exprs)
+        self._constant_diffusion = not(any(X.free_symbols & set(self.variables)
+                                          for X in exprs[d:]))
+        self._foo = _lambdify(tuple(self.variables) + (scalars.hbar,) + tuple(self.parameters), exprs)
+
+    @property
+    def parameter_names(self) -> list[str]:
+        return [str(x) for x in self.parameters]
+
+    def _coefficients(self, x : np.ndarray, hbar : float, params : list) \
+        -> tuple[np.ndarray, np.ndarray]:
+        """
+        The drift `(n, d)` and diffusion `(n, d, d)`, or `(d, d)` if it is constant.
+        """
+        n, d = x.shape
+        out = self._foo(*x.T, hbar, *params)
+        A = np.stack([np.broadcast_to(np.real(X), (n,)) for X in out[:d]], axis=-1)
+        if self._constant_diffusion:
+            D = np.real(np.array(out[d:], dtype=complex)).reshape(d, d)
+        else:
+            D = np.stack([np.broadcast_to(np.real(X), (n,)) for X in out[d:]],
+                         axis=-1).reshape(n, d, d)
+        return A, D
+
+    @staticmethod
+    def _noise_matrix(D : np.ndarray) -> np.ndarray:
+        """
+        `B` with `B B^T = D`, from the eigendecomposition, clipping the negative
+        eigenvalues, for which the truncated equation has no sampling.
+        """
+        w, V = np.linalg.eigh(D)
+        return V * np.sqrt(np.clip(w, 0, None))[..., None, :]
+
+    def simulate(self,
+                 initial : tuple | Callable,
+                 times : np.ndarray,
+                 parameters : None | dict = None,
+                 hbar : float = 1.0,
+                 num_trajectories : int = 10**4,
+                 chunk_size : int = 10**5,
+                 dt : None | float = None,
+                 seed : None | int | np.random.SeedSequence = None,
+                 observables : None | dict = None) -> EnsembleMoments:
+        """
+        Integrate the ensemble with the Euler-Maruyama scheme and accumulate
+        its moments at `times`, one chunk of trajectories at a time, so that the
+        memory is bounded by `chunk_size` independently of `num_trajectories`.
+
+        Parameters
+        ----------
+
+        initial : tuple or callable
+            `(mean, covariance)` of a Gaussian initial Wigner function, e.g.
+            `(np.zeros(2), hbar/2*np.eye(2))` for the vacuum of one mode, or a
+            function `initial(rng, n)` returning `n` samples of shape `(n, d)`.
+
+        times : array_like
+            The increasing times at which the moments are saved, starting with
+            the initial time.
+
+        parameters : dict, optional
+            The values of the parameters, keyed by symbol or name.
+
+        hbar : float, default: 1.0
+
+        num_trajectories : int, default: 10**4
+
+        chunk_size : int, default: 10**5
+            The number of trajectories integrated at once.
+
+        dt : float, optional
+            The largest time step. By default, the intervals between `times`.
+
+        seed : int or numpy.random.SeedSequence, optional
+            Each chunk draws from a child of `SeedSequence(seed)`, so that the
+            results are reproducible for the same seed and `chunk_size`.
+
+        observables : dict, optional
+            Functions `f(x)` of the samples, of shape `(n, d)`, returning shape `(n,)`,
+            whose means are also accumulated.
+
+        Returns
+        -------
+
+        EnsembleMoments
+        """
+        times = np.asarray(times, dtype=float)
+        d = len(self.variables)
+        by_name = dict(zip(self.parameter_names, self.parameters))
+        values = {(by_name.get(k, k) if isinstance(k, str) else k) : v
+                  for k, v in (parameters or {}).items()}
+        missing = [x for x in self.parameters if x not in values]
+        if missing:
+            raise ValueError(f"Missing values of the parameters {missing}.")
+        params = [complex(values[x]) if isinstance(values[x], sp.Basic) else values[x]
+                  for x in self.parameters]
+        observables = dict(observables or {})
+
+        if callable(initial):
+            sample = initial
+        else:
+            mean, cov = (np.asarray(X, dtype=float) for X in initial)
+            B0 = self._noise_matrix(cov)
+            sample = lambda rng, n: mean + rng.standard_normal((n, d)) @ B0.T
+
+        steps = [max(1, int(np.ceil((t1 - t0) / dt))) if dt else 1
+                 for t0, t1 in zip(times[:-1], times[1:])]
+
+        sums = np.zeros((len(times), d))
+        squares = np.zeros((len(times), d, d))
+        obs_sums = {key : np.zeros(len(times)) for key in observables}
+        def accumulate(k, x):
+            sums[k] += x.sum(axis=0)
+            squares[k] += x.T @ x
+            for key, f in observables.items():
+                obs_sums[key][k] += np.real(np.sum(f(x)))
+
+        seeds = np.random.SeedSequence(seed) if not(isinstance(seed, np.random.SeedSequence)) else seed
+        num_chunks = -(-num_trajectories // chunk_size)
+        for chunk_seed, start in zip(seeds.spawn(num_chunks), range(0, num_trajectories, chunk_size)):
+            rng = np.random.default_rng(chunk_seed)
+            n = min(chunk_size, num_trajectories - start)
+            x = np.array(sample(rng, n), dtype=float).reshape(n, d)
+            accumulate(0, x)
+            for k, (t0, t1, m) in enumerate(zip(times[:-1], times[1:], steps), start=1):
+                h = (t1 - t0) / m
+                for _ in range(m):
+                    A, D = self._coefficients(x, hbar, params)
+                    B = self._noise_matrix(D)
+                    xi = rng.standard_normal((n, d)) * np.sqrt(h)
+                    noise = xi @ B.T if (B.ndim == 2) else np.einsum("nij,nj->ni", B, xi)
+                    x = x + A*h + noise
+                accumulate(k, x)
+
+        return EnsembleMoments(times=times,
+                               num_trajectories=num_trajectories,
+                               mean=sums / num_trajectories,
+                               second_moments=squares / num_trajectories,
+                               observables={key : X / num_trajectories for key, X in obs_sums.items()})
@@ -1,17 +1,39 @@
 import pytest
+import os
+import time
+import asyncio
+import multiprocessing
 import dill
 import random
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import sympy as sp
+import sympy.physics.quantum as spq
 
 from moyalstar.core.scalars import (hbar,pi, Scalar, q, p, t, W, alpha, alphaD,
                                     _Primed, _DePrimed, _DerivativeSymbol, WignerFunction)
 from moyalstar.core.hilbert_operators import (Operator, qOp, pOp, createOp, annihilateOp,
                                         densityOp, rho, Dagger)
-from moyalstar.core.star_product import (Bopp, Star, _star_base,
-                                         _first_index_and_diff_order, _replace_diff)
+from moyalstar.core.star_product import (Bopp, BoppOperator, Star, MoyalBracket, MoyalAntiBracket, _star_base,
+                                         _first_index_and_diff_order, _replace_diff, _split_W)
 
-from moyalstar.core.base import _sub_cache
-from moyalstar.utils.multiprocessing import _mp_helper, MP_CONFIG
+from moyalstar.core.wigner_transform import WignerTransform
+from moyalstar.core.weyl_transform import WeylTransform, weyl_ordering
+from moyalstar.core.eom import LindbladMasterEquation, _LindbladDissipator
+from moyalstar.core.moments import MomentEquations, _Closure
+
+from moyalstar.core.base import _sub_cache, _get_sub_cache
+from moyalstar.utils.multiprocessing import (_mp_helper, MP_CONFIG, execution_context,
+                                             _get_config, _get_cache, _mp_is_running)
+from moyalstar.utils.backends import SerialBackend, ManagerBackend, run_worker, _Results
+from moyalstar.utils.aio import star_async, wigner_transform_async, _run_in_process
+from moyalstar.utils.checkpoint import _foo_name, _job_key, _load
+from moyalstar.utils.progress import ProgressEvent, progress, track_progress, _report
+from moyalstar.utils.symmetry import _symmetric_map
+from moyalstar.utils.grouping import collect_by_derivative
+from moyalstar.utils.estimate import (estimate_star, estimate_wigner_transform,
+                                      calibrate_estimator, ESTIMATOR_CONFIG)
 
 def get_random_poly(objects, coeffs=[1], max_pow=3, dice_throw=10):
     """
@@ -107,7 +129,46 @@ class TestHilbertOps():
                                                createOp(), annihilateOp()),
                                     coeffs = list(range(10)) + sp.symbols([]))
         assert (Dagger(Dagger(rand_poly)) - rand_poly).expand() == 0
+        
+        assert Dagger(sp.I*annihilateOp()) == -sp.I*createOp()
+        assert (Dagger((qOp() + sp.I*pOp())**2) 
+                == (qOp() - sp.I*pOp())**2)
+        shared = (annihilateOp() + 2*sp.I*createOp())**2
+        shared_dagger = (createOp() - 2*sp.I*annihilateOp())**2
+        assert (Dagger(shared*pOp()*shared - rand_poly*shared)
+                - (shared_dagger*pOp()*shared_dagger 
+                   - shared_dagger*Dagger(rand_poly))).expand() == 0
+    
+    def test_wigner_transform_commutator(self):
+        for A, B in [[createOp()*annihilateOp() + qOp()**2, rho()],
+                     [rho(), pOp()*qOp()],
+                     [qOp(), pOp()**2]]:
+            assert (WignerTransform(spq.Commutator(A, B)) 
+                    - WignerTransform(A*B - B*A)).expand() == 0
+            assert (WignerTransform(spq.AntiCommutator(A, B)) 
+                    - WignerTransform(A*B + B*A)).expand() == 0
     
+    def test_dissipator_wigner_transform(self):
+        a, ad, q0 = annihilateOp(), createOp(), qOp()
+        kappa = sp.Symbol("kappa", positive=True)
+        for P, Q in [[a, a], [a**2, a**2], [ad*a + q0, a], [q0, pOp()*a]]:
+            D = _LindbladDissipator(kappa, P, Q)
+            assert _sorted_derivatives((D.wigner_transform() 
+                                        - WignerTransform(D.expand())).expand()) == 0
+    
+    def test_lindblad_master_equation(self):
+        a, ad = annihilateOp(), createOp()
+        kappa = sp.Symbol("kappa", positive=True)
+        with execution_context(subsystems=[None]):
+            eom = LindbladMasterEquation(ad*a, [[kappa, a]]).wigner_transform
+            q0, p0, W0 = q(), p(), W()
+        dW = sp.Derivative(W0, q0), sp.Derivative(W0, p0)
+        expected = (q0*dW[1] - p0*dW[0])/hbar \
+                   + kappa/2 * (sp.diff(q0*W0, q0) + sp.diff(p0*W0, p0)) \
+                   + kappa*hbar/4 * (sp.diff(W0, q0, 2) + sp.diff(W0, p0, 2))
+        assert eom.lhs == sp.Derivative(W0, t())
+        assert (eom.rhs - expected).expand() == 0
+
     def test_wigner_transform(self):
         N = len(_sub_cache)
         for op, wig in zip([qOp(), pOp(),
@@ -136,6 +197,9 @@ def test_mp_helper():
     
     MP_CONFIG["enable"] = enable_default
 
+def mp_helper_state(x):
+    return _mp_is_running.get(), _get_config("num_cpus"), sorted(map(str, _get_sub_cache()))
+
 @pytest.mark.order(3)
 class TestStarProduct():
     
@@ -241,8 +305,1075 @@ class TestStarProduct():
             
             assert (_star_base(A, B) - out).expand() == 0
         
+    def test_bopp_operator(self):
+        q0, p0, q1 = self.q, self.p, q(self.rand_N+1)
+        
+        def reference(A, F):
+            X = (Bopp(A) * _Primed(F)).expand()
+            X = sp.Add(*[_replace_diff(X_) for X_ in sp.Add.make_args(X)])
+            return _DePrimed(X).doit().expand()
+        
+        for A, F in [[q0**2*p0, W()],
+                     [alpha()*q1, p0*sp.Derivative(W(), q0) + q1**2*W()],
+                     [p0**3, sp.exp(q0)*W() + q0]]:
+            op = Bopp(A, compiled=True)
+            assert isinstance(op, BoppOperator)
+            assert _sorted_derivatives((op.apply(F) - reference(A, F)).expand()) == 0
+            assert op.order == sp.Poly(A, *(A.free_symbols - {hbar})).total_degree()
+            assert dill.loads(dill.dumps(op)) == op
+            assert Bopp(A, compiled=True) is op
+            with execution_context(caches={}):
+                assert Bopp(A, compiled=True) is not op
+            
+        A, B = q0**2*p0, alphaD()
+        L_A, R_B = Bopp(A, compiled=True), Bopp(B, left=True, compiled=True)
+        assert _sorted_derivatives((L_A.compose(R_B)(W()) - Star(A, W(), B)).expand()) == 0
+        assert (L_A - Bopp(A, left=True, compiled=True)) == 2*L_A.parity(1)
+        assert (L_A + Bopp(A, left=True, compiled=True)) == 2*L_A.parity(0)
+    
+    def test_moyal_bracket(self):
+        q0, p0 = self.q, self.p
+        assert MoyalBracket(q0, p0) == 1
+        assert MoyalBracket(q0**2, 3) == 0
+        assert MoyalAntiBracket(q0**2, 3) == 3*q0**2
+        
+        for A, B in [[q0**3*p0, p0**2*q0 + q0],
+                     [alpha(), alphaD()**2],
+                     [q0**2*p0, W()],
+                     [sp.Derivative(W(), q0), p0**3]]:
+            bracket = (Star(A, B) - Star(B, A)) / (sp.I*hbar)
+            anti_bracket = (Star(A, B) + Star(B, A)) / 2
+            assert _sorted_derivatives((MoyalBracket(A, B) - bracket).expand()) == 0
+            assert _sorted_derivatives((MoyalAntiBracket(A, B) - anti_bracket).expand()) == 0
+        
+    def test_exponential_star(self):
+        q0, p0 = q(), p()
+        E = sp.exp(-(q0**2 + p0**2)/hbar)
+        assert sp.simplify(Star(E, E) - E/2) == 0
+        
+        a, b, c, d = sp.symbols("a b c d", real=True)
+        A, B = sp.exp(sp.I*(a*q0 + b*p0)), sp.exp(sp.I*(c*q0 + d*p0))
+        phase = sp.exp(-sp.I*hbar/2*(a*d - b*c))
+        assert sp.simplify(Star(A, B) - phase*A*B) == 0
+        assert sp.simplify(MoyalBracket(A, B) - 2/hbar*sp.sin(hbar/2*(b*c - a*d))*A*B
+                           ).rewrite(sp.exp).simplify() == 0
+        
+        # Modes multiply independently.
+        E0, E1 = [sp.exp(-(q(i)**2 + p(i)**2)/hbar) for i in [0, 1]]
+        assert sp.simplify(Star(E0*E1, 3*E0*E1 + E0) - sp.Rational(5, 4)*E0*E1) == 0
+        
+        with pytest.raises(ValueError):
+            Star(sp.exp(q0**3), sp.exp(p0))
+        
+    def test_exponential_star_numeric(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import PhaseSpaceGrid
+        
+        grid = PhaseSpaceGrid((-8, 8), 64)
+        q0, p0 = q(), p()
+        A = 2*sp.exp(-(q0 - 1)**2/hbar - p0**2/(2*hbar) + sp.I*q0*p0/4)
+        B = sp.exp(-(q0**2 + (p0 + sp.Rational(1, 2))**2)/hbar)
+        assert np.allclose(grid.sample(Star(A, B)),
+                           grid.star(grid.sample(A), grid.sample(B)), atol=1e-10)
+        
     def test_star(self):
         assert Star() == 1
         assert Star(self.q) == self.q
         for n in range(2, 5):
-            assert Star(*[self.q]*n) == self.q**n
\ No newline at end of file
+            assert Star(*[self.q]*n) == self.q**n
+
+
+def _sorted_derivatives(expr):
+    """
+    Sort the differentiation variables of the derivatives in `expr`, which
+    SymPy does not do for undefined functions.
+    """
+    return expr.replace(lambda x: isinstance(x, sp.Derivative),
+                        lambda x: sp.Derivative(x.expr, *sorted(x.variable_count, key=str)))
+
+@pytest.mark.order(4)
+class TestWeylTransform():
+    
+    q0, p0, q1, p1 = q(0), p(0), q(1), p(1)
+    
+    def test_weyl_ordering(self):
+        # The ordered outputs use the canonical commutation relations, which 
+        # SymPy does not know of, so we compare the Wigner transforms.
+        def same_operator(A, B):
+            return (WignerTransform(A) - WignerTransform(B)).expand() == 0
+        
+        q0, p0 = qOp(0), pOp(0)
+        a, ad = annihilateOp(0), createOp(0)
+        assert same_operator(weyl_ordering(p0*q0), (q0*p0 + p0*q0)/2)
+        assert same_operator(weyl_ordering(ad*a), (ad*a + a*ad)/2)
+        assert weyl_ordering(ad*a).has(annihilateOp)
+        assert same_operator(weyl_ordering(p0*q0*q0 + 2*q0),
+                             (q0**2*p0 + q0*p0*q0 + p0*q0**2)/3 + 2*q0)
+        
+    def test_weyl_transform(self):
+        assert WeylTransform(sp.Symbol("x")) == sp.Symbol("x")
+        assert WeylTransform(self.q0) == qOp(0)
+        symmetrized = sp.Add(*[sp.Mul(*word) 
+                               for word in set(itertools.permutations([qOp(0)]*3+[pOp(0)]*2))]) / 10
+        assert (WignerTransform(WeylTransform(self.q0**3*self.p0**2) - symmetrized)).expand() == 0
+        
+        # The number of words grows linearly with the degree.
+        assert len(WeylTransform(self.q0**10*self.p0**10).args) == 11
+        
+        for ladder, A in itertools.product([False, True],
+                                           [self.q0**2*self.p0 + 3*self.q1*self.p1*self.q0, 
+                                            alpha(0)**2*alphaD(0),
+                                            self.p0*W(), 
+                                            sp.Derivative(W(), self.p1)]):
+            X = WeylTransform(A, ladder=ladder)
+            assert not(X.has(Scalar))
+            assert (ladder == X.has(annihilateOp, createOp))
+            assert (WignerTransform(X) - A).expand() == 0
+        
+        for A in [self.q0*sp.Derivative(W(), self.p0, self.q1),
+                  self.p0**2*sp.Derivative(W(), (self.q0, 2))]:
+            assert _sorted_derivatives((WignerTransform(WeylTransform(A)) - A).expand()) == 0
+
+@pytest.mark.order(5)
+class TestAsync():
+    
+    def test_star_async(self):
+        events = []
+        async def main():
+            return await star_async(q(), p(), q(), on_progress=events.append)
+        assert asyncio.run(main()) == Star(q(), p(), q())
+        assert events[-1] == ProgressEvent("star", 3, 3)
+        
+    def test_wigner_transform_async(self):
+        A = createOp()*annihilateOp()*rho() + rho()*qOp()
+        async def main():
+            return await wigner_transform_async(A)
+        assert (asyncio.run(main()) - WignerTransform(A)).expand() == 0
+    
+    def test_deadline_and_cancellation(self):
+        async def timed_out():
+            start = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await _run_in_process(time.sleep, (60,), timeout=0.5)
+            return time.monotonic() - start
+        assert asyncio.run(timed_out()) < 30
+        assert not(multiprocessing.active_children())
+        
+        async def cancelled():
+            task = asyncio.create_task(_run_in_process(time.sleep, (60,)))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        asyncio.run(cancelled())
+        assert not(multiprocessing.active_children())
+        
+    def test_worker_settings(self):
+        async def main():
+            with execution_context(num_cpus=3, subsystems=["aio"]):
+                state = await _run_in_process(mp_helper_state, (0,))
+                # The second worker gets the CPU left by the pool of the first.
+                cpus = await asyncio.gather(_run_in_process(_aio_num_cpus, (1,)),
+                                            _run_in_process(_aio_num_cpus, (1,)))
+            return state, cpus
+        state, cpus = asyncio.run(main())
+        assert state == (False, 3, ["aio"])
+        # Started by the executor threads, in either order.
+        assert sorted(cpus) == [1, 3]
+    
+    def test_bounded_workers(self):
+        async def main():
+            with execution_context(num_cpus=2):
+                tasks = [asyncio.create_task(_run_in_process(_aio_num_cpus, (1,))) for _ in range(5)]
+                live = 0
+                while not(all(task.done() for task in tasks)):
+                    live = max(live, len(multiprocessing.active_children()))
+                    await asyncio.sleep(0.05)
+                return live, [task.result() for task in tasks]
+        live, cpus = asyncio.run(main())
+        assert 1 <= live <= 2
+        assert all(1 <= cpu <= 2 for cpu in cpus)
+        
+        # A task waiting for a worker still meets its deadline.
+        async def queued():
+            with execution_context(num_cpus=1):
+                running = asyncio.create_task(_run_in_process(time.sleep, (60,)))
+                await asyncio.sleep(0.5)
+                start = time.monotonic()
+                with pytest.raises(asyncio.TimeoutError):
+                    await _run_in_process(time.sleep, (0,), timeout=0.5)
+                elapsed = time.monotonic() - start
+                running.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await running
+            return elapsed
+        assert asyncio.run(queued()) < 5
+        assert not(multiprocessing.active_children())
+
+def _aio_num_cpus(seconds):
+    time.sleep(seconds)
+    return _get_config("num_cpus")
+
+@pytest.mark.order(6)
+class TestEstimate():
+    q0, p0 = q(), p()
+    q1, p1 = q(1), p(1)
+    
+    def test_estimate_star(self):
+        # `Bopp` shifts `q**a * p**b` into `(a+1)*(b+1)` terms.
+        for A, B, intermediate in [(self.q0**2*self.p0, self.p0**3*self.q0, 3*2),
+                                   (self.q0*self.p1**2, self.p0*self.q1, 2*3),
+                                   (self.q0**2 + self.p0, W(), 3 + 2),
+                                   (sp.Derivative(W(), self.q0), self.p0**2*self.q1, 3*2)]:
+            est = estimate_star(A, B)
+            assert est.intermediate_terms == intermediate
+            assert est.output_terms >= len(sp.Add.make_args(Star(A, B).expand()))
+            assert est.star_calls == 1
+        
+        assert estimate_star(self.q0, 2, self.p0).star_calls == 1
+        assert estimate_star(self.q0**3, self.p0**2).max_derivative_order == 3
+        
+        with pytest.raises(ValueError):
+            estimate_star(sp.exp(self.q0), self.p0)
+        with pytest.raises(ValueError):
+            estimate_star(W(), W())
+            
+    def test_estimate_wigner_transform(self):
+        for A in [annihilateOp()*rho()*createOp(),
+                  createOp()*annihilateOp()*rho() - rho()*createOp()*annihilateOp(),
+                  (qOp() + pOp())**2 * rho()]:
+            est = estimate_wigner_transform(A)
+            assert est.output_terms >= len(sp.Add.make_args(WignerTransform(A).expand()))
+            assert est.cpu_seconds > 0
+            assert est.memory_bytes > 0
+        
+        # Words with equal supports are counted together.
+        assert estimate_wigner_transform((qOp()+pOp())**2 * rho()).star_calls == 4*2
+        
+        # Commutators are counted as the products in both orders.
+        a, ad = annihilateOp(), createOp()
+        est = estimate_wigner_transform(spq.Commutator(ad**2*a**2, rho()))
+        assert est == estimate_wigner_transform(ad**2*a**2*rho() - rho()*ad**2*a**2)
+        assert est.star_calls > 0 and est.cpu_seconds > 0
+        assert est.output_terms >= len(sp.Add.make_args(
+            WignerTransform(spq.Commutator(ad**2*a**2, rho())).expand()))
+        with pytest.raises(ValueError):
+            estimate_star(spq.Commutator(ad, a), W())
+        
+    def test_calibrate_estimator(self):
+        old = dict(ESTIMATOR_CONFIG)
+        try:
+            fit = calibrate_estimator(num_samples=3, max_pow=1, seed=0)
+            assert fit == {key : ESTIMATOR_CONFIG[key] for key in fit}
+            assert all(val >= 0 for val in fit.values())
+        finally:
+            ESTIMATOR_CONFIG.update(old)
+
+@pytest.mark.order(7)
+class TestExecutionContext():
+    
+    def test_overrides(self):
+        num_cpus = MP_CONFIG["num_cpus"]
+        with execution_context(num_cpus=1, min_num_args=0):
+            assert _get_config("num_cpus") == 1
+            assert _get_config("min_num_args") == 2
+            with execution_context(enable=False):
+                assert _get_config("num_cpus") == 1
+                assert not(_get_config("enable"))
+            assert _get_config("enable") == MP_CONFIG["enable"]
+        assert MP_CONFIG["num_cpus"] == num_cpus
+        
+        with pytest.raises(KeyError):
+            with execution_context(foo=1):
+                pass
+        
+        with execution_context(caches={}):
+            _get_cache("test")["x"] = 1
+            assert _get_cache("test") == {"x" : 1}
+        assert "x" not in _get_cache("test")
+            
+    def test_threads(self):
+        barrier = threading.Barrier(2)
+        def in_context(num_cpus):
+            with execution_context(num_cpus=num_cpus):
+                barrier.wait()
+                return _get_config("num_cpus")
+        with ThreadPoolExecutor(2) as executor:
+            assert list(executor.map(in_context, [1, 3])) == [1, 3]
+        
+        A = createOp()*annihilateOp()*rho() + rho()*createOp()*annihilateOp() + qOp()*rho()
+        expected = WignerTransform(A)
+        def transform(enable):
+            with execution_context(enable=enable, caches={}):
+                return WignerTransform(A)
+        with ThreadPoolExecutor(4) as executor:
+            for out in executor.map(transform, [True, False, True, False]):
+                assert (out - expected).expand() == 0
+        
+    def test_workers(self):
+        with execution_context(num_cpus=2, subsystems=["iso"]):
+            q("iso2")
+            assert sorted(map(str, _get_sub_cache())) == ["iso", "iso2"]
+            assert set(W().args) == {t(), q("iso"), p("iso"), q("iso2"), p("iso2")}
+            
+            expected = [(True, 2, ["iso", "iso2"])]*2
+            assert _mp_helper([0, 1], mp_helper_state) == expected
+            with multiprocessing.Pool(1) as pool:
+                with execution_context(pool=pool):
+                    assert _mp_helper([0, 1], mp_helper_state) == expected
+        
+        assert sp.Symbol("iso2") not in _sub_cache
+        assert not(_mp_is_running.get())
+        
+    def test_collect_subsystems(self):
+        with execution_context(subsystems=[]):
+            a, ad = annihilateOp("c"), createOp("c")
+            eom = LindbladMasterEquation(ad**2*a**2, [[sp.Symbol("kappa"), a]]).wigner_transform
+            assert sorted(map(str, _get_sub_cache())) == ["c"]
+            assert set(W().args) == {t(), q("c"), p("c")}
+            assert (eom.rhs.free_symbols 
+                    - {q("c"), p("c"), t(), hbar, pi, sp.Symbol("kappa")}) == set()
+            
+            again = LindbladMasterEquation(ad**2*a**2, [[sp.Symbol("kappa"), a]]).wigner_transform
+            assert (again.rhs - eom.rhs).expand() == 0
+            assert (collect_by_derivative(eom.rhs) - eom.rhs).expand() == 0
+
+    def test_checkpoint(self, tmp_path):
+        a, ad = annihilateOp(), createOp()
+        terms = [ad*a*rho(), rho()*ad*a, a*rho()*ad, qOp()**2*rho()]
+        expected = [WignerTransform(A) for A in terms]
+        def paths(foo, stage="map"):
+            return [tmp_path / key[:2] / f"{key}.ckpt"
+                    for key in [_job_key(_foo_name(foo), A, stage) for A in terms]]
+        
+        _checkpoint_calls.clear()
+        with execution_context(enable=False, checkpoint=str(tmp_path)):
+            assert _mp_helper(terms[:2], checkpoint_foo) == expected[:2]
+            assert len(_checkpoint_calls) == 2
+            # Only the new terms are computed.
+            assert _mp_helper(terms, checkpoint_foo) == expected
+            assert len(_checkpoint_calls) == 4
+            # Lambdas have no stable name, and are not checkpointed.
+            _mp_helper(terms[:1], lambda A: checkpoint_foo(A))
+            assert len(_checkpoint_calls) == 5
+        assert all(path.exists() for path in paths(checkpoint_foo))
+        
+        # The results of the pool workers are saved too.
+        with execution_context(backend="thread", num_cpus=2, checkpoint=str(tmp_path)):
+            assert _mp_helper(terms, WignerTransform, stage="resume") == expected
+        assert all(path.exists() for path in paths(WignerTransform, "resume"))
+        
+        # A corrupted checkpoint is quarantined and recomputed, never merged.
+        path = paths(checkpoint_foo)[0]
+        path.write_bytes(path.read_bytes()[:-3] + b"xyz")
+        with execution_context(enable=False, checkpoint=str(tmp_path)):
+            with pytest.warns(UserWarning, match="corrupted"):
+                assert _mp_helper(terms, checkpoint_foo) == expected
+        assert len(_checkpoint_calls) == 6
+        assert len(list((tmp_path / "quarantine").iterdir())) == 1
+        assert _load(str(tmp_path), _job_key(_foo_name(checkpoint_foo), terms[0], "map")) \
+            == (True, expected[0])
+        
+        # A job is saved as it completes, while an earlier one is still running:
+        # the slow job waits for the checkpoint of the fast one.
+        slow, fast = sp.Symbol("slow"), sp.Symbol("fast")
+        with execution_context(backend="thread", num_cpus=2, checkpoint=str(tmp_path)):
+            key = _job_key(_foo_name(checkpoint_order_foo), fast, "map")
+            _checkpoint_wait["path"] = tmp_path / key[:2] / f"{key}.ckpt"
+            assert _mp_helper([slow, fast], checkpoint_order_foo) == [1, fast]
+
+_checkpoint_calls = []
+def checkpoint_foo(A):
+    _checkpoint_calls.append(A)
+    return WignerTransform(A)
+
+_checkpoint_wait = {}
+def checkpoint_order_foo(x):
+    if x != sp.Symbol("slow"):
+        return x
+    deadline = time.monotonic() + 10
+    while not(_checkpoint_wait["path"].exists()) and (time.monotonic() < deadline):
+        time.sleep(0.02)
+    return sp.Integer(_checkpoint_wait["path"].exists())
+
+_symmetry_calls = []
+def symmetry_foo(A):
+    _symmetry_calls.append(A)
+    return WignerTransform(A)
+
+@pytest.mark.order(8)
+class TestSymmetry():
+    subs = ["s0", "s1", "s2"]
+    
+    def test_symmetric_map(self):
+        a = [annihilateOp(sub) for sub in self.subs]
+        ad = [createOp(sub) for sub in self.subs]
+        omega, U, J = sp.symbols("omega U J")
+        terms = [omega*ad[j]*a[j] for j in range(3)] \
+                + [U*ad[j]**2*a[j]**2*rho() for j in range(3)] \
+                + [J*ad[j]*rho()*a[(j+1)%3] for j in range(3)] \
+                + [qOp("s0")*pOp("s1")]
+        
+        _symmetry_calls.clear()
+        with execution_context(enable=False):
+            out = _symmetric_map(terms, symmetry_foo)
+        assert len(_symmetry_calls) == 4
+        for X, A in zip(out, terms):
+            assert _sorted_derivatives((X - WignerTransform(A)).expand()) == 0
+    
+    def test_lattice(self):
+        a = [annihilateOp(sub) for sub in self.subs]
+        ad = [createOp(sub) for sub in self.subs]
+        kappa, J = sp.symbols("kappa J", positive=True)
+        H = sp.Add(*[ad[j]**2*a[j]**2 + J*(ad[j]*a[(j+1)%3] + ad[(j+1)%3]*a[j]) for j in range(3)])
+        eom = LindbladMasterEquation(H, [[kappa, a[j]] for j in range(3)])
+        eom.neat_display = False
+        
+        expected = WignerTransform(-sp.I/hbar*(H*rho() - rho()*H))
+        expected += sp.Add(*[WignerTransform(kappa/2*(2*a[j]*rho()*ad[j] - rho()*ad[j]*a[j]
+                                                      - ad[j]*a[j]*rho())) for j in range(3)])
+        expected = expected / (2*pi*hbar)**len(_sub_cache)
+        assert _sorted_derivatives((eom.wigner_transform.rhs - expected).expand()) == 0
+
+    def test_coefficient_dedup(self, monkeypatch):
+        import moyalstar.core.wigner_transform as wt
+        a, ad = annihilateOp("s0"), createOp("s0")
+        kappa, gamma = sp.symbols("kappa gamma")
+        A = kappa*ad*a*rho() + gamma*ad*a*rho() - 2*ad*a*rho() + kappa*a*rho()*ad + q("s0")*a
+
+        assert wt._split_coefficient(3*kappa*ad*a*rho()) == (3*kappa, ad*a*rho())
+        assert wt._split_coefficient(kappa*q("s0")*a) == (kappa, q("s0")*a)
+
+        words = []
+        def spy(A_args, foo, stage="map"):
+            words.extend(A_args)
+            return _symmetric_map(A_args, foo, stage)
+        monkeypatch.setattr(wt, "_symmetric_map", spy)
+        out = WignerTransform(A)
+        assert len(words) == 3
+        rho_W = WignerTransform(rho())
+        expected = (kappa + gamma - 2)*Star(alphaD("s0"), alpha("s0"), rho_W) \
+                   + kappa*Star(alpha("s0"), rho_W, alphaD("s0")) + Star(q("s0"), alpha("s0"))
+        assert _sorted_derivatives((out - expected).expand()) == 0
+
+@pytest.mark.order(9)
+class TestMoments():
+    kappa = sp.Symbol("kappa", positive=True)
+    
+    def test_damped_oscillator(self):
+        with execution_context(subsystems=[None]):
+            a, ad = annihilateOp(), createOp()
+            moments = LindbladMasterEquation(ad*a, [[self.kappa, a]]).moment_equations(2)
+            q0, p0 = q(), p()
+        assert moments.moments == [q0, p0, q0**2, q0*p0, p0**2]
+        assert not(moments.unclosed)
+        assert moments.parameters == [hbar, self.kappa]
+        
+        x = dict(zip(moments.moments, moments.symbols))
+        assert (moments.rhs[0] - (x[p0]/hbar - self.kappa/2*x[q0])).expand() == 0
+        
+        A, b = moments.linear_system()
+        steady_state = sp.solve(list(A*sp.Matrix(moments.symbols) + b), moments.symbols)
+        assert steady_state == {x[q0] : 0, x[p0] : 0, 
+                                x[q0**2] : hbar/2, x[q0*p0] : 0, x[p0**2] : hbar/2}
+        
+    def test_quartic(self):
+        with execution_context(subsystems=[]):
+            a, ad = annihilateOp("m"), createOp("m")
+            moments = LindbladMasterEquation(ad**2*a**2).moment_equations(2, "gaussian")
+            q0, p0 = q("m"), p("m")
+        assert moments.variables == [q0, p0]
+        assert moments.moments == [q0, p0, q0**2, q0*p0, p0**2]
+        assert not(moments.unclosed)
+        assert all(not(X.free_symbols & {q0, p0}) for X in moments.rhs)
+        
+    def test_closure(self):
+        x, y = sp.symbols("x y")
+        m = lambda s: sp.Symbol(s)
+        moment = lambda M: m(str(M))
+        gaussian = _Closure(2, moment)
+        assert (gaussian((x, x, x)) - (3*m("x")*m("x**2") - 2*m("x")**3)).expand() == 0
+        assert (gaussian((x, x, y, y)).subs({m("x") : 0, m("y") : 0})
+                - (m("x**2")*m("y**2") + 2*m("x*y")**2)).expand() == 0
+        assert _Closure(3, moment)((x, x, x)) == m("x**3")
+        
+        with execution_context(subsystems=[None]):
+            a, ad = annihilateOp(), createOp()
+            eom = LindbladMasterEquation(ad**2*a**2, [[self.kappa, a]])
+            assert eom.moment_equations(2).unclosed
+            gaussian = eom.moment_equations(2, closure="gaussian")
+            cumulant = eom.moment_equations(3, closure="cumulant")
+        assert not(gaussian.unclosed) and not(cumulant.unclosed)
+        assert not(gaussian.is_linear)
+        with pytest.raises(ValueError):
+            gaussian.linear_system()
+        with pytest.raises(ValueError):
+            eom.moment_equations(1, closure="gaussian")
+        with pytest.raises(ValueError):
+            eom.moment_equations(2, closure="foo")
+    
+    def test_lambdify(self):
+        np = pytest.importorskip("numpy")
+        with execution_context(subsystems=[None]):
+            a, ad = annihilateOp(), createOp()
+            moments = LindbladMasterEquation(ad**2*a**2, [[self.kappa, a]]) \
+                .moment_equations(2, closure="gaussian")
+        f = moments.lambdify()
+        assert f.parameters == [hbar, self.kappa]
+        
+        x = np.random.default_rng(0).normal(size=(5, 7))
+        out = f(0, x, 1.0, np.linspace(0, 1, 7))
+        assert out.shape == (5, 7)
+        for i in range(7):
+            subs = dict(zip(moments.symbols, x[:, i]))
+            subs.update({hbar : 1.0, self.kappa : np.linspace(0, 1, 7)[i]})
+            expected = [complex(X.subs(subs).subs(pi, sp.pi)) for X in moments.rhs]
+            assert np.allclose(out[:, i], expected)
+
+@pytest.mark.order(10)
+class TestNumericGrid():
+    
+    def test_star_against_symbolic(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import PhaseSpaceGrid
+        
+        grid = PhaseSpaceGrid((-8, 8), 64, subs=["g"])
+        q0, p0 = q("g"), p("g")
+        # E★E = E/2, so the products below decay fast enough for the grid.
+        E = sp.exp(-(q0**2 + p0**2)/hbar)
+        for P1, P2 in [[q0 + p0**2, p0*q0 + 1],
+                       [alpha("g")**2, alphaD("g")*q0]]:
+            F = grid.sample(Star(P1, E))
+            G = grid.sample(Star(E, P2))
+            expected = grid.sample(Star(P1, E/2, P2))
+            assert np.allclose(grid.star(F, G), expected, atol=1e-10)
+            
+            # Batch axes are broadcast, also across chunks.
+            out = grid.star(np.stack([F, 2*F]), G, max_chunk_elements=1000)
+            assert np.allclose(out[1], 2*expected, atol=1e-10)
+        
+        assert np.allclose(grid.star(), 1)
+        assert np.allclose(grid.star(F), F)
+    
+    def test_product_state(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import PhaseSpaceGrid
+        
+        grid_1 = PhaseSpaceGrid((-5, 5), 16, hbar=0.5)
+        grid_2 = PhaseSpaceGrid((-5, 5), 16, subs=[0, 1], hbar=0.5)
+        assert grid_2.shape == (16,)*4
+        
+        rng = np.random.default_rng(0)
+        Q, P = grid_1.mesh()
+        def random_gaussian():
+            c = rng.normal(size=4)
+            return (c[0] + c[1]*Q) * np.exp(-(Q-c[2])**2 - (P-c[3])**2)
+        f_1, f_2, g_1, g_2 = [random_gaussian() for _ in range(4)]
+        
+        out = grid_2.star(np.einsum("ij,kl->ijkl", f_1, f_2), 
+                          np.einsum("ij,kl->ijkl", g_1, g_2))
+        expected = np.einsum("ij,kl->ijkl", grid_1.star(f_1, g_1), grid_1.star(f_2, g_2))
+        assert np.allclose(out, expected)
+    
+    def test_fock_wigner(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import PhaseSpaceGrid, fock_wigner
+        
+        grid = PhaseSpaceGrid((-6, 6), 48, hbar=0.5)
+        vacuum = sp.exp(-(q()**2 + p()**2)/hbar) / (pi*hbar)
+        
+        rng = np.random.default_rng(1)
+        rho = rng.normal(size=(3, 3)) + 1j*rng.normal(size=(3, 3))
+        expected = sum(rho[m, n] * Star(alphaD()**m, vacuum, alpha()**n) 
+                       / sp.sqrt(sp.factorial(m)*sp.factorial(n))
+                       for m in range(3) for n in range(3))
+        assert np.allclose(fock_wigner(rho, grid), grid.sample(expected), atol=1e-10)
+        
+        # Hermitian matrices give real and normalized Wigner functions.
+        rho = rho @ rho.conj().T
+        rho /= np.trace(rho)
+        out = fock_wigner(rho, grid)
+        assert out.dtype == float
+        assert np.isclose(out.sum() * np.prod(grid.spacings), 1)
+        
+        # Entangled two-mode state, on a grid and at scattered points.
+        grid_2 = PhaseSpaceGrid((-4, 4), [6, 7, 8, 9], subs=[0, 1])
+        psi = rng.normal(size=6) + 1j*rng.normal(size=6)
+        on_grid = fock_wigner(psi, grid_2, dims=[2, 3], max_chunk_elements=50)
+        assert on_grid.shape == grid_2.shape
+        points = np.stack(grid_2.mesh(), axis=-1)
+        assert np.allclose(fock_wigner(psi, points.reshape(-1, 4), dims=[2, 3]),
+                           on_grid.ravel())
+        assert np.allclose(fock_wigner(np.outer(psi, psi.conj()), points, dims=[2, 3],
+                                       max_chunk_elements=100),
+                           on_grid)
+        
+        with pytest.raises(ValueError):
+            fock_wigner(psi, grid_2)
+    
+    def test_compiled_expression(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import PhaseSpaceGrid, CompiledExpression
+        
+        g, w = sp.symbols("gamma omega", real=True)
+        expr = WignerTransform(g * Dagger(annihilateOp())*annihilateOp() + w*qOp()**2)
+        f = CompiledExpression(expr)
+        assert f.parameters == [g, w]
+        assert CompiledExpression(2*expr/2)._foo is f._foo
+        
+        grid = PhaseSpaceGrid((-3, 3), 8, hbar=0.5)
+        gammas, omegas = np.linspace(0, 1, 5), np.linspace(1, 2, 3)
+        out = f(grid, {g : gammas[:, None], "omega" : omegas})
+        assert out.shape == (5, 3) + grid.shape
+        for i, j in [[0, 0], [4, 2], [2, 1]]:
+            assert np.allclose(out[i, j], grid.sample(expr, {g : gammas[i], w : omegas[j]}))
+        
+        points = np.stack(grid.mesh(), axis=-1)[::2]
+        assert np.allclose(f(points, {g : gammas, w : 1}, hbar=0.5), 
+                           f(grid, {g : gammas, w : 1})[:, ::2])
+        
+        rhs = LindbladMasterEquation(w*Dagger(annihilateOp())*annihilateOp(), 
+                                     [[g, annihilateOp()]]).wigner_transform.rhs
+        coeffs = CompiledExpression(rhs)(grid, {g : 0.1, w : 1})
+        assert set(coeffs) == set(_split_W(rhs))
+        
+        with pytest.raises(ValueError):
+            f(grid, {g : 1})
+    
+    def test_eom_file(self, tmp_path):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import save_eom, load_eom, CompiledExpression
+        
+        g, w, K = sp.symbols("gamma omega K", real=True)
+        a = annihilateOp()
+        H = w*Dagger(a)*a + K*Dagger(a)**2*a**2 + sp.sqrt(2)*g*(a + Dagger(a))
+        lme = LindbladMasterEquation(H, [[g, a], [2*g, a**2]])
+        eom = lme.wigner_transform
+        
+        save_eom(lme, tmp_path / "eom.npz")
+        tables = load_eom(tmp_path / "eom.npz")
+        assert tables.parameters == ["K", "gamma", "hbar", "omega"]
+        # 'alpha' brings half-integer powers of 'hbar'.
+        assert tables.exponent_denominator == 2
+        assert tables.parameter_assumptions[2] == ",".join(f"{key}={val}" 
+                                                           for key, val in sorted(hbar.assumptions0.items()))
+        
+        eq = tables.to_equality()
+        assert eq.lhs == eom.lhs
+        assert _sorted_derivatives((eq.rhs - eom.rhs).expand()) == 0
+        
+        # 'W' depends on the subsystems registered by other tests as well.
+        variables = list(eom.lhs.args[0].args[1:])
+        assert tables.variables == [str(x) for x in variables]
+        points = np.random.default_rng(0).normal(size=(4, 5, len(variables)))
+        out = tables.evaluate(points, {"gamma" : 0.3, "omega" : 1.2, "K" : 0.1, 
+                                       "hbar" : np.array([[0.5], [1], [1], [1]])})
+        expected = CompiledExpression(eom.rhs, subs=tables.subsystems)(
+            points[None], {g : 0.3, w : 1.2, K : 0.1}, hbar=1)
+        for D, X in expected.items():
+            orders = dict(D.variable_count) if isinstance(D, sp.Derivative) else {}
+            beta = tuple(orders.get(x, 0) for x in variables)
+            assert out[beta].shape == (4, 5)
+            assert np.allclose(out[beta][1:], X[0][1:])
+        
+        with pytest.raises(ValueError):
+            tables.evaluate(points, {"gamma" : 0.3})
+        with pytest.raises(ValueError):
+            save_eom(sp.Equality(eom.lhs, sp.exp(q())*W()), tmp_path / "bad.npz")
+        
+        # Exact radicals and complex rationals, rebuilt from integers only.
+        radical = sp.Equality(eom.lhs, sp.sqrt(-3)*hbar**sp.Rational(1, 3)/7*W() - sp.I*g*W())
+        save_eom(radical, tmp_path / "radical.npz")
+        tables = load_eom(tmp_path / "radical.npz")
+        assert list(tables.radicals) == [3]
+        assert (tables.to_equality().rhs - radical.rhs).expand() == 0
+
+    def test_steady_state(self):
+        np = pytest.importorskip("numpy")
+        pytest.importorskip("scipy")
+        from moyalstar.numeric import (PhaseSpaceGrid, fock_wigner, CompiledExpression,
+                                       WignerOperator, steady_state)
+        
+        kappa = sp.Symbol("kappa", positive=True)
+        w = sp.Symbol("omega", real=True)
+        with execution_context(subsystems=[]):
+            a = annihilateOp()
+            lme = LindbladMasterEquation(w*Dagger(a)*a, [[kappa, a]])
+            grid = PhaseSpaceGrid((-5, 5), 64)
+            L = WignerOperator(lme, grid)
+        
+        # The vacuum is the steady state under loss, for any rates.
+        vacuum = fock_wigner(np.array([[1]]), grid).real
+        for method in ["direct", "gmres", "bicgstab"]:
+            for params in [{kappa : 0.5, w : 1}, {kappa : 2, w : 0}]:
+                W = steady_state(L, params, method=method)
+                assert np.isclose(W.sum()*np.prod(grid.spacings), 1)
+                assert np.abs(W - vacuum).max() < 0.03*vacuum.max()
+        with pytest.raises(ValueError):
+            steady_state(L, {kappa : 1, w : 1}, method="eig")
+        with pytest.raises(ValueError):
+            L.matrix({kappa : np.array([1, 2]), w : 1})
+        
+        # Two modes, with the derivatives built from Kronecker products.
+        with execution_context(subsystems=[]):
+            a, b = annihilateOp(0), annihilateOp(1)
+            lme = LindbladMasterEquation(Dagger(a)*b + Dagger(b)*a, [[kappa, a], [kappa, b]])
+            grid = PhaseSpaceGrid((-6, 6), 24, subs=[0, 1])
+            L = WignerOperator(lme, grid)
+            eom = lme.wigner_transform
+            q0, p0, q1, p1 = grid.variables
+        assert L.matrix({kappa : 1}).shape == (24**4, 24**4)
+        
+        # Compare with the exact right-hand side for a Gaussian, asymmetric in the axes.
+        f = sp.exp(-(q0**2 + p0**2 + q1**2 + p1**2)/4 - q0*p1/8 + p0/3)
+        exact = eom.rhs.subs(eom.lhs.args[0], f).doit()
+        expected = CompiledExpression(exact, subs=[0, 1])(grid, {kappa : 1})
+        out = L.apply(CompiledExpression(f, subs=[0, 1])(grid), {kappa : 1})
+        assert np.abs(out - expected).max() < 0.05*np.abs(expected).max()
+        
+        # Two uncoupled modes: the stationary state is the product of those of
+        # the single modes, solved for directly.
+        F = sp.Symbol("F", real=True)
+        params = {kappa : 2, F : 0.25}
+        with execution_context(subsystems=[]):
+            a, b = annihilateOp(0), annihilateOp(1)
+            lme = LindbladMasterEquation(Dagger(a)*a + F*(a + Dagger(a)) + Dagger(b)*b,
+                                         [[kappa, a], [kappa/2, b]])
+            L = WignerOperator(lme, PhaseSpaceGrid((-3.5, 3.5), 12, subs=[0, 1]))
+        modes = []
+        for H, rate in [(Dagger(a)*a + F*(a + Dagger(a)), kappa), (Dagger(a)*a, kappa/2)]:
+            with execution_context(subsystems=[]):
+                L_mode = WignerOperator(LindbladMasterEquation(H, [[rate, a]]),
+                                        PhaseSpaceGrid((-3.5, 3.5), 12, subs=[0]))
+            modes.append(steady_state(L_mode, params))
+        expected = np.einsum("ij,kl->ijkl", *modes)
+        W = steady_state(L, params, method="gmres")
+        assert np.abs(W - expected).max() < 0.01*expected.max()
+        
+    def test_numeric_star(self):
+        pytest.importorskip("numpy")
+        from moyalstar.numeric import NumericPoly, numeric_star, numeric_wigner_transform
+        
+        def is_zero(X):
+            X = _sorted_derivatives(sp.expand(X))
+            return X.replace(lambda x: isinstance(x, sp.Float) and abs(x) < 1e-9, lambda x: 0) == 0
+        
+        q0, p0, q1, p1 = q(0), p(0), q(1), p(1)
+        A = q0**2*p0 + 3*p1**3*q0 + sp.I*q1
+        B = q0*p0**2 + 2*q1*p1
+        for args in [(A, B), (A, W()), (sp.Derivative(W(), q0, p1), B), (A, B, A)]:
+            expected = Star(*args).subs(hbar, 0.7)
+            assert is_zero(numeric_star(*args, hbar=0.7).to_expr() - expected)
+        assert is_zero(numeric_star(q0, p0, hbar=2).to_expr() - numeric_star(p0, q0, hbar=2).to_expr() - 2*sp.I)
+        
+        # Negligible terms are dropped.
+        assert len(numeric_star(q0**2, p0**2, hbar=1e-5, tol=1e-12)) == 3
+        assert len(numeric_star(q0**2, p0**2, hbar=1e-5, tol=1e-8)) == 2
+        
+        with pytest.raises(ValueError):
+            numeric_star(W(), W())
+        with pytest.raises(ValueError):
+            NumericPoly.from_expr(sp.Symbol("g")*q0)
+        
+        g, K = sp.symbols("g K", positive=True)
+        a, ad = annihilateOp(0), createOp(0)
+        lme = LindbladMasterEquation(K*ad**2*a**2 + g*(ad*annihilateOp(1) + createOp(1)*a), 
+                                     [[g, a], [g/3, a**2]])
+        values = {hbar : 0.7, g : 0.3, K : 1.1}
+        out = lme.numeric_wigner_transform(hbar=0.7, parameters={"g" : 0.3, K : 1.1})
+        assert out.has_W
+        assert is_zero(out.to_expr() - lme.wigner_transform.rhs.subs(values))
+        assert is_zero(numeric_wigner_transform(spq.Commutator(ad**2*a**2, rho()), hbar=0.7).to_expr()
+                       - WignerTransform(spq.Commutator(ad**2*a**2, rho())).subs({hbar : 0.7, pi : float(sp.pi)}))
+
+    def test_truncated_wigner(self):
+        np = pytest.importorskip("numpy")
+        from moyalstar.numeric import TruncatedWigner
+
+        kappa = sp.Symbol("kappa", positive=True)
+        w, chi = sp.symbols("omega chi", real=True)
+        with execution_context(subsystems=[]):
+            a = annihilateOp("m")
+            tw = TruncatedWigner(LindbladMasterEquation(w*Dagger(a)*a, [[kappa, a]]))
+            qm, pm = q("m"), p("m")
+            kerr = LindbladMasterEquation(chi*Dagger(a)**2*a**2, [[kappa, a]])
+            with pytest.raises(ValueError):
+                TruncatedWigner(kerr)
+            kerr = TruncatedWigner(kerr, truncate=True)
+        assert tw.variables == [qm, pm]
+        assert sp.simplify(tw.drift[0] - (-kappa*qm/2 + w*pm/hbar)) == 0
+        assert sp.simplify(tw.drift[1] - (-kappa*pm/2 - w*qm/hbar)) == 0
+        assert tw.diffusion == sp.eye(2)*hbar*kappa/2
+
+        # A coherent state decays to the vacuum, with the covariance of the vacuum throughout.
+        times = np.linspace(0, 10, 6)
+        kwargs = dict(parameters={kappa : 1, "omega" : 0.5}, num_trajectories=20000,
+                      dt=0.01, seed=1, observables={"n" : lambda x: (x**2).sum(axis=1)/2 - 1/2})
+        m = tw.simulate(([2, 0], np.eye(2)/2), times, chunk_size=6000, **kwargs)
+        expected = 2*np.exp(-times/2)
+        assert np.allclose(m.mean[:, 0], expected*np.cos(times/2), atol=0.05)
+        assert np.allclose(m.mean[:, 1], -expected*np.sin(times/2), atol=0.05)
+        assert np.allclose(m.covariance, np.eye(2)/2, atol=0.05)
+        assert np.allclose(m.observables["n"], expected**2/2, atol=0.05)
+
+        # Reproducible for the same seed and chunks.
+        again = tw.simulate(([2, 0], np.eye(2)/2), times, chunk_size=6000, **kwargs)
+        assert np.array_equal(m.mean, again.mean)
+
+        with pytest.raises(ValueError):
+            tw.simulate(([0, 0], np.eye(2)/2), times, {kappa : 1})
+
+        # The Kerr term has third-order derivatives, dropped only on request.
+        assert kerr.diffusion == sp.eye(2)*hbar*kappa/2
+        assert sp.expand(kerr.drift[0] + kappa*qm/2) == sp.expand(chi*pm*(qm**2 + pm**2 - 2*hbar)/hbar**2)
+
+    def test_liouvillian(self):
+        np = pytest.importorskip("numpy")
+        pytest.importorskip("scipy")
+        from moyalstar.numeric import fock_operator
+
+        kappa, F = sp.Symbol("kappa", positive=True), sp.Symbol("F", real=True)
+        a, b = annihilateOp(0), annihilateOp(1)
+        q0, p0 = qOp(0), pOp(0)
+
+        # [q, p] = iħ, except on the last Fock state.
+        C = fock_operator(q0*p0 - p0*q0, 6, hbar=0.5).toarray()
+        assert np.allclose(C[:5, :5], 0.5j*np.eye(5))
+        with pytest.raises(ValueError):
+            fock_operator(F*a, 4)
+        with pytest.raises(ValueError):
+            fock_operator(a*rho(), 4)
+
+        # Kronecker structure, with the first subsystem as the most significant index.
+        A = fock_operator(Dagger(a)*b + 2*q0, {0 : 3, 1 : 4}, hbar=2).toarray()
+        a3, a4 = np.diag(np.sqrt([1, 2]), 1), np.diag(np.sqrt([1, 2, 3]), 1)
+        expected = np.kron(a3.T, a4) + 2*np.kron(a3 + a3.T, np.eye(4))
+        assert np.allclose(A, expected)
+
+        # Trace preservation, for several modes and jump operators.
+        lme = LindbladMasterEquation(F*(Dagger(a)*b + Dagger(b)*a) + Dagger(a)**2*a**2,
+                                     [[kappa, a], [kappa/2, b**2], [kappa, a, b]])
+        L = lme.liouvillian([6, 5], parameters={"kappa" : 1, F : 0.3})
+        assert L.shape == (30**2, 30**2)
+        assert np.abs(np.eye(30).reshape(-1, order="F") @ L).max() < 1e-12
+
+        # A driven, damped mode relaxes to the coherent state with α = -2iF/(ħκ).
+        L = LindbladMasterEquation(F*(a + Dagger(a)), [[kappa, a]]).liouvillian(
+            20, parameters={kappa : 2, F : 0.5}, hbar=0.7)
+        w, v = np.linalg.eig(L.toarray())
+        rho_ss = v[:, np.argmin(np.abs(w))].reshape(20, 20, order="F")
+        rho_ss /= np.trace(rho_ss)
+        assert np.isclose(np.trace(fock_operator(a, 20) @ rho_ss), -1j/1.4)
+
+    def test_tensor_train(self):
+        np = pytest.importorskip("numpy")
+        pytest.importorskip("scipy")
+        from scipy.sparse.linalg import expm_multiply
+        from moyalstar.numeric import (PhaseSpaceGrid, WignerOperator, steady_state,
+                                       TensorTrain, tt_wigner_operator, tt_evolve, tt_steady_state)
+
+        # Exact round trip, and rounding of a sum back to rank one.
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(4, 5, 6))
+        assert np.allclose(TensorTrain.from_dense(X).full(), X)
+        factors = [rng.normal(size=n) for n in (4, 5, 6)]
+        Y = TensorTrain.from_factors(factors)
+        assert (Y + Y).round().ranks == [1, 1, 1, 1]
+        assert np.isclose((Y*3 - Y).norm(), 2*np.linalg.norm(np.einsum("i,j,k", *factors)))
+
+        kappa, F = sp.Symbol("kappa", positive=True), sp.Symbol("F", real=True)
+        with execution_context(subsystems=[]):
+            a, b = annihilateOp(0), annihilateOp(1)
+            lme = LindbladMasterEquation(Dagger(a)*b + Dagger(b)*a, [[kappa, a], [kappa, b]])
+            grid = PhaseSpaceGrid((-5, 5), 10, subs=[0, 1])
+            T = tt_wigner_operator(lme, grid, {kappa : 2})
+            L = WignerOperator(lme, grid).matrix({kappa : 2})
+        with execution_context(subsystems=[]):
+            a = annihilateOp(0)
+            driven = LindbladMasterEquation(Dagger(a)*a + F*(a + Dagger(a)), [[kappa, a]])
+            grid_1 = PhaseSpaceGrid((-6, 6), 24, subs=[0])
+            T_1 = tt_wigner_operator(driven, grid_1, {kappa : 2, F : 0.5})
+            W_1 = steady_state(WignerOperator(driven, grid_1), {kappa : 2, F : 0.5})
+
+        # The same discretization as the sparse operator, at low ranks.
+        assert np.allclose(T.full(), L.toarray(), atol=1e-12)
+        assert max(T.ranks) <= 6
+
+        x = grid.axes[0]
+        gaussian = lambda x0: np.exp(-(x - x0)**2)/np.sqrt(np.pi)
+        W0 = TensorTrain.from_factors([gaussian(1)] + [gaussian(0)]*3)
+        out = tt_evolve(T, W0, [0, 0.5, 1], dt=0.02)
+        expected = expm_multiply(L, W0.full().ravel(), start=0, stop=1, num=3)
+        for W, W_ in zip(out, expected):
+            assert np.allclose(W.full().ravel(), W_, atol=1e-6)
+
+        x = grid_1.axes[0]
+        W = tt_steady_state(T_1, TensorTrain.from_factors([np.exp(-x**2)]*2), dt=0.1)
+        assert np.linalg.norm(W.full() - W_1) < 1e-3*np.linalg.norm(W_1)
+
+@pytest.mark.order(11)
+class TestProgress():
+    
+    a = annihilateOp()
+    H = Dagger(a)*a + Dagger(a)**2*a**2
+    
+    def test_callback(self):
+        events = []
+        with execution_context(enable=False), progress(events.append):
+            LindbladMasterEquation(self.H, [[1, self.a], [1, self.a**2]]).wigner_transform
+        stages = [event.stage for event in events]
+        for stage in ["wigner_transform", "dissipators", "collect"]:
+            assert stage in stages
+        for event in events:
+            assert 0 <= event.done <= event.total
+        last = [event for event in events if event.stage == "dissipators"][-1]
+        assert last.done == last.total == 2 and last.eta == 0
+        assert last.worker == os.getpid() and last.worker_rate > 0
+        
+        # Only the outermost stage reports.
+        events = []
+        with execution_context(enable=False), progress(events.append):
+            Star(q()**3, p()**3)
+        assert {event.stage for event in events} == {"star"}
+        
+    def test_pool_and_abort(self):
+        A = sp.Add(*[qOp(i)**2*pOp(i) for i in range(4)]) + qOp(0)*pOp(1)
+        events = []
+        with execution_context(enable=True, num_cpus=2, min_num_args=2), progress(events.append):
+            out = WignerTransform(A)
+        assert out == WignerTransform(A)
+        assert events[-1].done == events[-1].total == 2
+        assert all(event.worker != os.getpid() for event in events)
+        
+        def abort(event):
+            raise RuntimeError("stop")
+        with pytest.raises(RuntimeError, match="stop"):
+            with execution_context(enable=True, num_cpus=2, min_num_args=2), progress(abort):
+                WignerTransform(A)
+    
+    def test_track_progress(self):
+        A = qOp(0)**3*pOp(0)**2 + qOp(1)*pOp(0)
+        with execution_context(enable=False):
+            events = track_progress(WignerTransform, A)
+            assert len(list(events)) > 0
+            assert events.result == WignerTransform(A)
+            
+            def slow():
+                for done in range(100):
+                    _report("slow", done, 100)
+                    time.sleep(0.01)
+                return True
+            with track_progress(slow) as events:
+                assert next(events) == ProgressEvent("slow", 0, 100)
+            assert events.result is None
+            
+            events = track_progress(Star, sp.exp(q()**3), sp.exp(p()))
+            with pytest.raises(ValueError):
+                list(events)
+
+@pytest.mark.order(12)
+class TestBackends():
+    
+    A = sp.Add(*[qOp(i)**2*pOp(i)*qOp(i) for i in range(3)]) + qOp(0)*pOp(1)**2
+    
+    def test_local_backends(self):
+        with execution_context(enable=False):
+            expected = WignerTransform(self.A)
+        for backend in ["serial", "thread", "futures", "pool", SerialBackend()]:
+            events = []
+            with execution_context(enable=True, num_cpus=2, min_num_args=2, 
+                                   backend=backend, caches={}), progress(events.append):
+                assert WignerTransform(self.A) == expected
+            assert events[-1].done == events[-1].total
+            if backend in ["futures", "pool"]:
+                assert events[-1].worker != os.getpid()
+        
+        with pytest.raises(ValueError):
+            with execution_context(enable=True, min_num_args=2, backend="cluster"):
+                WignerTransform(self.A)
+    
+    def test_manager_backend(self):
+        with execution_context(enable=False):
+            expected = WignerTransform(self.A)
+        
+        with ManagerBackend(("127.0.0.1", 0), b"moyalstar") as backend:
+            # Local processes standing in for remote nodes.
+            workers = [multiprocessing.Process(target=run_worker, 
+                                               args=(backend.address, b"moyalstar"))
+                       for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            try:
+                events = []
+                with execution_context(enable=True, min_num_args=2, backend=backend,
+                                       caches={}), progress(events.append):
+                    assert WignerTransform(self.A) == expected
+                assert {event.worker for event in events} <= {worker.pid for worker in workers}
+                
+                # Errors of the jobs are raised in the caller.
+                with execution_context(enable=True, min_num_args=2, backend=backend):
+                    with pytest.raises(ValueError):
+                        _mp_helper([1, 2], _backend_error)
+            finally:
+                backend.close()
+                for worker in workers:
+                    worker.join(timeout=10)
+                    if worker.is_alive():
+                        worker.terminate()
+            assert not(any(worker.exitcode for worker in workers))
+        
+    def test_manager_safety(self):
+        with pytest.raises(ValueError):
+            ManagerBackend()
+        with pytest.raises(ValueError):
+            run_worker(("127.0.0.1", 0), b"")
+        
+        # No workers, so that the map times out.
+        with ManagerBackend(authkey=b"moyalstar", timeout=0.5) as backend:
+            assert backend.address[0] == "127.0.0.1"
+            with execution_context(enable=True, min_num_args=2, backend=backend):
+                with pytest.raises(TimeoutError):
+                    _mp_helper([1, 2], _backend_error)
+        
+        # The late results of a dropped batch are not stored.
+        results = _Results()
+        results.new("batch")
+        results.drop("batch")
+        results.put("batch", (0, "result", b""))
+        assert not(results.is_active("batch"))
+
+def _backend_error(x):
+    raise ValueError(x)
+
+@pytest.mark.order(13)
+class TestSymEngine():
+    
+    objects = [q(0), p(0), q(1), p(1), alpha(0), alphaD(1), sp.Symbol("x")]
+    coeffs = [1, -2, sp.Rational(1, 3), sp.I, hbar, sp.sqrt(2)]
+    
+    def test_differential(self):
+        pytest.importorskip("symengine")
+        for _ in range(2):
+            A, B = [get_random_poly(self.objects, self.coeffs, max_pow=2, dice_throw=3)
+                    for _ in range(2)]
+            outputs = []
+            for symengine in [False, True]:
+                with execution_context(enable=False, symengine=symengine, caches={}):
+                    outputs.append([Star(A, B), Star(A, W(), B), 
+                                    Bopp(A, compiled=True), Bopp(B, left=True, compiled=True),
+                                    WignerTransform(qOp(0)*pOp(0)**2*qOp(1) + qOp(1)*pOp(1)**2)])
+            assert outputs[0] == outputs[1]
+    
+    def test_fallback(self):
+        pytest.importorskip("symengine")
+        from moyalstar.utils.accelerate import _expand
+        for A in [(q() + 0.5)**2, sp.exp(q() + p())*(q() + 1), (q() + p())**sp.Rational(1, 2)*q()]:
+            with execution_context(symengine=True):
+                assert _expand(A) == A.expand()
+    
+    def test_not_installed(self, monkeypatch):
+        import moyalstar.utils.accelerate as accelerate
+        monkeypatch.setattr(accelerate, "_se", None)
+        with execution_context(symengine=True):
+            with pytest.raises(ImportError):
+                Star(q(), p())
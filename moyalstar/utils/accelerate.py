@@ -0,0 +1,99 @@
+import sympy as sp
+
+from ..core import scalars
+from .multiprocessing import _get_config
+
+try:
+    import symengine as _se
+except ImportError:
+    _se = None
+
+__all__ = []
+
+"""
+Optional SymEngine path for the polynomial expansions of the hot loops,
+enabled with `MP_CONFIG["symengine"]` or `execution_context(symengine=True)`.
+
+The expression is first checked to be a polynomial, with integer exponents
+and exact coefficients, in "atoms": commutative symbols, their rational
+powers, and `W` and its derivatives. Every atom is replaced by a plain symbol,
+so that SymEngine never sees the custom classes of the package, the expansion
+is done in SymEngine, and the atoms are put back. SymPy's `expand` does not
+split any of these atoms either, so both paths give the same expression.
+Anything else falls back to SymPy.
+"""
+
+def _use_symengine() -> bool:
+    if not(_get_config("symengine")):
+        return False
+    if _se is None:
+        raise ImportError("'symengine' is enabled in the configuration but not installed.")
+    return True
+
+class _Unsupported(Exception):
+    pass
+
+def _is_W_atom(X : sp.Expr) -> bool:
+    return (isinstance(X, scalars.WignerFunction)
+            or (isinstance(X, sp.Derivative) and isinstance(X.expr, scalars.WignerFunction)))
+
+def _atoms(A : sp.Expr, atoms : dict):
+    """
+    Collect the atoms of the polynomial `A` into `atoms`, mapping each to a
+    placeholder symbol, or raise `_Unsupported`.
+    """
+    if isinstance(A, (sp.Integer, sp.Rational)) or (A is sp.I):
+        return
+    if isinstance(A, (sp.Add, sp.Mul)):
+        for A_ in A.args:
+            _atoms(A_, atoms)
+        return
+    if isinstance(A, sp.Pow):
+        base, exp = A.args
+        if isinstance(exp, sp.Integer):
+            _atoms(base, atoms)
+            return
+        if not(isinstance(exp, sp.Rational) and isinstance(base, sp.Symbol)):
+            raise _Unsupported
+    elif not(isinstance(A, sp.Symbol) or _is_W_atom(A)):
+        raise _Unsupported
+    if not(A.is_commutative):
+        raise _Unsupported
+    if A not in atoms:
+        atoms[A] = sp.Symbol("_x%d" % len(atoms))
+
+def _expand(A : sp.Expr) -> sp.Expr:
+    """
+    `A.expand()`, done by SymEngine if enabled and `A` is supported.
+    """
+    if not(_use_symengine()):
+        return A.expand()
+    atoms = {}
+    try:
+        _atoms(A, atoms)
+    except _Unsupported:
+        return A.expand()
+    out = _se.expand(_se.sympify(A.xreplace(atoms)))
+    return sp.sympify(out).xreplace({v : k for k, v in atoms.items()})
+
+def _bopp_subs_expand(A : sp.Expr, subs_dict : dict) -> sp.Expr:
+    """
+    `A.subs(subs_dict).expand()` for the Bopp shift, where the values of
+    `subs_dict` contain the non-commutative `_DerivativeSymbol`s. These act
+    on the other operand only, so they commute with everything in `A` and with
+    each other, and are stood in for by commutative symbols during the expansion.
+    """
+    if not(_use_symengine()):
+        return A.subs(subs_dict).expand()
+    derivatives = {X : sp.Symbol("_d%d" % i)
+                   for i, X in enumerate(set().union(*[v.atoms(scalars._DerivativeSymbol)
+                                                       for v in subs_dict.values()]))}
+    shifted = A.xreplace({k : v.xreplace(derivatives) for k, v in subs_dict.items()})
+    atoms = {}
+    try:
+        _atoms(shifted, atoms)
+    except _Unsupported:
+        return A.subs(subs_dict).expand()
+    out = _se.expand(_se.sympify(shifted.xreplace(atoms)))
+    out = sp.sympify(out).xreplace({v : k for k, v in atoms.items()})
+    return out.xreplace({v : k for k, v in derivatives.items()})
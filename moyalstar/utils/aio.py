@@ -0,0 +1,274 @@
+import os
+import signal
+import time
+import asyncio
+import threading
+import multiprocessing
+import dill
+import sympy as sp
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Callable
+
+from .multiprocessing import _get_config, execution_context
+from ..core.base import _get_sub_cache
+from . import progress as _progress
+
+__all__ = ["star_async",
+           "wigner_transform_async"]
+
+############################################################
+
+_executors = {}
+_executor_lock = threading.Lock()
+_reserved_cpus = 0
+
+_POLL_INTERVAL = 0.05 # seconds
+
+def _get_executor(num_cpus : int) -> ThreadPoolExecutor:
+    """
+    The executor shared by the awaitable transforms started with `num_cpus`
+    in their context. Each of its threads starts and supervises one worker
+    process, so its size bounds the number of these transforms running at the
+    same time, and the others wait for a thread before starting theirs.
+    """
+    with _executor_lock:
+        if num_cpus not in _executors:
+            _executors[num_cpus] = ThreadPoolExecutor(max_workers=num_cpus,
+                                                      thread_name_prefix="moyalstar-aio")
+        return _executors[num_cpus]
+
+def _reserve_cpus(num_cpus : int) -> int:
+    """
+    The number of CPUs given to the pool of a new worker process: those of
+    `num_cpus` not yet reserved by the running workers, and at least one. As
+    at most `num_cpus` workers run at once, the worker processes and their
+    pools thus stay below `2*num_cpus` processes, instead of `num_cpus` pools
+    of `num_cpus` processes each.
+    """
+    global _reserved_cpus
+    with _executor_lock:
+        out = max(num_cpus - _reserved_cpus, 1)
+        _reserved_cpus += out
+        return out
+
+def _release_cpus(num_cpus : int):
+    global _reserved_cpus
+    with _executor_lock:
+        _reserved_cpus -= num_cpus
+
+def _mp_context():
+    """
+    The worker processes are started with 'forkserver' (or 'spawn'), since the
+    caller runs an event loop and the supervising threads, which 'fork' would
+    copy in an inconsistent state.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def _child_settings(num_cpus : int) -> dict:
+    """
+    The settings of the calling context, resolved against `MP_CONFIG`, since
+    the worker process starts with the defaults of a fresh interpreter.
+    """
+    settings = {key : _get_config(key) for key in ["enable", "min_num_args", "symengine", "checkpoint"]}
+    settings["num_cpus"] = num_cpus
+    if isinstance(_get_config("backend"), str):
+        settings["backend"] = _get_config("backend")
+    settings["subsystems"] = list(_get_sub_cache())
+    return settings
+
+############################################################
+
+class _Cancelled(Exception):
+    pass
+
+def _child_main(conn, payload : bytes):
+    """
+    Entry point of the worker process, which runs `foo(*args)` in the settings
+    of the caller. The worker leads its own process group, so that the pool it
+    may start in `_mp_helper` can be killed along with it.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    def reporter(event : _progress.ProgressEvent):
+        conn.send(("progress", tuple(event)))
+    _progress._reporter.set(reporter)
+
+    try:
+        foo, args, settings = dill.loads(payload)
+        with execution_context(**settings):
+            out = ("result", dill.dumps(foo(*args)))
+    except BaseException as e:
+        try:
+            out = ("error", dill.dumps(e))
+        except Exception:
+            out = ("error", dill.dumps(RuntimeError(repr(e))))
+    conn.send(out)
+    conn.close()
+
+def _kill(proc : multiprocessing.Process):
+    if proc.is_alive():
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            proc.kill()
+    proc.join()
+
+def _supervise(proc : multiprocessing.Process,
+               conn,
+               cancelled : threading.Event,
+               deadline : None | float,
+               emit : Callable[[_progress.ProgressEvent], None]):
+    """
+    Wait for the result of the worker process while forwarding its progress
+    events. The worker (and its pool) is killed on cancellation or once the
+    deadline has passed.
+    """
+    try:
+        while True:
+            if cancelled.is_set():
+                raise _Cancelled()
+            if (deadline is not None) and (time.monotonic() > deadline):
+                raise asyncio.TimeoutError()
+
+            if conn.poll(_POLL_INTERVAL):
+                try:
+                    kind, data = conn.recv()
+                except EOFError:
+                    kind, data = None, None
+                if kind == "progress":
+                    emit(_progress.ProgressEvent(*data))
+                elif kind == "result":
+                    return dill.loads(data)
+                elif kind == "error":
+                    raise dill.loads(data)
+                else:
+                    proc.join()
+                    raise RuntimeError("The worker process exited unexpectedly "
+                                       f"with exit code {proc.exitcode}.")
+    finally:
+        _kill(proc)
+        conn.close()
+
+def _start_and_supervise(foo : Callable,
+                         args : tuple,
+                         num_cpus : int,
+                         settings : dict,
+                         cancelled : threading.Event,
+                         deadline : None | float,
+                         emit : Callable[[_progress.ProgressEvent], None]):
+    """
+    The job of an executor thread: start the worker process, once the thread
+    is free, with the CPUs left by the running workers, and `_supervise` it.
+    """
+    if cancelled.is_set():
+        raise _Cancelled()
+    if (deadline is not None) and (time.monotonic() > deadline):
+        raise asyncio.TimeoutError()
+
+    child_cpus = _reserve_cpus(num_cpus)
+    try:
+        ctx = _mp_context()
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_child_main,
+                           args=(child_conn, dill.dumps((foo, args, {**settings, "num_cpus" : child_cpus}))))
+        proc.start()
+        child_conn.close()
+        return _supervise(proc, parent_conn, cancelled, deadline, emit)
+    finally:
+        _release_cpus(child_cpus)
+
+async def _run_in_process(foo : Callable,
+                          args : tuple,
+                          timeout : None | float = None,
+                          on_progress : None | Callable[[_progress.ProgressEvent], None] = None):
+    """
+    Run `foo(*args)` in a separate worker process supervised by the shared
+    executor, without blocking the event loop. `num_cpus` of the calling
+    context bounds both the worker processes running at once, the others
+    waiting for a free thread of the executor, and, see `_reserve_cpus`, the
+    pools of the workers. The deadline and cancellation also apply while
+    waiting.
+    """
+    loop = asyncio.get_running_loop()
+
+    def emit(event : _progress.ProgressEvent):
+        if on_progress is not None:
+            loop.call_soon_threadsafe(on_progress, event)
+
+    deadline = None if (timeout is None) else (time.monotonic() + timeout)
+    cancelled = threading.Event()
+
+    num_cpus = _get_config("num_cpus")
+    job = _get_executor(num_cpus).submit(_start_and_supervise, foo, args, num_cpus,
+                                         _child_settings(num_cpus), cancelled, deadline, emit)
+    fut = asyncio.wrap_future(job)
+    try:
+        done, _ = await asyncio.wait({fut}, timeout=None if (deadline is None)
+                                     else max(deadline - time.monotonic(), 0))
+        if not(done) and job.cancel():
+            # Still waiting for a thread; a running job meets the deadline itself.
+            raise asyncio.TimeoutError()
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        # Make sure the worker processes are gone before propagating.
+        cancelled.set()
+        if not(job.cancel()):
+            try:
+                await fut
+            except _Cancelled:
+                pass
+        raise
+
+############################################################
+
+def _star_with_progress(*args):
+    from ..core.star_product import Star
+    out = Star()
+    for done, arg in enumerate(args, start=1):
+        out = Star(out, arg)
+        _progress._report("star", done, len(args))
+    return out
+
+def _wigner_transform(A):
+    from ..core.wigner_transform import WignerTransform
+    return WignerTransform(A)
+
+async def star_async(*args,
+                     timeout : None | float = None,
+                     on_progress : None | Callable[[_progress.ProgressEvent], None] = None):
+    """
+    Awaitable `Star`, evaluated in a worker process.
+
+    Parameters
+    ----------
+
+    *args
+        The factors of the star-product. See `Star`.
+
+    timeout : float, optional
+        Number of seconds after which the evaluation is aborted, raising
+        `asyncio.TimeoutError`. Cancelling the awaiting task also aborts it.
+        In both cases the worker process and its pool are killed.
+
+    on_progress : callable, optional
+        Called in the event loop with a `ProgressEvent` whenever a factor
+        (or a summand of the current factor) has been processed.
+    """
+    args = tuple(sp.sympify(arg) for arg in args)
+    return await _run_in_process(_star_with_progress, args,
+                                 timeout=timeout, on_progress=on_progress)
+
+async def wigner_transform_async(A : sp.Expr,
+                                 timeout : None | float = None,
+                                 on_progress : None | Callable[[_progress.ProgressEvent], None] = None):
+    """
+    Awaitable `WignerTransform`, evaluated in a worker process. The summands
+    of `A` are reported through `on_progress` as they complete.
+
+    See `star_async` for the parameters.
+    """
+    return await _run_in_process(_wigner_transform, (sp.sympify(A),),
+                                 timeout=timeout, on_progress=on_progress)
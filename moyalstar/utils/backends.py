@@ -0,0 +1,286 @@
+import queue
+import uuid
+import dill
+from multiprocessing import Pool
+from multiprocessing.managers import BaseManager
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator
+
+__all__ = ["Backend", "SerialBackend", "ThreadBackend", "FuturesBackend",
+           "PoolBackend", "ManagerBackend", "run_worker"]
+
+"""
+The backends run the jobs of `_mp_helper`. A job is the `dill` pickle of one
+argument, and `foo` is the picklable helper that unpickles it, runs it in the
+settings of the calling context, and returns `(worker, seconds, output bytes)`.
+Backends yield `(index, result)` as the jobs complete, so that their results
+are saved without waiting for slower jobs submitted earlier.
+"""
+
+class Backend():
+    """
+    Interface of the execution backends of the parallel maps. Select one with
+    `MP_CONFIG["backend"]` or `execution_context(backend=...)`, either by name
+    (`'serial'`, `'thread'`, `'futures'`, or `'pool'`), or as an instance, e.g. a
+    started `ManagerBackend`.
+
+    Subclasses implement `imap`, and preferably `imap_unordered`, and may
+    hold resources released by `close`.
+    """
+
+    def imap(self, foo : Callable, jobs : list[bytes]) -> Iterator:
+        """
+        Yield `foo(job)` for each job, in order. If the iteration is stopped
+        early, e.g. because a progress callback raised, the pending jobs may be
+        dropped.
+        """
+        raise NotImplementedError
+
+    def imap_unordered(self, foo : Callable, jobs : list[bytes]) -> Iterator[tuple[int, object]]:
+        """
+        Yield `(index, foo(jobs[index]))` for each job, as the jobs complete.
+        By default, in order, from `imap`.
+        """
+        return enumerate(self.imap(foo, jobs))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class SerialBackend(Backend):
+    """
+    Runs the jobs one after the other in the calling thread.
+    """
+    def imap(self, foo, jobs):
+        return map(foo, jobs)
+
+class ThreadBackend(Backend):
+    """
+    Runs the jobs in a pool of threads. SymPy holds the GIL for most of its
+    work, so this mainly helps when the jobs wait on I/O or on other processes.
+    """
+    def __init__(self, num_cpus : None | int = None):
+        self.num_cpus = num_cpus
+
+    def imap(self, foo, jobs):
+        with ThreadPoolExecutor(self.num_cpus) as executor:
+            yield from executor.map(foo, jobs)
+
+    def imap_unordered(self, foo, jobs):
+        with ThreadPoolExecutor(self.num_cpus) as executor:
+            yield from _as_completed(executor, foo, jobs)
+
+class FuturesBackend(Backend):
+    """
+    Runs the jobs in a `concurrent.futures.ProcessPoolExecutor`.
+    """
+    def __init__(self, num_cpus : None | int = None):
+        self.num_cpus = num_cpus
+
+    def imap(self, foo, jobs):
+        executor = ProcessPoolExecutor(self.num_cpus)
+        try:
+            yield from executor.map(foo, jobs)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def imap_unordered(self, foo, jobs):
+        executor = ProcessPoolExecutor(self.num_cpus)
+        try:
+            yield from _as_completed(executor, foo, jobs)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+class PoolBackend(Backend):
+    """
+    Runs the jobs in a `multiprocessing.Pool`, the given one or, by default,
+    a new one for each map, which is terminated when the map ends.
+    """
+    def __init__(self, num_cpus : None | int = None, pool = None):
+        self.num_cpus = num_cpus
+        self.pool = pool
+
+    def imap(self, foo, jobs):
+        if self.pool is not None:
+            yield from self.pool.imap(foo, jobs)
+        else:
+            with Pool(self.num_cpus) as pool:
+                yield from pool.imap(foo, jobs)
+
+    def imap_unordered(self, foo, jobs):
+        indexed = partial(_indexed, foo)
+        if self.pool is not None:
+            yield from self.pool.imap_unordered(indexed, enumerate(jobs))
+        else:
+            with Pool(self.num_cpus) as pool:
+                yield from pool.imap_unordered(indexed, enumerate(jobs))
+
+def _indexed(foo : Callable, item : tuple[int, bytes]) -> tuple[int, object]:
+    return item[0], foo(item[1])
+
+def _as_completed(executor, foo : Callable, jobs : list[bytes]) -> Iterator[tuple[int, object]]:
+    futures = {executor.submit(foo, job) : idx for idx, job in enumerate(jobs)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+############################################################
+
+class _Results():
+    """
+    The queues of results of the maps in progress, on the server.
+    """
+    def __init__(self):
+        self._queues = {}
+
+    def new(self, batch : str):
+        return self._queues.setdefault(batch, queue.Queue())
+
+    def is_active(self, batch : str) -> bool:
+        return batch in self._queues
+
+    def put(self, batch : str, result : tuple):
+        # The results of dropped batches, e.g. of an aborted map, are discarded.
+        results = self._queues.get(batch)
+        if results is not None:
+            results.put(result)
+
+    def drop(self, batch : str):
+        self._queues.pop(batch, None)
+
+_JOBS = queue.Queue()
+_RESULTS = _Results()
+
+def _get_jobs():
+    return _JOBS
+
+def _get_results():
+    return _RESULTS
+
+class _Manager(BaseManager):
+    pass
+
+_Manager.register("get_jobs", callable=_get_jobs)
+_Manager.register("get_results", callable=_get_results, method_to_typeid={"new" : "_Queue"})
+_Manager.register("_Queue", create_method=False)
+
+def _check_authkey(authkey : bytes):
+    if not(isinstance(authkey, bytes)) or not(authkey):
+        raise ValueError("'authkey' must be a non-empty bytes string, as the "
+                         "jobs are code executed by the workers.")
+
+class ManagerBackend(Backend):
+    """
+    Distributes the jobs to worker processes, possibly on other machines, that
+    connect to a `multiprocessing.managers` server holding a queue of jobs and
+    one queue of results per map. Start the workers with `run_worker`, e.g.
+    `python -c "from moyalstar.utils.backends import run_worker; run_worker(('host', 50000), b'key')"`
+    on each node. The workers need the same version of the package.
+
+    The jobs are pickles that the workers execute, so anyone holding `authkey`
+    can run code on the workers, and the workers trust the server. Use a secret
+    key, and bind to a public interface only on a trusted network.
+
+    Parameters
+    ----------
+
+    address : tuple, default: ('127.0.0.1', 0)
+        The address the server listens on, by default only reachable from this
+        machine. Port 0 picks a free port; the actual address is `address` once
+        started.
+
+    authkey : bytes
+        The non-empty key the workers authenticate with.
+
+    timeout : None or float, default: 600
+        Seconds to wait for the next result before raising `TimeoutError`,
+        e.g. because the workers died. `None` waits indefinitely.
+
+    Examples
+    --------
+
+    >>> with ManagerBackend(("0.0.0.0", 50000), b"secret") as backend:
+    ...     with execution_context(backend=backend):
+    ...         out = WignerTransform(A)
+    """
+
+    def __init__(self, address : tuple = ("127.0.0.1", 0), authkey : bytes = b"",
+                 timeout : None | float = 600):
+        _check_authkey(authkey)
+        self._manager = _Manager(address=address, authkey=authkey)
+        self._manager.start()
+        self.address = self._manager.address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._jobs = self._manager.get_jobs()
+        self._results = self._manager.get_results()
+
+    def imap(self, foo, jobs):
+        pending = {}
+        results = self.imap_unordered(foo, jobs)
+        for idx in range(len(jobs)):
+            while idx not in pending:
+                idx_, data = next(results)
+                pending[idx_] = data
+            yield pending.pop(idx)
+
+    def imap_unordered(self, foo, jobs):
+        batch = uuid.uuid4().hex
+        results = self._results.new(batch)
+        try:
+            foo_bytes = dill.dumps(foo)
+            for idx, job in enumerate(jobs):
+                self._jobs.put((batch, idx, foo_bytes, job))
+
+            for _ in range(len(jobs)):
+                try:
+                    idx, kind, data = results.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No result from the workers within {self.timeout} seconds.") from None
+                if kind == "error":
+                    raise dill.loads(data)
+                yield idx, data
+        finally:
+            self._results.drop(batch)
+
+    def close(self):
+        """
+        Shut the server down, which also stops the connected workers.
+        """
+        self._manager.shutdown()
+
+def run_worker(address : tuple, authkey : bytes, max_jobs : None | int = None):
+    """
+    Serve the jobs of a `ManagerBackend` at `address` until its server shuts
+    down, or until `max_jobs` jobs have been done. The jobs of maps that have
+    been aborted are skipped.
+    """
+    _check_authkey(authkey)
+    manager = _Manager(address=tuple(address), authkey=authkey)
+    manager.connect()
+    jobs, results = manager.get_jobs(), manager.get_results()
+    done = 0
+    while (max_jobs is None) or (done < max_jobs):
+        try:
+            batch, idx, foo_bytes, job = jobs.get()
+            if not(results.is_active(batch)):
+                continue
+        except (EOFError, ConnectionError, BrokenPipeError):
+            return
+        try:
+            out = ("result", dill.loads(foo_bytes)(job))
+        except BaseException as e:
+            try:
+                out = ("error", dill.dumps(e))
+            except Exception:
+                out = ("error", dill.dumps(RuntimeError(repr(e))))
+        try:
+            results.put(batch, (idx, *out))
+        except (EOFError, ConnectionError, BrokenPipeError):
+            return
+        done += 1
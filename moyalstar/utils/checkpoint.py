@@ -0,0 +1,107 @@
+import os
+import time
+import hashlib
+import tempfile
+import warnings
+import sympy as sp
+import dill
+from functools import partial
+
+from ..core.base import _get_sub_cache
+
+############################################################
+
+__all__ = []
+
+_MAGIC = b"MOYALSTAR-CHECKPOINT-1\n"
+_QUARANTINE = "quarantine"
+
+############################################################
+
+def _foo_name(foo : callable) -> None | str:
+    """
+    A name identifying `foo` across runs, or `None` if there is none, as for
+    lambdas and nested functions, whose results are then not checkpointed.
+    """
+    if isinstance(foo, partial):
+        name = _foo_name(foo.func)
+        if name is None:
+            return None
+        return "%s(%s, %s)" % (name, sp.srepr(foo.args),
+                               sp.srepr(sorted(foo.keywords.items())))
+    module, qualname = getattr(foo, "__module__", None), getattr(foo, "__qualname__", None)
+    if (module is None) or (qualname is None) or ("<" in qualname):
+        return None
+    return "%s.%s" % (module, qualname)
+
+def _job_key(foo_name : str, X : object, stage : str) -> str:
+    """
+    The SHA-256 of the job, from `foo`, the stage, the registered subsystems
+    (the variables of `W`), and the structure of the argument.
+    """
+    subs = sorted(str(sub) for sub in _get_sub_cache())
+    text = "\n".join([foo_name, stage, repr(subs), sp.srepr(X)])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _path(directory : str, key : str) -> str:
+    return os.path.join(directory, key[:2], key + ".ckpt")
+
+def _save(directory : str, key : str, out_bytes : bytes):
+    """
+    Write the dill-pickled result of the job `key` atomically: to a temporary
+    file in the same directory, flushed to disk, then renamed over the target.
+    The file holds a magic line, the key, the SHA-256 of the payload, and the
+    payload.
+    """
+    path = _path(directory, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = _MAGIC + key.encode() + b"\n" + hashlib.sha256(out_bytes).digest() + out_bytes
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _quarantine(directory : str, path : str, reason : str):
+    """
+    Move a corrupted checkpoint out of the way, so that it is neither merged
+    nor silently overwritten, and warn.
+    """
+    target_dir = os.path.join(directory, _QUARANTINE)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, "%s.%d" % (os.path.basename(path), time.time_ns()))
+    os.replace(path, target)
+    warnings.warn(f"Discarded the corrupted checkpoint {path} ({reason}), moved to {target}. "
+                  "Its job is recomputed.")
+
+def _load(directory : str, key : str) -> tuple[bool, object]:
+    """
+    `(True, result)` if the job `key` has a valid checkpoint, else `(False, None)`.
+    A checkpoint failing the integrity checks is quarantined.
+    """
+    path = _path(directory, key)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return False, None
+
+    header = _MAGIC + key.encode() + b"\n"
+    if not(data.startswith(header)):
+        _quarantine(directory, path, "bad header")
+        return False, None
+    digest, payload = data[len(header):len(header)+32], data[len(header)+32:]
+    if hashlib.sha256(payload).digest() != digest:
+        _quarantine(directory, path, "checksum mismatch")
+        return False, None
+    try:
+        return True, dill.loads(payload)
+    except Exception as e:
+        _quarantine(directory, path, f"unpickling failed: {e!r}")
+        return False, None
@@ -0,0 +1,412 @@
+import time
+import random
+import tracemalloc
+import sympy as sp
+import sympy.physics.quantum as spq
+from collections import Counter
+from functools import lru_cache
+from itertools import product
+
+from typing import NamedTuple, TypedDict
+
+from ..core import scalars
+from .multiprocessing import execution_context
+
+__all__ = ["ESTIMATOR_CONFIG",
+           "CostEstimate",
+           "estimate_star",
+           "estimate_wigner_transform",
+           "calibrate_estimator"]
+
+############################################################
+
+class _estimator_dict(TypedDict):
+    seconds_per_term: float
+    seconds_per_star: float
+    bytes_per_term: float
+
+ESTIMATOR_CONFIG = _estimator_dict()
+ESTIMATOR_CONFIG["seconds_per_term"] = 1.0e-2
+ESTIMATOR_CONFIG["seconds_per_star"] = 2.0e-2
+ESTIMATOR_CONFIG["bytes_per_term"] = 5.0e3
+# Measured with `calibrate_estimator` on a single core. The CPU time is
+# the total over all processes, i.e., the wall time when multiprocessing
+# is disabled.
+
+class CostEstimate(NamedTuple):
+    """
+    Predicted cost of a ★-product or a Wigner transform.
+
+    Attributes
+    ----------
+
+    output_terms : int
+        Number of terms of the expanded output, not counting cancellations.
+
+    intermediate_terms : int
+        Total number of terms of the expanded Bopp-shifted products that
+        are passed to `_replace_diff`, over all ★-products evaluated.
+
+    peak_intermediate_terms : int
+        Largest number of such terms in a single ★-product.
+
+    star_calls : int
+        Number of nontrivial ★-products evaluated.
+
+    max_derivative_order : int
+        Highest total order of the derivatives produced by `Bopp`.
+
+    memory_bytes : float
+        Predicted peak memory.
+
+    cpu_seconds : float
+        Predicted total CPU time.
+    """
+    output_terms : int
+    intermediate_terms : int
+    peak_intermediate_terms : int
+    star_calls : int
+    max_derivative_order : int
+    memory_bytes : float
+    cpu_seconds : float
+
+############################################################
+
+"""
+The support of a phase-space expression is a frozenset of monomials. A monomial
+is `(has_W, ((sub, a, b, m, n), ...))`, standing for the product over the
+subsystems `sub` of `q**a * p**b`, times `Derivative(W, (q, m), (p, n))` if
+`has_W`. The subsystems are sorted and the all-zero entries are dropped, so
+that equal monomials compare equal.
+"""
+
+_ONE = (False, ())
+
+def _make_monomial(has_W : bool, exponents : dict) -> tuple:
+    return (has_W, tuple((sub, *exp)
+                         for sub, exp in sorted(exponents.items(), key=lambda x: str(x[0]))
+                         if any(exp)))
+
+def _monomial_product(X : tuple, Y : tuple) -> tuple:
+    if X[0] and Y[0]:
+        raise ValueError("The estimator supports expressions that are at most linear in 'W'.")
+    exponents = {}
+    for sub, *exp in X[1] + Y[1]:
+        old = exponents.get(sub, [0, 0, 0, 0])
+        exponents[sub] = [u+v for u, v in zip(old, exp)]
+    return _make_monomial(X[0] or Y[0], exponents)
+
+def _support_product(S : frozenset, T : frozenset) -> frozenset:
+    return frozenset(_monomial_product(X, Y) for X in S for Y in T)
+
+def _support(A : sp.Expr) -> frozenset:
+    """
+    Support of the phase-space expression `A`, found without expanding it.
+    Cancellations are not accounted for, so this is a superset of the actual
+    support.
+    """
+    if not(A.has(scalars.q, scalars.p)) and A.is_commutative:
+        return frozenset([_ONE])
+
+    if isinstance(A, (scalars.q, scalars.p)):
+        exp = [1, 0, 0, 0] if isinstance(A, scalars.q) else [0, 1, 0, 0]
+        return frozenset([_make_monomial(False, {A.sub : exp})])
+
+    if isinstance(A, scalars.WignerFunction):
+        return frozenset([(True, ())])
+
+    if isinstance(A, sp.Derivative) and isinstance(A.expr, scalars.WignerFunction):
+        exponents = {}
+        for var, order in A.variable_count:
+            exp = exponents.setdefault(var.sub, [0, 0, 0, 0])
+            exp[2 if isinstance(var, scalars.q) else 3] += int(order)
+        return frozenset([_make_monomial(True, exponents)])
+
+    if isinstance(A, sp.Add):
+        return frozenset().union(*[_support(A_) for A_ in A.args])
+
+    if isinstance(A, sp.Mul):
+        out = frozenset([_ONE])
+        for A_ in A.args:
+            out = _support_product(out, _support(A_))
+        return out
+
+    if isinstance(A, sp.Pow):
+        exp = A.args[1]
+        if isinstance(exp, sp.Integer) and exp >= 0:
+            base = _support(A.args[0])
+            out = frozenset([_ONE])
+            for _ in range(int(exp)):
+                out = _support_product(out, base)
+            return out
+
+    msg = "The estimator only supports polynomials in 'q' and 'p', "
+    msg += "optionally linear in 'W' and its derivatives, but got:\n"
+    msg += r"%s" % sp.latex(A)
+    raise ValueError(msg)
+
+############################################################
+
+@lru_cache(maxsize=4096)
+def _star_support(S : frozenset, T : frozenset) \
+    -> tuple[frozenset, int, int]:
+    """
+    Support of the ★-product of expressions with supports `S` and `T`, the number
+    of terms of the expanded Bopp-shifted product in `_star_base`, and the highest
+    derivative order produced by `Bopp`. This follows `_star_base`, which Bopp
+    shifts the `W`-free operand.
+    """
+    if S == frozenset([_ONE]) or T == frozenset([_ONE]):
+        return _support_product(S, T), 0, 0
+
+    if any(X[0] for X in S):
+        if any(Y[0] for Y in T):
+            raise ValueError("Both inputs cannot be properly Bopp shifted.")
+        bopp_side, other_side = T, S
+    else:
+        bopp_side, other_side = S, T
+
+    intermediate = 0
+    max_order = 0
+    out = set()
+    for P in bopp_side:
+        P_exp = {sub : exp[:2] for sub, *exp in P[1]}
+        n_shifted = 1
+        for a, b in P_exp.values():
+            n_shifted *= (a+1)*(b+1)
+        intermediate += n_shifted * len(other_side)
+        max_order = max(max_order, sum(a+b for a, b in P_exp.values()))
+
+        for F in other_side:
+            F_exp = {sub : list(exp) for sub, *exp in F[1]}
+            subs = sorted(set(P_exp) | set(F_exp), key=str)
+            options = []
+            for sub in subs:
+                a, b = P_exp.get(sub, (0, 0))
+                c, d, m, n = F_exp.get(sub, (0, 0, 0, 0))
+                sub_options = []
+                # `Bopp` gives `q**(a-i) * ∂p**i * p**(b-j) * ∂q**j`, of which `l1`
+                # derivatives in q act on `q**c`, and `l2` in p act on `p**d`. The rest
+                # act on `W`, if it is present.
+                for i in range(a+1):
+                    for j in range(b+1):
+                        for l1 in range(min(j, c)+1):
+                            for l2 in range(min(i, d)+1):
+                                if not(F[0]) and (l1 < j or l2 < i):
+                                    continue
+                                sub_options.append((sub,
+                                                    a-i+c-l1, b-j+d-l2,
+                                                    m+j-l1, n+i-l2))
+                options.append(sub_options)
+            for combination in product(*options):
+                out.add(_make_monomial(F[0], {sub : exp for sub, *exp in combination}))
+
+    return frozenset(out), intermediate, max_order
+
+class _Tally():
+    """
+    Accumulates the costs over the ★-products of a computation.
+    """
+    def __init__(self):
+        self.intermediate = 0
+        self.peak_intermediate = 0
+        self.star_calls = 0
+        self.max_order = 0
+
+    def star(self, S : frozenset, T : frozenset, multiplicity : int = 1) -> frozenset:
+        out, intermediate, max_order = _star_support(S, T)
+        if intermediate:
+            self.intermediate += multiplicity * intermediate
+            self.peak_intermediate = max(self.peak_intermediate, intermediate)
+            self.star_calls += multiplicity
+            self.max_order = max(self.max_order, max_order)
+        return out
+
+    def estimate(self, output_terms : int) -> CostEstimate:
+        return CostEstimate(
+            output_terms = output_terms,
+            intermediate_terms = self.intermediate,
+            peak_intermediate_terms = self.peak_intermediate,
+            star_calls = self.star_calls,
+            max_derivative_order = self.max_order,
+            memory_bytes = ESTIMATOR_CONFIG["bytes_per_term"]
+                           * (self.peak_intermediate + output_terms),
+            cpu_seconds = ESTIMATOR_CONFIG["seconds_per_star"] * self.star_calls
+                          + ESTIMATOR_CONFIG["seconds_per_term"] * self.intermediate
+        )
+
+############################################################
+
+def estimate_star(*args) -> CostEstimate:
+    """
+    Predict the cost of `Star(*args)` from the degrees of the operands in `q`
+    and `p`, without evaluating it.
+
+    Parameters
+    ----------
+
+    *args
+        The factors of the ★-product, polynomials in `q` and `p`, of which one
+        may be linear in `W` and its derivatives.
+
+    Returns
+    -------
+
+    out : CostEstimate
+    """
+    tally = _Tally()
+    out = frozenset([_ONE])
+    for arg in args:
+        out = tally.star(out, _support(sp.sympify(arg)))
+    return tally.estimate(len(out))
+
+def estimate_wigner_transform(A : sp.Expr) -> CostEstimate:
+    """
+    Predict the cost of `WignerTransform(A)`, without expanding `A` or evaluating
+    any ★-product.
+
+    `WignerTransform` expands `A` into operator words, then evaluates a chain of
+    ★-products for each word. Here the words are followed left to right, and the
+    words that lead to the same support are counted together, so the estimate
+    is much cheaper than the expansion of `A`.
+
+    Parameters
+    ----------
+
+    A : sympy.Expr
+        Polynomial in `Operator`s, which may contain unevaluated
+        `Commutator`s and `AntiCommutator`s.
+
+    Returns
+    -------
+
+    out : CostEstimate
+    """
+    from ..core.hilbert_operators import Operator
+
+    tally = _Tally()
+
+    def chain(states : Counter, A : sp.Expr) -> Counter:
+        """
+        Append `A` to each word, where `states` maps the supports of the
+        partial ★-products to the number of words that lead to them.
+        """
+        if isinstance(A, sp.Add):
+            out = Counter()
+            for A_ in A.args:
+                out.update(chain(states, A_))
+            return out
+
+        if isinstance(A, sp.Mul):
+            for A_ in A.args:
+                states = chain(states, A_)
+            return states
+
+        if isinstance(A, (spq.Commutator, spq.AntiCommutator)):
+            # Computed as a Moyal bracket, i.e. the ★-products in both orders.
+            X, Y = A.args
+            out = chain(states, X*Y)
+            out.update(chain(states, Y*X))
+            return out
+
+        if (isinstance(A, sp.Pow) and A.args[0].has(Operator)
+                and not(isinstance(A.args[0], Operator))):
+            for _ in range(int(A.args[1])):
+                states = chain(states, A.args[0])
+            return states
+
+        if isinstance(A, Operator):
+            S = _support(A.wigner_transform())
+        elif isinstance(A, sp.Pow) and isinstance(A.args[0], Operator):
+            # `WignerTransform` takes the power of the symbol directly.
+            S = _support(A.args[0].wigner_transform() ** A.args[1])
+        else:
+            S = _support(A)
+
+        out = Counter()
+        for state, multiplicity in states.items():
+            out[tally.star(state, S, multiplicity)] += multiplicity
+        return out
+
+    states = chain(Counter({frozenset([_ONE]) : 1}), sp.sympify(A))
+    output = frozenset().union(*states)
+    return tally.estimate(len(output))
+
+############################################################
+
+def calibrate_estimator(num_samples : int = 12,
+                        max_pow : int = 3,
+                        seed : None | int = None) -> dict:
+    """
+    Fit `ESTIMATOR_CONFIG` to measured runs of `Star` on random polynomials,
+    with multiprocessing disabled, and update it in place.
+
+    The CPU time is fitted to `seconds_per_star * star_calls + seconds_per_term
+    * intermediate_terms` by least squares, and the memory to `bytes_per_term *
+    (peak_intermediate_terms + output_terms)` by the median ratio.
+
+    Parameters
+    ----------
+
+    num_samples : int, default: 12
+        Number of random ★-products to measure.
+
+    max_pow : int, default: 3
+        Highest power of each variable in the random polynomials.
+
+    seed : int, optional
+        Seed of the random polynomials.
+
+    Returns
+    -------
+
+    out : dict
+        The fitted values, which have been written into `ESTIMATOR_CONFIG`.
+    """
+    from ..core.star_product import Star
+
+    rng = random.Random(seed)
+    variables = [scalars.q(), scalars.p()]
+    def random_poly():
+        return sp.Add(*[sp.Mul(*[rng.choice(variables)**rng.randint(0, max_pow)
+                                 for _ in range(rng.randint(1, 3))])
+                        for _ in range(rng.randint(1, 4))])
+
+    samples = []
+    with execution_context(enable=False):
+        while len(samples) < num_samples:
+            A, B = random_poly(), random_poly()
+            est = estimate_star(A, B)
+            if not(est.star_calls):
+                continue
+            tracemalloc.start()
+            start = time.process_time()
+            Star(A, B)
+            seconds = time.process_time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            samples.append((est, seconds, peak))
+
+    # Normal equations of the two-parameter least squares fit.
+    xx = sum(est.star_calls**2 for est, _, _ in samples)
+    xy = sum(est.star_calls*est.intermediate_terms for est, _, _ in samples)
+    yy = sum(est.intermediate_terms**2 for est, _, _ in samples)
+    xt = sum(est.star_calls*t for est, t, _ in samples)
+    yt = sum(est.intermediate_terms*t for est, t, _ in samples)
+    det = xx*yy - xy**2
+    if det > 0:
+        seconds_per_star = max((xt*yy - yt*xy) / det, 0.0)
+        seconds_per_term = max((yt*xx - xt*xy) / det, 0.0)
+    else:
+        seconds_per_star = 0.0
+        seconds_per_term = yt / yy
+
+    ratios = sorted(peak / (est.peak_intermediate_terms + est.output_terms)
+                    for est, _, peak in samples)
+
+    out = {"seconds_per_term" : seconds_per_term,
+           "seconds_per_star" : seconds_per_star,
+           "bytes_per_term" : ratios[len(ratios)//2]}
+    for key, val in out.items():
+        ESTIMATOR_CONFIG[key] = val
+    return out
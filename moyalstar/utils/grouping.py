@@ -2,6 +2,7 @@ import sympy as sp
 from sympy.core.function import UndefinedFunction
 from ..core import scalars
 from .multiprocessing import _mp_helper
+from .progress import _report
 
 __all__ = ["collect_by_derivative"]
 
@@ -14,7 +15,7 @@ def derivative_not_in_num(A : sp.Expr):
     A = sp.sympify(A)
     
     if isinstance(A, sp.Add):
-        return sp.Add(*_mp_helper(A.args, derivative_not_in_num), evaluate=False)
+        return sp.Add(*_mp_helper(A.args, derivative_not_in_num, stage="collect"), evaluate=False)
     
     der_lst = list(A.find(sp.Derivative))
     if not(der_lst):
@@ -45,7 +46,8 @@ def collect_by_derivative(A : sp.Expr,
         function, then it is returned as is. 
 
     f : sympy.Function, default: `W`
-        Function whose derivatives are considered.
+        Function whose derivatives are considered. By default, any
+        `WignerFunction`.
 
     Returns
     -------
@@ -59,21 +61,27 @@ def collect_by_derivative(A : sp.Expr,
     if not(A.atoms(sp.Function)):
         return A
 
-    q = scalars.q()
-    p = scalars.p()
-    if f is None:
-        f = scalars.W()
+    def is_f_part(X):
+        if isinstance(X, sp.Derivative):
+            X = X.expr
+        if f is None:
+            return isinstance(X, scalars.WignerFunction)
+        return X == f
 
-    max_order = max([A_.derivative_count 
-                     for A_ in list(A.atoms(sp.Derivative))]+[0])
-
-    def dq_m_dp_n(m, n):
-        if m==0 and n==0:
-            return f
-        return sp.Derivative(f, 
-                             *[q for _ in range(m)], 
-                             *[p for _ in range(n)])
-    
-    return sp.collect(A, [dq_m_dp_n(m, n) 
-                          for m in range(max_order) 
-                          for n in range(max_order - m)])
\ No newline at end of file
+    # The terms are grouped by the derivatives present in `A`, instead of
+    # `sympy.collect` over candidate derivatives, which would need the 
+    # differentiation variables and does not support mixed derivatives.
+    _report("collect", 0, 1)
+    groups = {}
+    for A_ in sp.Add.make_args(A):
+        D = sp.Integer(1)
+        coeff = []
+        for X in sp.Mul.make_args(A_):
+            if (D == 1) and is_f_part(X):
+                D = X
+            else:
+                coeff.append(X)
+        groups.setdefault(D, []).append(sp.Mul(*coeff))
+    out = sp.Add(*[sp.Add(*coeff)*D for D, coeff in groups.items()])
+    _report("collect", 1, 1)
+    return out
\ No newline at end of file
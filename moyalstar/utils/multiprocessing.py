@@ -1,18 +1,32 @@
 import os
+import time
+import contextvars
 import sympy as sp
-from multiprocessing import Pool
 import dill
 from functools import partial
+from contextlib import contextmanager
 
-from typing import TypedDict
+from typing import TypedDict, Callable
+
+from . import progress as _progress
+from . import checkpoint as _checkpoint
+from .backends import (Backend, SerialBackend, ThreadBackend, FuturesBackend, PoolBackend)
+from ..core.base import _Set, _get_sub_cache, _isolated_sub_cache, _treat_sub
 
 ############################################################
 
-__all__ = ["MP_CONFIG"]
+__all__ = ["MP_CONFIG",
+           "execution_context"]
 
 ############################################################
-global _mp_is_running
-_mp_is_running = False
+
+_mp_is_running : contextvars.ContextVar[bool] \
+    = contextvars.ContextVar("_mp_is_running", default=False)
+"""
+Whether the current context is already inside a pool, in which case nested
+`_mp_helper` calls run serially. Being context-local, a pool started by one
+thread does not serialize the work of another.
+"""
 
 # NOTE: Same code as in pybolano.
 
@@ -20,9 +34,12 @@ class _mp_dict(TypedDict):
     enable: bool
     num_cpus: int
     min_num_args: int
+    backend: str | Backend
+    symengine: bool
+    checkpoint: None | str
 
     def __setitem__(self, key, value):
-        valid_keys = ["enable", "num_cpus", "min_num_args", "_in_use"]
+        valid_keys = ["enable", "num_cpus", "min_num_args", "backend", "symengine", "checkpoint", "_in_use"]
         if key not in valid_keys:
             msg = f"The key [{key}] is not valid. Valid keys: {valid_keys}."
             raise KeyError(msg)
@@ -44,29 +61,218 @@ MP_CONFIG["num_cpus"] = os.cpu_count()
 MP_CONFIG["min_num_args"] = 2
 # Skip multiprocessing if the number of elements is spall,
 # in which case a single core execution is enough.
+MP_CONFIG["backend"] = "pool"
+# The backend running the parallel maps: 'serial', 'thread', 'futures',
+# 'pool', or a `Backend` instance such as a started `ManagerBackend`.
+MP_CONFIG["symengine"] = False
+# Expand the polynomials of the Bopp shift and the ★-product with SymEngine,
+# which must then be installed.
+MP_CONFIG["checkpoint"] = None
+# A directory in which the result of every job of the parallel maps is saved
+# as it completes. A rerun with the same inputs loads them instead of
+# recomputing. Off by default.
+
+############################################################
+
+_CACHES = {}
+
+_context_config : contextvars.ContextVar[dict] \
+    = contextvars.ContextVar("_context_config", default={})
+"""
+The settings of the current `execution_context`, overriding `MP_CONFIG`.
+This dictionary is never mutated, only replaced.
+"""
+
+_CONTEXT_KEYS = ["enable", "num_cpus", "min_num_args", "backend", "symengine",
+                 "checkpoint", "pool", "caches", "subsystems"]
+
+@contextmanager
+def execution_context(**settings):
+    """
+    Override the execution settings within a `with` block, for the current
+    thread (or `asyncio` task) only. Contexts can be nested, and the global
+    `MP_CONFIG` is left untouched, so independent transforms can run
+    concurrently from a thread pool with different settings.
+
+    Parameters
+    ----------
+
+    enable, num_cpus, min_num_args, backend, symengine, checkpoint
+        Override the corresponding entries of `MP_CONFIG`.
 
-def _mp_helper(A_args : sp.Expr, foo : callable):
+    pool : multiprocessing.pool.Pool, optional
+        An existing pool to map the jobs with, instead of starting a new one
+        for each parallel call. The pool is not closed on exit. Takes
+        precedence over `backend`.
+
+    caches : dict, optional
+        The dictionary in which the memoized intermediate results are stored.
+        Pass an empty dictionary to isolate the caches of this context from
+        the global ones.
+
+    subsystems : iterable, optional
+        If given, the subsystems registered within this context (which become
+        the variables of `W`) are kept apart from the global ones, starting
+        from the given subsystems.
+
+    Examples
+    --------
+
+    >>> with execution_context(num_cpus=2, caches={}):
+    ...     out = WignerTransform(A)
+    """
+    for key in settings:
+        if key not in _CONTEXT_KEYS:
+            msg = f"The key [{key}] is not valid. Valid keys: {_CONTEXT_KEYS}."
+            raise KeyError(msg)
+    if "min_num_args" in settings:
+        settings["min_num_args"] = max(settings["min_num_args"], 2)
+
+    sub_token = None
+    if "subsystems" in settings:
+        subsystems = settings.pop("subsystems")
+        sub_token = _isolated_sub_cache.set(_Set(_treat_sub(sub, True) for sub in subsystems))
+
+    token = _context_config.set({**_context_config.get(), **settings})
+    try:
+        yield
+    finally:
+        _context_config.reset(token)
+        if sub_token is not None:
+            _isolated_sub_cache.reset(sub_token)
+
+def _get_config(key : str):
+    """
+    The value of the setting `key` in the current context.
+    """
+    config = _context_config.get()
+    if key in config:
+        return config[key]
+    if key == "pool":
+        return None
+    if key == "caches":
+        return _CACHES
+    return MP_CONFIG[key]
+
+_BACKENDS = {"serial" : SerialBackend,
+             "thread" : ThreadBackend,
+             "futures" : FuturesBackend,
+             "pool" : PoolBackend}
+
+def _get_backend() -> Backend:
+    """
+    The backend of the current context.
+    """
+    pool = _get_config("pool")
+    if pool is not None:
+        return PoolBackend(pool=pool)
+    backend = _get_config("backend")
+    if isinstance(backend, Backend):
+        return backend
+    if backend not in _BACKENDS:
+        msg = f"Invalid backend: {backend}. Valid backends: {list(_BACKENDS)} or a 'Backend' instance."
+        raise ValueError(msg)
+    if backend == "serial":
+        return SerialBackend()
+    return _BACKENDS[backend](_get_config("num_cpus"))
+
+def _get_cache(name : str) -> dict:
+    """
+    The cache called `name` in the current context.
+    """
+    return _get_config("caches").setdefault(name, {})
+
+def _worker_settings() -> dict:
+    """
+    The settings sent along with each job, so that pool workers, which may
+    have been started outside of the current context, see the same settings
+    and subsystems.
+    """
+    settings = {key : val for key, val in _context_config.get().items()
+                if key not in ["pool", "caches", "backend"]}
+    settings["subsystems"] = list(_get_sub_cache())
+    return settings
+
+############################################################
+
+def _mp_helper(A_args : sp.Expr, foo : callable, stage : str = "map"):
     """
     Apply `foo` to the arguments `A_args` of `A`, using multiprocessing
-    if possible.
+    if possible. The completion of each argument is reported as a
+    `ProgressEvent` of the given `stage`.
+    
+    If the `checkpoint` setting is a directory, the arguments whose results
+    are saved there are not recomputed, and the other results are saved as
+    they complete.
+    """
+    directory = _get_config("checkpoint")
+    foo_name = _checkpoint._foo_name(foo) if (directory is not None) else None
+    if foo_name is not None:
+        keys = [_checkpoint._job_key(foo_name, X_, stage) for X_ in A_args]
+        out = [_checkpoint._load(directory, key) for key in keys]
+        todo = [idx for idx, (found, _) in enumerate(out) if not(found)]
+        res = _mp_helper_base([A_args[idx] for idx in todo], foo, stage,
+                              save=lambda i, X_bytes: _checkpoint._save(directory, keys[todo[i]], X_bytes))
+        out = [X_ for _, X_ in out]
+        for idx, X_ in zip(todo, res):
+            out[idx] = X_
+        return out
+    return _mp_helper_base(A_args, foo, stage)
+
+def _mp_helper_base(A_args : sp.Expr, foo : callable, stage : str = "map",
+                    save : None | Callable = None):
     """
-    global _mp_is_running
+    `_mp_helper` without the checkpoints. `save(i, X_bytes)`, if given, is
+    called with the pickled result of the `i`-th argument as it completes,
+    in the order of completion.
+    """
+    use_mp = (not(_mp_is_running.get()) and 
+            _get_config("enable") and 
+            (len(A_args) >= _get_config("min_num_args")))
+    
+    reporter = _progress._reporter.get()
+    reporter_token = _progress._reporter.set(None)
+    total = len(A_args)
+    start = time.perf_counter()
     
-    use_mp = (not(_mp_is_running) and 
-            MP_CONFIG["enable"] and 
-            (len(A_args) >= MP_CONFIG["min_num_args"]))
+    def collect(results):
+        # `results` yields `(index, (worker, seconds, output))` as the jobs complete.
+        out = [None]*total
+        busy = {}
+        for done, (idx, (worker, seconds, X_)) in enumerate(results, start=1):
+            out[idx] = X_
+            if save is not None:
+                save(idx, X_ if use_mp else dill.dumps(X_))
+            count, busy_time = busy.get(worker, (0, 0.0))
+            busy[worker] = (count+1, busy_time+seconds)
+            if reporter is not None:
+                reporter(_progress.ProgressEvent(stage, done, total, worker,
+                                                 time.perf_counter() - start,
+                                                 (count+1) / max(busy_time+seconds, 1e-9)))
+        return out
     
-    if use_mp:
-        _mp_is_running = True
-        with Pool(MP_CONFIG["num_cpus"]) as pool:
-            res = pool.map(partial(_pool_helper, foo=foo),
-                            [dill.dumps(X_) for X_ in A_args])
-        _mp_is_running = False
-        return [dill.loads(X_bytes) for X_bytes in res]
-    else:
-        return [foo(_A_) for _A_ in A_args]
+    def timed(X_):
+        job_start = time.perf_counter()
+        out = foo(X_)
+        return os.getpid(), time.perf_counter() - job_start, out
     
-def _pool_helper(_A_bytes : bytes, foo : callable):
+    try:
+        if use_mp:
+            helper = partial(_pool_helper, foo=foo, settings=_worker_settings())
+            jobs = [dill.dumps(X_) for X_ in A_args]
+            backend = _get_backend()
+            running_token = _mp_is_running.set(True)
+            try:
+                res = collect(backend.imap_unordered(helper, jobs))
+            finally:
+                _mp_is_running.reset(running_token)
+            return [dill.loads(X_bytes) for X_bytes in res]
+        else:
+            return collect(enumerate(timed(_A_) for _A_ in A_args))
+    finally:
+        _progress._reporter.reset(reporter_token)
+    
+def _pool_helper(_A_bytes : bytes, foo : callable, settings : None | dict = None):
     """
     The package usage involves `sympy.Function`, which the
     package `pickle`, used by `multiprocessing`, cannot pickle.
@@ -76,6 +282,21 @@ def _pool_helper(_A_bytes : bytes, foo : callable):
     by the main process, reconstructing the SymPy objects for 
     `_replace_diff` to work with. Then, the output is pickled once 
     again when sent back to the main process. 
+    
+    The job runs in a fresh copy of the worker's context, with the
+    `settings` of the calling context, so that nothing leaks between
+    the jobs of a long-lived pool. The process id of the worker and the
+    duration of the job are returned along with the output, for the
+    progress reports.
     """
+    def run():
+        _mp_is_running.set(True)
+        if settings is not None:
+            settings_ = dict(settings)
+            _isolated_sub_cache.set(_Set(settings_.pop("subsystems")))
+            _context_config.set(settings_)
+        job_start = time.perf_counter()
+        out = dill.dumps(foo(dill.loads(_A_bytes)))
+        return os.getpid(), time.perf_counter() - job_start, out
     
-    return dill.dumps(foo(dill.loads(_A_bytes)))
\ No newline at end of file
+    return contextvars.copy_context().run(run)
\ No newline at end of file
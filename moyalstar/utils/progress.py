@@ -0,0 +1,148 @@
+import contextvars
+import queue
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Callable
+
+__all__ = ["ProgressEvent", "progress", "track_progress"]
+
+class ProgressEvent(NamedTuple):
+    """
+    Progress of a running computation: `done` out of `total` items of
+    the given `stage` have been completed.
+
+    Stages reported by the package are `'wigner_transform'` (summands and factors),
+    `'dissipators'`, `'star'` (the terms of a Bopp-shifted ★-product), `'collect'`
+    (grouping by derivatives of `W`), `'weyl_transform'`, and `'map'` otherwise.
+
+    The optional fields are the process id of the `worker` that completed the
+    item, the seconds `elapsed` since the stage started, and the `worker_rate`,
+    the items per second of busy time of that worker.
+    """
+    stage : str
+    done : int
+    total : int
+    worker : None | int = None
+    elapsed : None | float = None
+    worker_rate : None | float = None
+
+    @property
+    def eta(self) -> None | float:
+        """
+        Estimated seconds until the stage completes, at the average rate so far.
+        """
+        if not(self.done) or (self.elapsed is None):
+            return None
+        return self.elapsed * (self.total - self.done) / self.done
+
+global _reporter
+_reporter : contextvars.ContextVar[None | Callable[[ProgressEvent], None]] \
+    = contextvars.ContextVar("_reporter", default=None)
+"""
+The callable receiving the `ProgressEvent`s of the current context. Only the
+outermost `_mp_helper` call reports, since it is the one that sees the whole
+workload; it hides the reporter from the calls nested inside it.
+"""
+
+def _report(stage : str, done : int, total : int, **fields):
+    reporter = _reporter.get()
+    if reporter is not None:
+        reporter(ProgressEvent(stage, done, total, **fields))
+
+@contextmanager
+def progress(callback : Callable[[ProgressEvent], None]):
+    """
+    Send the `ProgressEvent`s of the computations run within the `with` block,
+    in the current thread (or `asyncio` task), to `callback`. With multiprocessing,
+    the events are sent from the calling process as the results of the workers
+    arrive.
+
+    An exception raised by `callback` aborts the computation and propagates,
+    terminating the pool of workers started for it, so that runaway jobs can be
+    stopped early.
+
+    Examples
+    --------
+
+    >>> with progress(print):
+    ...     eom = LindbladMasterEquation(H, dissipators).wigner_transform
+    """
+    token = _reporter.set(callback)
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+class _Aborted(Exception):
+    pass
+
+_DONE = object()
+
+class track_progress():
+    """
+    Run `foo(*args, **kwargs)` in a background thread, with the context of the
+    caller, and iterate over its `ProgressEvent`s as they are reported. The return
+    value is stored in `result` once the iteration is exhausted, and an exception
+    raised by `foo` is re-raised by the iteration.
+
+    Closing the iterator, explicitly or by leaving a `with` block, aborts the
+    computation at its next progress event and waits for the thread to end.
+
+    Examples
+    --------
+
+    >>> with track_progress(WignerTransform, A) as events:
+    ...     for event in events:
+    ...         print(event.stage, event.done, event.total, event.eta)
+    >>> out = events.result
+    """
+
+    def __init__(self, foo : Callable, *args, **kwargs):
+        self.result = None
+        self._events = queue.Queue()
+        self._abort = threading.Event()
+        self._exception = None
+
+        def callback(event : ProgressEvent):
+            if self._abort.is_set():
+                raise _Aborted()
+            self._events.put(event)
+
+        def run():
+            _reporter.set(callback)
+            try:
+                self.result = foo(*args, **kwargs)
+            except _Aborted:
+                pass
+            except BaseException as e:
+                self._exception = e
+            finally:
+                self._events.put(_DONE)
+
+        self._thread = threading.Thread(target=contextvars.copy_context().run,
+                                        args=(run,), daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> ProgressEvent:
+        event = self._events.get()
+        if event is _DONE:
+            # Keep the iterator exhausted.
+            self._events.put(_DONE)
+            if self._exception is not None:
+                e, self._exception = self._exception, None
+                raise e
+            raise StopIteration
+        return event
+
+    def close(self):
+        self._abort.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,86 @@
+import sympy as sp
+
+from ..core.base import Base
+from ..core import scalars
+from .multiprocessing import _mp_helper
+
+__all__ = []
+
+"""
+Terms that differ only by the subscripts of their subsystems, e.g. the local
+terms of a lattice model, have transforms that differ only by the same
+relabelling. Here such terms are grouped by their shape, only one
+representative per group is transformed, and the transforms of the others
+are obtained by relabelling `q(sub)` and `p(sub)`.
+"""
+
+def _subsystems(A : sp.Expr) \
+    -> list[sp.Symbol]:
+    """
+    The subsystems of `A` in order of first appearance. The variables of `W`
+    are skipped, since `W` depends on all subsystems regardless of `A`.
+    """
+    out = []
+    traversal = sp.preorder_traversal(A)
+    for X in traversal:
+        if isinstance(X, scalars.WignerFunction):
+            traversal.skip()
+        elif isinstance(X, Base) and X.has_sub and (X.sub not in out):
+            out.append(X.sub)
+    return out
+
+def _shape(A : sp.Expr, subs : list[sp.Symbol]) \
+    -> sp.Expr:
+    """
+    `A` with its subsystem-carrying atoms replaced by placeholders numbered
+    by the order of appearance of their subsystem. Terms of the same shape
+    have the same placeholder expression.
+    """
+    rule = {X : X for X in A.atoms(scalars.WignerFunction)}
+    for X in A.atoms(Base):
+        if X.has_sub and X.sub in subs:
+            name = r"%s_{%d}" % (type(X).__name__, subs.index(X.sub))
+            rule[X] = sp.Symbol(name, commutative=X.is_commutative)
+    return A.xreplace(rule)
+
+def _relabel(A : sp.Expr, sub_map : dict) \
+    -> sp.Expr:
+    """
+    Replace the subsystems of `A` according to `sub_map`, simultaneously and
+    leaving `W` as is. The differentiation variables of the derivatives of
+    `W` are put back into canonical order.
+    """
+    from ..core.star_product import _differentiate_W_part, _make_index
+
+    rule = {X : X for X in A.atoms(scalars.WignerFunction)}
+    for X in A.atoms(Base):
+        if X.has_sub and X.sub in sub_map:
+            rule[X] = type(X)(sub_map[X.sub])
+    out = A.xreplace(rule)
+
+    return out.replace(lambda x: (isinstance(x, sp.Derivative)
+                                  and isinstance(x.expr, scalars.WignerFunction)),
+                       lambda x: _differentiate_W_part(x.expr, _make_index(dict(x.variable_count))))
+
+def _symmetric_map(A_args : list[sp.Expr], foo : callable, stage : str = "map") \
+    -> list[sp.Expr]:
+    """
+    Same as `_mp_helper(A_args, foo, stage)`, for a `foo` that commutes with the
+    relabelling of subsystems, but `foo` is only called on one representative
+    of each group of terms with the same shape.
+    """
+    subs = [_subsystems(A_) for A_ in A_args]
+    groups = {}
+    for idx, (A_, subs_) in enumerate(zip(A_args, subs)):
+        groups.setdefault(_shape(A_, subs_), []).append(idx)
+
+    representatives = [members[0] for members in groups.values()]
+    res = _mp_helper([A_args[idx] for idx in representatives], foo, stage)
+
+    out = [None]*len(A_args)
+    for members, X in zip(groups.values(), res):
+        rep_subs = subs[members[0]]
+        out[members[0]] = X
+        for idx in members[1:]:
+            out[idx] = _relabel(X, dict(zip(rep_subs, subs[idx])))
+    return out